@@ -0,0 +1,124 @@
+"""
+AOI-aware tile culling.
+
+The AOI polygons go into a QgsSpatialIndex; every tile of the grid is then
+classified against it as OUTSIDE (never read nor inferred), INSIDE (no
+per-pixel masking needed) or PARTIAL (masked with the rasterised AOI).
+Geometries are passed around as WKT in the raster CRS, so the classifier can
+be built on a worker thread away from the project layers.
+"""
+from osgeo import gdal, ogr, osr
+from qgis.core import QgsFeature, QgsGeometry, QgsRectangle, QgsSpatialIndex
+
+
+OUTSIDE, PARTIAL, INSIDE = 0, 1, 2
+
+
+class AOITileClassifier:
+    """Classifies tiles against AOI polygons.
+
+    Args:
+        wkt_geometries (list): AOI polygons as WKT, in the raster CRS.
+        geotransform (tuple): GDAL geotransform of the raster.
+    """
+
+    def __init__(self, wkt_geometries, geotransform):
+        self.geotransform = geotransform
+        self.index = QgsSpatialIndex()
+        self.engines = {}
+        for fid, wkt in enumerate(wkt_geometries):
+            geometry = QgsGeometry.fromWkt(wkt)
+            if geometry.isEmpty():
+                continue
+            feature = QgsFeature(fid)
+            feature.setGeometry(geometry)
+            self.index.addFeature(feature)
+            # Prepared engines make the repeated contains / intersects tests cheap
+            engine = QgsGeometry.createGeometryEngine(geometry.constGet())
+            engine.prepareGeometry()
+            self.engines[fid] = engine
+
+    def tile_rectangle(self, tile):
+        """Map extent of the valid part of a tile."""
+        x0, dx, rx, y0, ry, dy = self.geotransform
+        corners = [(tile.x + i, tile.y + j) for i in (0, tile.xsize) for j in (0, tile.ysize)]
+        xs = [x0 + px * dx + py * rx for px, py in corners]
+        ys = [y0 + px * ry + py * dy for px, py in corners]
+        return QgsRectangle(min(xs), min(ys), max(xs), max(ys))
+
+    def classify(self, tile):
+        rectangle = self.tile_rectangle(tile)
+        candidates = self.index.intersects(rectangle)
+        if not candidates:
+            return OUTSIDE
+        tile_geometry = QgsGeometry.fromRect(rectangle).constGet()
+        if any(self.engines[fid].contains(tile_geometry) for fid in candidates):
+            return INSIDE
+        if any(self.engines[fid].intersects(tile_geometry) for fid in candidates):
+            return PARTIAL
+        return OUTSIDE
+
+
+def rasterize_aoi(wkt_geometries, source, path):
+    """Burn the AOI into a sparse Byte GeoTIFF aligned with ``source`` (1 = inside).
+
+    Blocks the AOI never touches are not written, so the file stays small
+    however large the scene.
+    """
+    driver = gdal.GetDriverByName("GTiff")
+    mask = driver.Create(path, source.RasterXSize, source.RasterYSize, 1, gdal.GDT_Byte,
+                         ["TILED=YES", "SPARSE_OK=TRUE", "COMPRESS=DEFLATE"])
+    mask.SetGeoTransform(source.GetGeoTransform())
+    mask.SetProjection(source.GetProjection())
+
+    srs = osr.SpatialReference()
+    if source.GetProjection():
+        srs.ImportFromWkt(source.GetProjection())
+    memory = ogr.GetDriverByName("Memory").CreateDataSource("aoi")
+    layer = memory.CreateLayer("aoi", srs, ogr.wkbMultiPolygon)
+    for wkt in wkt_geometries:
+        feature = ogr.Feature(layer.GetLayerDefn())
+        feature.SetGeometry(ogr.CreateGeometryFromWkt(wkt))
+        layer.CreateFeature(feature)
+
+    gdal.RasterizeLayer(mask, [1], layer, burn_values=[1])
+    mask.FlushCache()
+    mask = None
+    return path
+
+
+def read_aoi_wkt(vector_path, raster_path):
+    """AOI polygons of a vector file as WKT, reprojected to the CRS of ``raster_path``.
+
+    OGR counterpart of AOIMenu.get_aoi_wkt, for runs without project layers.
+
+    Raises:
+        ValueError: If the vector file cannot be opened.
+    """
+    source = ogr.Open(vector_path)
+    if source is None:
+        raise ValueError(f"Cannot open the AOI file {vector_path}")
+    raster = gdal.Open(raster_path, gdal.GA_ReadOnly)
+    projection = raster.GetProjection()
+    raster = None
+    target = osr.SpatialReference()
+    if projection:
+        target.ImportFromWkt(projection)
+        target.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+
+    geometries = []
+    for layer in source:
+        layer_srs = layer.GetSpatialRef()
+        transform = None
+        if projection and layer_srs is not None and not layer_srs.IsSame(target):
+            layer_srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+            transform = osr.CoordinateTransformation(layer_srs, target)
+        for feature in layer:
+            geometry = feature.GetGeometryRef()
+            if geometry is None or geometry.IsEmpty():
+                continue
+            geometry = geometry.Clone()
+            if transform is not None:
+                geometry.Transform(transform)
+            geometries.append(geometry.ExportToWkt())
+    return geometries
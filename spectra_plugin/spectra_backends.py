@@ -0,0 +1,263 @@
+"""
+Model backends.
+
+Every backend wraps a framework model behind the engine's ``predict`` API:
+(N, channels, H, W) float32 in, (N, classes, H, W) scores out.
+
+Backends are looked up in a registry by file extension (or by name, when a
+model declares its backend explicitly). Frameworks are imported inside the
+backend constructors, so nothing heavier than this module is imported until
+a model of that kind is first loaded.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+# Model cache
+# ----------------------------------------------------------------------------------------------------------
+class ModelCache:
+    """LRU cache of loaded models, shared by every run in this QGIS session.
+
+    Keyed by backend, model path, file mtime and load options, so re-running
+    with the same model reuses it, while an overwritten model file or a
+    different thread setting loads a fresh one. The lock only guards the cache
+    itself; loading happens outside it. Concurrent misses on the same key
+    (scenes of a batch starting together) wait for a single load.
+    """
+
+    def __init__(self, max_size=4):
+        self.max_size = max_size
+        self.models = OrderedDict()
+        self.loading = {}  # Key -> Event set once the thread loading it is done
+        self.lock = threading.Lock()
+
+    def get(self, backend, path, options, create):
+        """Return (model, hit), calling ``create()`` on a miss."""
+        path = os.path.abspath(path)
+        key = (backend, path, os.path.getmtime(path), tuple(sorted(options.items())))
+        while True:
+            with self.lock:
+                if key in self.models:
+                    self.models.move_to_end(key)
+                    return self.models[key], True
+                loaded = self.loading.get(key)
+                if loaded is None:
+                    loaded = self.loading[key] = threading.Event()
+                    break
+            # Another thread is loading it; if that load fails, try again ourselves
+            loaded.wait()
+
+        try:
+            model = create()
+            with self.lock:
+                self.models[key] = model
+                self.models.move_to_end(key)
+                while len(self.models) > self.max_size:
+                    self.models.popitem(last=False)
+        finally:
+            with self.lock:
+                del self.loading[key]
+            loaded.set()
+        return model, False
+
+    def clear(self):
+        with self.lock:
+            self.models.clear()
+
+
+model_cache = ModelCache()
+# ----------------------------------------------------------------------------------------------------------
+
+
+
+# Backends
+# ----------------------------------------------------------------------------------------------------------
+# Graph optimisation levels, by the names shown in the parameter group
+GRAPH_OPTIMIZATION_LEVELS = ["Disabled", "Basic", "Extended", "All"]
+
+
+class OnnxModel:
+    """ONNX Runtime CPU backend.
+
+    Args:
+        path (str): .onnx model file.
+        intra_op_threads (int): Threads used inside one operator, 0 = default.
+        inter_op_threads (int): Operators run concurrently, 0 = default.
+        optimization (str): One of GRAPH_OPTIMIZATION_LEVELS.
+        siamese (bool): Two-input change model fed one date per input; batches
+            stack the dates along channels (see ChangePreprocessor).
+
+    Raises:
+        ValueError: If a Siamese model does not take exactly two inputs.
+    """
+
+    def __init__(self, path, intra_op_threads=0, inter_op_threads=0, optimization="All", siamese=False):
+        import onnxruntime
+
+        levels = {
+            "Disabled": onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL,
+            "Basic": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+            "Extended": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+            "All": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL,
+        }
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads  # 0 = let ONNX Runtime decide
+        options.inter_op_num_threads = inter_op_threads
+        options.graph_optimization_level = levels[optimization]
+        if inter_op_threads > 1:
+            options.execution_mode = onnxruntime.ExecutionMode.ORT_PARALLEL
+
+        # Sessions are thread-safe, one can serve concurrent runs
+        self.session = onnxruntime.InferenceSession(path, sess_options=options,
+                                                    providers=["CPUExecutionProvider"])
+        self.input_names = [node.name for node in self.session.get_inputs()]
+        self.input_name = self.input_names[0]
+        if siamese and len(self.input_names) != 2:
+            raise ValueError(f"A Siamese model takes two inputs, {os.path.basename(path)} "
+                             f"takes {len(self.input_names)}")
+        self.siamese = siamese
+
+    def predict(self, batch):
+        if self.siamese:
+            earlier, later = np.split(batch, 2, axis=1)
+            return self.session.run(None, {self.input_names[0]: earlier, self.input_names[1]: later})[0]
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class TorchScriptModel:
+    """TorchScript backend (models saved with torch.jit.save).
+
+    torch's thread pool is process-wide, so intra_op_threads applies to every
+    torch model in this QGIS session.
+    """
+
+    def __init__(self, path, intra_op_threads=0, inter_op_threads=0, optimization="All"):
+        import torch
+
+        self.torch = torch
+        if intra_op_threads > 0:
+            torch.set_num_threads(intra_op_threads)
+        self.model = torch.jit.load(path, map_location="cpu").eval()
+        if optimization != "Disabled":
+            self.model = torch.jit.optimize_for_inference(self.model)
+
+    def predict(self, batch):
+        with self.torch.inference_mode():
+            return self.model(self.torch.from_numpy(batch)).numpy()
+
+
+class KerasModel:
+    """Keras (.h5 / .keras) backend; converts between channels-first and TF's channels-last."""
+
+    def __init__(self, path, intra_op_threads=0, inter_op_threads=0, optimization="All"):
+        import tensorflow as tf
+
+        try:
+            tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+            tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+        except RuntimeError:
+            pass  # TF already initialised by an earlier model, keep its settings
+        self.model = tf.keras.models.load_model(path, compile=False)
+
+    def predict(self, batch):
+        scores = self.model(batch.transpose(0, 2, 3, 1), training=False).numpy()
+        return scores.transpose(0, 3, 1, 2)
+
+
+class TFLiteModel:
+    """TensorFlow Lite backend; uses tflite_runtime when present, TensorFlow otherwise.
+
+    The interpreter is resized once to the first batch shape; batches keep a
+    fixed shape (see TileBatchScheduler), so it is never reallocated.
+    """
+
+    def __init__(self, path, intra_op_threads=0, inter_op_threads=0, optimization="All"):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+
+        self.interpreter = Interpreter(model_path=path, num_threads=intra_op_threads or None)
+        self.input_index = self.interpreter.get_input_details()[0]["index"]
+        self.output_index = self.interpreter.get_output_details()[0]["index"]
+        self.shape = None
+        self.lock = threading.Lock()  # Interpreters are not thread-safe
+
+    def predict(self, batch):
+        batch = np.ascontiguousarray(batch.transpose(0, 2, 3, 1))
+        with self.lock:
+            if self.shape != batch.shape:
+                self.interpreter.resize_tensor_input(self.input_index, batch.shape)
+                self.interpreter.allocate_tensors()
+                self.shape = batch.shape
+            self.interpreter.set_tensor(self.input_index, batch)
+            self.interpreter.invoke()
+            scores = self.interpreter.get_tensor(self.output_index)
+        return scores.transpose(0, 3, 1, 2)
+# ----------------------------------------------------------------------------------------------------------
+
+
+
+# Registry
+# ----------------------------------------------------------------------------------------------------------
+# Backend name -> (file extensions, backend class)
+_backends = OrderedDict()
+
+
+def register_backend(name, extensions, backend_class):
+    """Register a backend class for the given file extensions (e.g. [".onnx"])."""
+    _backends[name] = ([ext.lower() for ext in extensions], backend_class)
+
+
+def supported_extensions():
+    return [ext for extensions, _ in _backends.values() for ext in extensions]
+
+
+def backend_for(path, backend=None):
+    """Backend name for a model, by explicit name or else by file extension.
+
+    Raises:
+        ValueError: If no registered backend matches.
+    """
+    if backend:
+        if backend not in _backends:
+            raise ValueError(f"Unknown model backend: {backend}")
+        return backend
+    extension = os.path.splitext(path)[1].lower()
+    for name, (extensions, _) in _backends.items():
+        if extension in extensions:
+            return name
+    raise ValueError(f"Unsupported model format: {os.path.basename(path)}")
+
+
+def load_model(path, backend=None, feedback=None, **options):
+    """Load (or reuse from the cache) a model for inference.
+
+    Args:
+        path (str): Model file.
+        backend (str): Registered backend name; picked by extension if None.
+        feedback: Optional EngineFeedback-like object told about cache reuse.
+        **options: intra_op_threads, inter_op_threads, optimization, and
+            siamese for ONNX models (see InferenceSettings.model_options).
+
+    Raises:
+        ValueError: If a Siamese model is not an ONNX model.
+    """
+    name = backend_for(path, backend)
+    if options.get("siamese") and name != "onnx":
+        raise ValueError(f"Siamese change models need an ONNX model, not {name}")
+    backend_class = _backends[name][1]
+    model, hit = model_cache.get(name, path, options, lambda: backend_class(path, **options))
+    if hit and feedback is not None:
+        feedback.pushInfo(f"{name} model reused from cache")
+    return model
+
+
+register_backend("onnx", [".onnx"], OnnxModel)
+register_backend("torchscript", [".pt", ".pth"], TorchScriptModel)
+register_backend("keras", [".h5", ".keras"], KerasModel)
+register_backend("tflite", [".tflite"], TFLiteModel)
+# ----------------------------------------------------------------------------------------------------------
@@ -0,0 +1,403 @@
+"""
+Headless batch processing.
+
+``run_settings`` is the processing core shared by the dialog's background
+task and this module's command line runner: it resolves the model precision,
+loads (or reuses) the model and runs the engine matching its output kind.
+
+The runner takes the same inputs as the first tab of the dialog (rasters,
+AOI, model and parameter group, export options) and processes a directory or
+glob of rasters without any GUI, several scenes at a time (by default as
+many as the cores and available RAM allow, see plan_concurrency)::
+
+    python -m spectra_plugin.spectra_batch "/data/scenes/*.tif" \\
+        --model /models/unet.onnx --output-dir /data/results --format gpkg
+
+Scenes share the session model cache, so the model is loaded once. Outputs
+that already exist are skipped, unless their scene did not complete (see
+UNFINISHED_SUFFIX): running the same command again redoes an interrupted
+scene, resuming from its scratch store.
+"""
+import argparse
+import glob
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .spectra_backends import GRAPH_OPTIMIZATION_LEVELS, load_model
+from .spectra_detection import DetectionEngine
+from .spectra_forecast import ARIMA_MODEL, ArimaForecaster, ForecastEngine
+from .spectra_inference import (InferenceSettings, InferenceEngine, EngineFeedback, COMPRESSIONS, RASTER_EXTENSIONS,
+                                align_tile_grid, resolve_subdataset)
+from .spectra_cache import raster_name
+from .spectra_change import ChangeEngine
+from .spectra_manifest import ModelManifest
+from .spectra_quantize import PRECISIONS, reduced_precision_model, resolve_precision
+
+
+# Export formats, by file extension (the class raster is always written as GeoTIFF)
+EXPORT_FORMATS = ["tif", "gpkg", "shp", "geojson", "kml", "dxf"]
+
+
+# Processing core
+# ----------------------------------------------------------------------------------------------------------
+def run_settings(settings, feedback=None, job=None):
+    """Run one job: tile grid alignment, precision variant, model load, then the engine for the model's output.
+
+    Forecasts (``forecast_horizon`` > 0) run the forecasting engine, with the
+    built-in ARIMA forecaster when the model is ARIMA_MODEL.
+
+    Args:
+        settings (InferenceSettings): The run parameters.
+        feedback: QgsProcessingFeedback-like object (see EngineFeedback).
+        job: Optional job (see spectra_jobs) checkpointed by the engine.
+
+    Returns:
+        str: Output path, or None if the run was cancelled.
+    """
+    feedback = feedback or EngineFeedback()
+    if settings.forecast_horizon and settings.model_path == ARIMA_MODEL:
+        return ForecastEngine(ArimaForecaster(settings.forecast_horizon, settings.forecast_order),
+                              settings).run(feedback)
+    if settings.forecast_horizon and settings.precision != "FP32":
+        # Reduced precision variants are calibrated and checked on image tiles, not time series
+        raise ValueError(f"{settings.precision} variants are built from image tiles, run forecasting models in FP32")
+    align_tile_grid(settings, feedback)
+    model_path = reduced_precision_model(settings, feedback)
+    model = load_model(model_path, settings.backend, feedback, **settings.model_options())
+    if settings.forecast_horizon:
+        return ForecastEngine(model, settings).run(feedback)
+    if settings.change_path:
+        if settings.detection:
+            raise ValueError("Change detection needs a model that outputs score maps, not boxes")
+        return ChangeEngine(model, settings, job).run(feedback)
+    if settings.detection:
+        return DetectionEngine(model, settings).run(feedback)
+    return InferenceEngine(model, settings, job).run(feedback)
+# ----------------------------------------------------------------------------------------------------------
+
+
+
+# Batch runner
+# ----------------------------------------------------------------------------------------------------------
+def scene_paths(inputs, extensions=None):
+    """Expand raster files, directories and glob patterns into a sorted, duplicate-free list.
+
+    Directories contribute the files directly inside them with one of ``extensions``.
+    """
+    extensions = extensions or RASTER_EXTENSIONS
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths += [os.path.join(item, name) for name in os.listdir(item)
+                      if os.path.splitext(name)[1].lower() in extensions]
+        elif glob.has_magic(item):
+            paths += [path for path in glob.glob(item) if os.path.isfile(path)]
+        else:
+            paths.append(item)
+    return sorted(set(os.path.abspath(path) for path in paths))
+
+
+class ConsoleFeedback(EngineFeedback):
+    """Prints engine feedback prefixed with the scene name; progress every 10%.
+
+    Args:
+        name (str): Scene name.
+        cancel (threading.Event): Set to cancel every scene.
+        lock (threading.Lock): Shared by the scenes, so lines never interleave.
+        verbose (bool): Also print the per-batch timings.
+    """
+
+    def __init__(self, name, cancel, lock, verbose=False):
+        self.name = name
+        self.cancel = cancel
+        self.lock = lock
+        self.verbose = verbose
+        self.reported = -1
+
+    def isCanceled(self):
+        return self.cancel.is_set()
+
+    def setProgress(self, progress):
+        step = int(progress // 10)
+        if step > self.reported:
+            self.reported = step
+            self.pushInfo(f"{10 * step}%")
+
+    def pushInfo(self, info):
+        if not self.verbose and info.startswith("Batch "):
+            return
+        with self.lock:
+            print(f"[{self.name}] {info}", flush=True)
+
+
+# Scene statuses reported by BatchRunner
+QUEUED, RUNNING, DONE, SKIPPED, CANCELLED, FAILED = "queued", "running", "done", "skipped", "cancelled", "failed"
+
+# Next to the output of a scene until it completes
+UNFINISHED_SUFFIX = ".unfinished"
+
+SCENE_OVERHEAD_MB = 256  # Reader, accumulator windows, writer and polygoniser of one scene
+WORKER_OVERHEAD_MB = 150  # One preprocessing process
+ACTIVATION_FACTOR = 16  # Model working memory, as a multiple of its input batch
+
+
+def available_memory():
+    """Bytes of RAM currently available, or None if unknown.
+
+    Uses psutil when installed, the POSIX page counts otherwise.
+    """
+    try:
+        import psutil
+        return psutil.virtual_memory().available
+    except ImportError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def scene_memory(settings, channels=4):
+    """Rough peak RAM of one scene, in bytes (the shared model itself excluded)."""
+    batch = settings.batch_size * channels * settings.resolution ** 2 * 4
+    tiles = settings.batch_size * channels * settings.tile_size ** 2 * 4
+    return ((SCENE_OVERHEAD_MB + settings.workers * WORKER_OVERHEAD_MB) * 1024 * 1024
+            + tiles + batch * (1 + ACTIVATION_FACTOR))
+
+
+def plan_concurrency(settings, scenes, cpu_count=None, memory=None):
+    """How many scenes to run at once.
+
+    Every running scene keeps a thread busy reading, blending and writing,
+    plus its preprocessing processes; the shared model session's thread pool
+    serves all of them. Half the available RAM is budgeted for the scenes.
+
+    Args:
+        settings (InferenceSettings): Settings of a representative scene.
+        scenes (int): Scenes in the batch.
+        cpu_count (int): Cores, os.cpu_count() if None.
+        memory (int): Available RAM in bytes, available_memory() if None.
+    """
+    cpu_count = cpu_count or os.cpu_count() or 1
+    memory = memory if memory is not None else available_memory()
+    by_cpu = max(1, cpu_count // (2 + settings.workers))
+    by_memory = max(1, int(memory // 2 // scene_memory(settings))) if memory else by_cpu
+    return max(1, min(scenes, by_cpu, by_memory))
+
+
+class BatchRunner:
+    """Processes scenes with up to ``scenes`` of them running at once.
+
+    Scenes share the session model cache, so the model is loaded once for the batch.
+
+    Args:
+        settings_for (callable): Scene path -> InferenceSettings.
+        scenes (int): Scenes processed concurrently.
+        overwrite (bool): Reprocess scenes whose output already exists.
+        verbose (bool): Print per-batch timings (console feedback only).
+        feedback_for (callable): (scene path, cancel event) -> feedback of that scene;
+            ConsoleFeedback if None.
+        on_status (callable): Called with (scene path, status, detail) whenever a scene
+            changes status (one of QUEUED ... FAILED), from the scene's thread.
+    """
+
+    def __init__(self, settings_for, scenes=1, overwrite=False, verbose=False, feedback_for=None,
+                 on_status=None):
+        self.settings_for = settings_for
+        self.scenes = max(1, int(scenes))
+        self.overwrite = overwrite
+        self.verbose = verbose
+        self.feedback_for = feedback_for or self._console_feedback
+        self.on_status = on_status or (lambda path, status, detail: None)
+        self.cancel = threading.Event()
+        self.lock = threading.Lock()
+
+    def _console_feedback(self, path, cancel):
+        return ConsoleFeedback(raster_name(path), cancel, self.lock, self.verbose)
+
+    def run(self, paths):
+        """Process every scene.
+
+        Returns:
+            dict: Scene path -> output path, "skipped", "cancelled" or the exception raised.
+        """
+        for path in paths:
+            self.on_status(path, QUEUED, "")
+        with ThreadPoolExecutor(max_workers=self.scenes) as executor:
+            futures = {path: executor.submit(self.run_scene, path) for path in paths}
+            try:
+                return {path: future.result() for path, future in futures.items()}
+            except KeyboardInterrupt:
+                self.cancel.set()
+                with self.lock:
+                    print("Cancelling, waiting for the running scenes to reach a checkpoint...", flush=True)
+                for future in futures.values():
+                    future.cancel()
+                return {path: future.result() if not future.cancelled() else CANCELLED
+                        for path, future in futures.items()}
+
+    def run_scene(self, path):
+        feedback = self.feedback_for(path, self.cancel)
+        if feedback.isCanceled():
+            self.on_status(path, CANCELLED, "")
+            return CANCELLED
+        try:
+            settings = self.settings_for(path)
+            output = settings.vector_path or settings.output_path
+            marker = output + UNFINISHED_SUFFIX
+            if os.path.exists(output) and not os.path.exists(marker) and not self.overwrite:
+                feedback.pushInfo(f"Skipped, {output} already exists")
+                self.on_status(path, SKIPPED, output)
+                return SKIPPED
+            self.on_status(path, RUNNING, "")
+            start = time.perf_counter()
+            # Outputs are written in place; the marker stays behind if the scene is cancelled,
+            # fails or the process dies, so the next run redoes (or resumes) it instead of skipping
+            open(marker, "w").close()
+            result = run_settings(settings, feedback)
+        except Exception as e:
+            feedback.pushInfo(f"Failed: {e}")
+            self.on_status(path, FAILED, str(e))
+            return e
+        if result is None:
+            self.on_status(path, CANCELLED, "")
+            return CANCELLED
+        os.remove(marker)
+        feedback.pushInfo(f"Done in {time.perf_counter() - start:.1f}s")
+        self.on_status(path, DONE, result)
+        return result
+
+
+def settings_factory(args):
+    """Scene path -> InferenceSettings built from the parsed command line.
+
+    The model's manifest is read per scene, so a bad one fails each scene
+    like any other scene error instead of stopping the runner.
+    """
+    extension = "." + args.format.lstrip(".").lower()
+
+    def settings_for(raster_path):
+        manifest = ModelManifest.for_model(args.model)
+        if args.subdataset:
+            # NetCDF / HDF5 containers are read through the picked variable
+            raster_path = resolve_subdataset(raster_path, args.subdataset)
+        stem = os.path.join(args.output_dir, raster_name(raster_path))
+        resolution = args.resolution or (manifest.resolution if manifest else None) or 256
+        tile_size = args.tile_size or (manifest.tile_size if manifest else None) or resolution
+        settings = InferenceSettings(
+            raster_path=raster_path,
+            output_path=stem + ".tif",
+            model_path=args.model,
+            tile_size=tile_size,
+            overlap=args.overlap,
+            batch_size=args.batch_size,
+            resolution=resolution,
+            workers=args.workers,
+            intra_op_threads=args.intra_threads,
+            inter_op_threads=args.inter_threads,
+            optimization=args.optimization,
+            precision=args.precision or resolve_precision(manifest.precision if manifest else "FP32"),
+            compression=args.compression,
+            bigtiff=args.bigtiff,
+            overviews=not args.no_overviews,
+            vector_path=None if extension in RASTER_EXTENSIONS else stem + extension,
+            cache_dir=args.cache_dir,
+            cache_size_mb=args.cache_size_mb,
+            scratch_dir=args.scratch_dir,
+            forecast_horizon=args.horizon,
+        )
+        if manifest is not None:
+            manifest.apply(settings)
+        if args.backend:
+            settings.backend = args.backend
+        if args.aoi:
+            # Imported here, the AOI classifier is the only part needing qgis
+            from .spectra_aoi import read_aoi_wkt
+            settings.aoi_wkt = read_aoi_wkt(args.aoi, raster_path)
+        return settings
+
+    return settings_for
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m spectra_plugin.spectra_batch",
+        description="Run a SPECTRA model over a batch of rasters without the QGIS interface.")
+    parser.add_argument("inputs", nargs="+", help="Raster files (GeoTIFF / COG, VRT, JPEG2000, NetCDF, HDF5), "
+                                                  "directories or glob patterns")
+    parser.add_argument("--subdataset", help="Variable read from NetCDF / HDF5 inputs (e.g. reflectance)")
+    parser.add_argument("--aoi", help="Area of interest vector file (any OGR format)")
+    parser.add_argument("--model", required=True, help="Model file (a manifest next to it is used if present), "
+                                                       f"or {ARIMA_MODEL} with --horizon")
+    parser.add_argument("--backend", help="Model backend, picked by file extension by default")
+    parser.add_argument("--output-dir", required=True, help="Results directory, created if needed")
+    parser.add_argument("--format", default="tif", choices=EXPORT_FORMATS, help="Export format")
+    parser.add_argument("--compression", default="DEFLATE", choices=COMPRESSIONS)
+    parser.add_argument("--bigtiff", action="store_true", help="Always write BigTIFF")
+    parser.add_argument("--no-overviews", action="store_true", help="Do not build internal overviews")
+    parser.add_argument("--tile-size", type=int, default=0, help="Patch size, 0 = manifest or resolution")
+    parser.add_argument("--overlap", type=int, help="Tile overlap in pixels, 1/8 of the tile by default")
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--resolution", type=int, default=0, help="Image resolution, 0 = manifest or 256")
+    parser.add_argument("--workers", type=int, default=0, help="Preprocessing processes per scene")
+    parser.add_argument("--intra-threads", type=int, default=0)
+    parser.add_argument("--inter-threads", type=int, default=0)
+    parser.add_argument("--optimization", default="All", choices=GRAPH_OPTIMIZATION_LEVELS)
+    parser.add_argument("--precision", choices=PRECISIONS, help="Manifest precision or FP32 by default")
+    parser.add_argument("--horizon", type=int, default=0,
+                        help="Forecast this many time steps per pixel; input bands are dates (0 = no forecast)")
+    parser.add_argument("--cache-dir", help="Persistent tile cache directory")
+    parser.add_argument("--cache-size-mb", type=int, default=2048)
+    parser.add_argument("--scratch-dir", help="Scratch store directory, system temp by default")
+    parser.add_argument("--scenes", type=int, default=0,
+                        help="Scenes processed concurrently, 0 = decide from the cores and available RAM")
+    parser.add_argument("--overwrite", action="store_true", help="Reprocess scenes with an existing output")
+    parser.add_argument("--verbose", action="store_true", help="Print per-batch timings")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    paths = scene_paths(args.inputs)
+    if not paths:
+        print("No input rasters found", file=sys.stderr)
+        return 2
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    # qgis (for AOI culling) needs its application initialised, without a display
+    qgs = None
+    if args.aoi:
+        from qgis.core import QgsApplication
+        qgs = QgsApplication([], False)
+        qgs.initQgis()
+    try:
+        settings_for = settings_factory(args)
+        scenes = args.scenes
+        if not scenes:
+            try:
+                scenes = plan_concurrency(settings_for(paths[0]), len(paths))
+            except Exception:
+                scenes = 1  # The runner reports what is wrong with the scene, like any scene failure
+        print(f"{len(paths)} scenes, {scenes} at a time", flush=True)
+        runner = BatchRunner(settings_for, scenes, args.overwrite, args.verbose)
+        results = runner.run(paths)
+    finally:
+        if qgs is not None:
+            qgs.exitQgis()
+
+    failed = [path for path, result in results.items() if isinstance(result, Exception)]
+    cancelled = [path for path, result in results.items() if result == CANCELLED]
+    skipped = [path for path, result in results.items() if result == SKIPPED]
+    print(f"{len(paths) - len(failed) - len(cancelled) - len(skipped)} done, {len(skipped)} skipped, "
+          f"{len(cancelled)} cancelled, {len(failed)} failed", flush=True)
+    for path in failed:
+        print(f"  {path}: {results[path]}", file=sys.stderr)
+    return 1 if failed or cancelled else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+# ----------------------------------------------------------------------------------------------------------
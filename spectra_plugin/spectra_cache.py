@@ -0,0 +1,188 @@
+"""
+Persistent cache of per-tile model outputs.
+
+Entries are content-addressed: the key hashes everything the model output
+of a tile depends on. That covers the raster file and its mtime, the tile
+window, the model file contents, the input preparation (resolution, bands,
+normalisation), the precision and, for tiles cut by the AOI boundary, the
+AOI itself. Re-running a scene after changing only the AOI or the export
+format therefore infers just the tiles that are new or invalidated.
+
+The cache is a directory of .npy files with two-level fan-out. The file
+mtime records the last use, and the least recently used entries are evicted
+once the directory grows past its size limit.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+
+import numpy as np
+
+
+_model_hashes = {}
+
+
+def file_hash(path):
+    """SHA-1 of a file's contents, memoised on (path, mtime, size)."""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime, stat.st_size)
+    if key not in _model_hashes:
+        digest = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        _model_hashes[key] = digest.hexdigest()
+    return _model_hashes[key]
+
+
+# GDAL subdataset names: DRIVER[:TYPE]:"container path"[:variable]
+_SUBDATASET_NAME = re.compile(r'^[A-Z0-9_]+(?::[A-Z0-9_]+)*:"([^"]+)"(?::(.*))?$')
+
+
+def source_file(raster_path):
+    """Local file behind a GDAL raster name, or None if there is none.
+
+    That is the path itself, or the container of a subdataset such as
+    ``NETCDF:"/data/scene.nc":reflectance``.
+    """
+    if os.path.isfile(raster_path):
+        return raster_path
+    match = _SUBDATASET_NAME.match(raster_path)
+    if match and os.path.isfile(match.group(1)):
+        return match.group(1)
+    return None
+
+
+def raster_name(raster_path):
+    """Short name of a raster for outputs and logs: the file stem, plus the variable of a subdataset."""
+    match = _SUBDATASET_NAME.match(raster_path)
+    if match is None:
+        return os.path.splitext(os.path.basename(raster_path))[0]
+    stem = os.path.splitext(os.path.basename(match.group(1)))[0]
+    variable = re.sub(r"[/:]+", "_", (match.group(2) or "").strip("/"))
+    return f"{stem}_{variable}" if variable else stem
+
+
+def run_fingerprint(settings, model_path):
+    """Hash of the run parameters shared by every tile, or None if the input cannot be fingerprinted.
+
+    Only rasters backed by a local file can be cached: their mtime tells when
+    they change.
+    """
+    path = source_file(settings.raster_path)
+    if path is None:
+        return None
+    # A subdataset is identified by its full name (container and variable)
+    name = os.path.abspath(path) if path == settings.raster_path else settings.raster_path
+    fields = [
+        name, os.path.getmtime(path),
+        file_hash(model_path), settings.precision, settings.tile_size, settings.resolution,
+        settings.bands, settings.mean, settings.std,
+    ]
+    if settings.change_path:
+        later = source_file(settings.change_path)
+        if later is None:
+            return None
+        fields += [os.path.abspath(later) if later == settings.change_path else settings.change_path,
+                   os.path.getmtime(later), settings.change_fusion]
+    return hashlib.sha1(json.dumps(fields, default=str).encode("utf-8")).hexdigest()
+
+
+class TileCache:
+    """Size-bounded, least recently used on-disk store of tile outputs.
+
+    Args:
+        directory (str): Cache directory, created if needed.
+        max_bytes (int): Size above which the least recently used entries are evicted.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        # Current size, so eviction does not have to rescan on every write
+        self.size = sum(entry.stat().st_size for entry in self._entries())
+
+    def _entries(self):
+        for fan_out in os.scandir(self.directory):
+            if fan_out.is_dir():
+                for entry in os.scandir(fan_out.path):
+                    if entry.name.endswith(".npy"):
+                        yield entry
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".npy")
+
+    @staticmethod
+    def key(fingerprint, tile, extra=""):
+        """Cache key of one tile window of a run with the given fingerprint."""
+        window = f"{tile.x},{tile.y},{tile.xsize},{tile.ysize}"
+        return hashlib.sha1(f"{fingerprint}|{window}|{extra}".encode("utf-8")).hexdigest()
+
+    def contains(self, key):
+        """Whether ``key`` is cached; counted in the hit rate."""
+        if os.path.exists(self._path(key)):
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def get(self, key):
+        """Cached scores for ``key``, or None."""
+        path = self._path(key)
+        try:
+            scores = np.load(path)
+            os.utime(path)  # Mark as recently used
+        except (OSError, ValueError):
+            return None
+        return scores
+
+    def put(self, key, scores):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial_path = path + ".partial"
+        with open(partial_path, "wb") as f:
+            np.save(f, scores)
+        try:
+            replaced = os.path.getsize(path)  # Overwriting a key frees its old file
+        except OSError:
+            replaced = 0
+        os.replace(partial_path, path)
+        with self.lock:
+            self.size += os.path.getsize(path) - replaced
+            if self.size > self.max_bytes:
+                self.evict()
+
+    def discard(self, key):
+        path = self._path(key)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self.lock:
+            self.size -= size
+
+    def evict(self):
+        """Remove the least recently used entries until the cache is 10% under its limit."""
+        entries = sorted((entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = 0.9 * self.max_bytes
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self.size = total
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
@@ -0,0 +1,196 @@
+"""
+Bi-temporal change detection.
+
+Two rasters of the same area, an earlier and a later date, are put on a
+common grid once: the earlier raster's pixel grid, clipped to the overlap of
+both footprints. Both dates are exposed on that grid as in-memory VRTs. The
+earlier one is a plain window of its source. The later one is a window too
+when it shares the earlier CRS and pixel grid, and a warped VRT otherwise,
+resampled lazily window by window as it is read. Neither scene is ever
+loaded whole or written to disk.
+
+PairedWindowReader reads the same window from both dates in lockstep, so
+the regular engine (tile cache, AOI culling, checkpoints, blending, writer)
+runs on a pair exactly as on a single raster; ChangePreprocessor fuses the
+two dates into the model input.
+"""
+import math
+
+import numpy as np
+from osgeo import gdal, osr
+
+from .spectra_inference import EngineFeedback, InferenceEngine, RasterWindowReader
+
+
+gdal.UseExceptions()
+
+
+# Common grid
+# ----------------------------------------------------------------------------------------------------------
+def _bounds(dataset):
+    """(xmin, ymin, xmax, ymax) of a north-up dataset.
+
+    Raises:
+        ValueError: If the geotransform is rotated.
+    """
+    x0, dx, rx, y0, ry, dy = dataset.GetGeoTransform()
+    if rx or ry:
+        raise ValueError("Change detection needs north-up rasters (no rotated geotransform)")
+    x1, y1 = x0 + dx * dataset.RasterXSize, y0 + dy * dataset.RasterYSize
+    return min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)
+
+
+def _srs(dataset):
+    projection = dataset.GetProjection()
+    if not projection:
+        return None
+    srs = osr.SpatialReference()
+    srs.ImportFromWkt(projection)
+    srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    return srs
+
+
+def _vrt_xml(dataset):
+    """XML of an in-memory VRT, which gdal.Open (and so a worker process) can reopen."""
+    return dataset.GetMetadata("xml:VRT")[0]
+
+
+def common_grid(earlier_path, later_path):
+    """Both dates on the earlier raster's pixel grid, clipped to their overlap.
+
+    Returns:
+        tuple: (earlier_xml, later_xml, warped) where the XMLs describe
+        in-memory VRTs of identical size and geotransform, and warped tells
+        whether the later date is resampled (different CRS or pixel grid).
+
+    Raises:
+        ValueError: If the rasters do not overlap.
+    """
+    earlier = gdal.Open(earlier_path, gdal.GA_ReadOnly)
+    later = gdal.Open(later_path, gdal.GA_ReadOnly)
+    x0, dx, _, y0, _, dy = earlier.GetGeoTransform()
+    earlier_srs, later_srs = _srs(earlier), _srs(later)
+    reproject = earlier_srs is not None and later_srs is not None and not earlier_srs.IsSame(later_srs)
+
+    xmin, ymin, xmax, ymax = _bounds(later)
+    if reproject:
+        transform = osr.CoordinateTransformation(later_srs, earlier_srs)
+        xmin, ymin, xmax, ymax = transform.TransformBounds(xmin, ymin, xmax, ymax, 21)
+    exmin, eymin, exmax, eymax = _bounds(earlier)
+    xmin, ymin, xmax, ymax = max(xmin, exmin), max(ymin, eymin), min(xmax, exmax), min(ymax, eymax)
+
+    # Earlier pixels lying entirely inside the overlap
+    columns = sorted(((xmin - x0) / dx, (xmax - x0) / dx))
+    rows = sorted(((ymin - y0) / dy, (ymax - y0) / dy))
+    xoff, yoff = math.ceil(columns[0] - 1e-6), math.ceil(rows[0] - 1e-6)
+    width, height = math.floor(columns[1] + 1e-6) - xoff, math.floor(rows[1] + 1e-6) - yoff
+    if width <= 0 or height <= 0:
+        raise ValueError("The two rasters do not overlap")
+    earlier_vrt = gdal.Translate("", earlier, format="VRT", srcWin=[xoff, yoff, width, height])
+    gx0, gy0 = x0 + xoff * dx, y0 + yoff * dy
+
+    # Same CRS and pixel grid: a plain window of the later raster, no resampling
+    lx0, ldx, _, ly0, _, ldy = later.GetGeoTransform()
+    lxoff, lyoff = (gx0 - lx0) / ldx, (gy0 - ly0) / ldy
+    same_grid = (not reproject and math.isclose(ldx, dx) and math.isclose(ldy, dy)
+                 and abs(lxoff - round(lxoff)) < 1e-6 and abs(lyoff - round(lyoff)) < 1e-6)
+    if same_grid:
+        later_vrt = gdal.Translate("", later, format="VRT",
+                                   srcWin=[round(lxoff), round(lyoff), width, height])
+    else:
+        later_vrt = gdal.Warp("", later, format="VRT", dstSRS=earlier.GetProjection() or None,
+                              outputBounds=(min(gx0, gx0 + width * dx), min(gy0, gy0 + height * dy),
+                                            max(gx0, gx0 + width * dx), max(gy0, gy0 + height * dy)),
+                              width=width, height=height, resampleAlg="bilinear")
+    return _vrt_xml(earlier_vrt), _vrt_xml(later_vrt), not same_grid
+# ----------------------------------------------------------------------------------------------------------
+
+
+
+# Paired windowed I/O
+# ----------------------------------------------------------------------------------------------------------
+class PairedWindowReader:
+    """Reads the same window from both dates, as (2 x bands, size, size), earlier date first.
+
+    Quacks like RasterWindowReader; ``dataset`` is the earlier date on the
+    common grid, which the output is created like.
+
+    Args:
+        earlier (str): Earlier date, on the common grid (see common_grid).
+        later (str): Later date, on the same grid.
+        bands (list): 1-based bands read from each date, all bands if None.
+    """
+
+    def __init__(self, earlier, later, bands=None):
+        self.earlier = RasterWindowReader(earlier, bands)
+        self.later = RasterWindowReader(later, self.earlier.bands)
+        if self.later.dataset.RasterCount < max(self.earlier.bands):
+            raise ValueError(f"The later raster has {self.later.dataset.RasterCount} bands, "
+                             f"band {max(self.earlier.bands)} is needed")
+        self.dataset = self.earlier.dataset
+        self.width = self.earlier.width
+        self.height = self.earlier.height
+        # Channels read per tile, so schedulers size their buffers for both dates
+        self.bands = self.earlier.bands + self.later.bands
+
+    def read(self, tile, size):
+        return np.concatenate([self.earlier.read(tile, size), self.later.read(tile, size)])
+
+    def close(self):
+        self.earlier.close()
+        self.later.close()
+        self.dataset = None
+
+
+class PairSource:
+    """Picklable recipe of a PairedWindowReader, so preprocessing workers open the pair themselves."""
+
+    def __init__(self, earlier, later, bands=None):
+        self.earlier = earlier
+        self.later = later
+        self.bands = bands
+
+    def __call__(self):
+        return PairedWindowReader(self.earlier, self.later, self.bands)
+
+
+def window_reader(settings):
+    """Window reader of a run's input: the pair of dates for change detection, the raster otherwise."""
+    if settings.change_path:
+        return PairSource(*common_grid(settings.raster_path, settings.change_path)[:2], settings.bands)()
+    return RasterWindowReader(settings.raster_path, settings.bands)
+# ----------------------------------------------------------------------------------------------------------
+
+
+
+# Engine
+# ----------------------------------------------------------------------------------------------------------
+class ChangeEngine(InferenceEngine):
+    """InferenceEngine over two dates: raster_path (earlier) and change_path (later).
+
+    The common grid is computed once per run; the result covers the overlap
+    of both rasters on the earlier raster's pixel grid.
+    """
+
+    def __init__(self, model, settings, job=None):
+        super().__init__(model, settings, job)
+        self.source = None
+
+    def run(self, feedback=None):
+        feedback = feedback or EngineFeedback()
+        settings = self.settings
+        if settings.mask_path:
+            raise ValueError("Change detection takes AOI polygons, not a mask raster")
+        earlier, later, warped = common_grid(settings.raster_path, settings.change_path)
+        self.source = PairSource(earlier, later, settings.bands)
+        feedback.pushInfo("Change detection: " + ("later date warped on the fly onto the earlier grid"
+                                                  if warped else "both dates on the same pixel grid")
+                          + f", {settings.change_fusion} fusion")
+        return super().run(feedback)
+
+    def _open_reader(self):
+        return self.source()
+
+    def _reader_source(self):
+        return self.source
+# ----------------------------------------------------------------------------------------------------------
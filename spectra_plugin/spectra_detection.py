@@ -0,0 +1,335 @@
+"""
+Object detection over tiled rasters.
+
+Detection models return boxes instead of score maps: (N, K, 6) arrays whose
+rows are [x0, y0, x1, y1, score, class] in model input pixels, with score 0
+rows as padding. Boxes from every tile are moved to raster pixels, and
+neighbouring tiles see the same object twice in their overlap. A global
+non-maximum suppression removes those duplicates. Boxes are bucketed in a
+uniform grid, so only boxes in neighbouring cells are ever compared.
+"""
+import os
+
+import numpy as np
+from osgeo import gdal, ogr
+
+from .spectra_inference import EngineFeedback, RasterWindowReader, StageTimer, TileGrid, TileBatchScheduler
+from .spectra_preprocess import ParallelTileBatcher
+from .spectra_vectorize import FeatureWriter
+
+
+# Non-maximum suppression
+# ----------------------------------------------------------------------------------------------------------
+def box_iou(first, second):
+    """Element-wise IoU of two (N, 4) [x0, y0, x1, y1] box arrays."""
+    width = np.minimum(first[:, 2], second[:, 2]) - np.maximum(first[:, 0], second[:, 0])
+    height = np.minimum(first[:, 3], second[:, 3]) - np.maximum(first[:, 1], second[:, 1])
+    intersection = np.clip(width, 0, None) * np.clip(height, 0, None)
+    area_first = (first[:, 2] - first[:, 0]) * (first[:, 3] - first[:, 1])
+    area_second = (second[:, 2] - second[:, 0]) * (second[:, 3] - second[:, 1])
+    return intersection / np.maximum(area_first + area_second - intersection, 1e-9)
+
+
+def _candidate_pairs(boxes, cell_size):
+    """(i, j) index pairs, i < j, including every pair of overlapping boxes.
+
+    Two overlapping boxes no larger than a cell have their centres in the
+    same or adjacent grid cells. The few larger boxes are paired in a
+    separate pass (see _oversized_pairs).
+    """
+    first, second = _grid_pairs(boxes, cell_size)
+    edges = np.max(boxes[:, 2:] - boxes[:, :2], axis=1)
+    oversized = np.flatnonzero(edges > cell_size)
+    if len(oversized) == 0:
+        return first, second
+
+    extra_first, extra_second = _oversized_pairs(boxes, oversized, edges, cell_size)
+    first = np.concatenate([first, extra_first])
+    second = np.concatenate([second, extra_second])
+    # Oriented and deduplicated, as a pair may be found by both passes
+    low, high = np.minimum(first, second), np.maximum(first, second)
+    keep = low < high
+    pairs = np.unique(low[keep] * len(boxes) + high[keep])
+    return pairs // len(boxes), pairs % len(boxes)
+
+
+def _oversized_pairs(boxes, oversized, edges, cell_size):
+    """Pairs of each box larger than a cell with every box that may overlap it.
+
+    A box no larger than a cell overlapping an oversized box has its centre
+    within half a cell of it, so boxes are sorted by centre x once and each
+    oversized box only looks at the x range it can reach. Oversized boxes are
+    paired among themselves on a grid sized for them.
+    """
+    centres = (boxes[:, :2] + boxes[:, 2:]) / 2
+    by_x = np.argsort(centres[:, 0], kind="stable")
+    sorted_x = centres[by_x, 0]
+    margin = cell_size / 2
+    starts = np.searchsorted(sorted_x, boxes[oversized, 0] - margin, side="left")
+    stops = np.searchsorted(sorted_x, boxes[oversized, 2] + margin, side="right")
+    first, second = [], []
+    for index, start, stop in zip(oversized, starts, stops):
+        near = by_x[start:stop]
+        rows = centres[near, 1]
+        near = near[(rows >= boxes[index, 1] - margin) & (rows <= boxes[index, 3] + margin)]
+        first.append(np.full(len(near), index))
+        second.append(near)
+    if len(oversized) > 1:
+        among_first, among_second = _grid_pairs(boxes[oversized], float(edges[oversized].max()))
+        first.append(oversized[among_first])
+        second.append(oversized[among_second])
+    return np.concatenate(first), np.concatenate(second)
+
+
+def _grid_pairs(boxes, cell_size):
+    """(i, j) index pairs, i < j, of boxes whose centres lie in the same or adjacent grid cells."""
+    centres = (boxes[:, :2] + boxes[:, 2:]) / 2
+    cells = np.floor(centres / cell_size).astype(np.int64)
+    cells -= cells.min(axis=0)
+    stride = cells[:, 1].max() + 3
+    keys = (cells[:, 0] + 1) * stride + cells[:, 1] + 1
+
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    first, second = [], []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            # Sorted needles keep searchsorted cache friendly on millions of boxes
+            neighbour = sorted_keys + dx * stride + dy
+            start = np.searchsorted(sorted_keys, neighbour, side="left")
+            stop = np.searchsorted(sorted_keys, neighbour, side="right")
+            counts = stop - start
+            # Expand every box against the boxes of its neighbour cell
+            rows = np.repeat(order, counts)
+            offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            first.append(rows)
+            second.append(order[np.repeat(start, counts) + offsets])
+    first, second = np.concatenate(first), np.concatenate(second)
+    keep = first < second
+    return first[keep], second[keep]
+
+
+def grid_nms(boxes, scores, classes=None, iou_threshold=0.5, cell_size=None):
+    """Greedy non-maximum suppression, bucketed by a uniform grid.
+
+    Gives the same result as the usual O(N^2) greedy NMS: a box is dropped
+    when a kept box of the same class with a higher score overlaps it by
+    more than ``iou_threshold``.
+
+    Args:
+        boxes (ndarray): (N, 4) [x0, y0, x1, y1] boxes.
+        scores (ndarray): (N,) confidences.
+        classes (ndarray): (N,) class values; boxes of different classes never suppress each other.
+        cell_size (float): Grid cell edge, by default the 99th percentile of
+            the box edges, so a few huge boxes do not make the grid one big cell.
+
+    Returns:
+        ndarray: Indexes of the kept boxes, by decreasing score.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    scores = np.asarray(scores, dtype=np.float64)
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64)
+    if cell_size is None:
+        cell_size = max(float(np.percentile(np.max(boxes[:, 2:] - boxes[:, :2], axis=1), 99)), 1e-9)
+
+    # Rank 0 is the best box; pairs are oriented from the better to the worse box
+    order = np.argsort(-scores, kind="stable")
+    rank = np.empty(len(boxes), dtype=np.int64)
+    rank[order] = np.arange(len(boxes))
+
+    first, second = _candidate_pairs(boxes, cell_size)
+    better = np.where(rank[first] < rank[second], first, second)
+    worse = np.where(rank[first] < rank[second], second, first)
+    overlapping = box_iou(boxes[better], boxes[worse]) > iou_threshold
+    if classes is not None:
+        classes = np.asarray(classes)
+        overlapping &= classes[better] == classes[worse]
+    better, worse = better[overlapping], worse[overlapping]
+
+    # Resolve the greedy order on the conflict graph, a whole wave of boxes at a time:
+    # a box is kept once every better box overlapping it is suppressed, and
+    # suppressed as soon as one of them is kept. Waves are as many as the
+    # longest chain of overlapping boxes, not as many as the boxes.
+    undecided, kept, suppressed = 0, 1, 2
+    status = np.full(len(boxes), kept, dtype=np.int8)
+    status[worse] = undecided
+    while len(worse):
+        status[worse[status[better] == kept]] = suppressed
+        blocked = np.zeros(len(boxes), dtype=bool)
+        blocked[worse[status[better] != suppressed]] = True
+        status[(status == undecided) & ~blocked] = kept
+        # Pairs whose worse box is decided will never matter again
+        open_pairs = status[worse] == undecided
+        better, worse = better[open_pairs], worse[open_pairs]
+    return order[status[order] == kept]
+# ----------------------------------------------------------------------------------------------------------
+
+
+
+# Engine
+# ----------------------------------------------------------------------------------------------------------
+class DetectionEngine:
+    """Runs a box detection model over every tile and writes deduplicated boxes.
+
+    A tile only keeps the boxes whose centre lies in its core window (see
+    TileGrid.core_window), so every object is reported by the tile owning its
+    centre, however large; the NMS removes what neighbouring tiles still
+    report twice. With AOI polygons, tiles outside are skipped and boxes
+    whose centre is outside are dropped. The boxes go to
+    ``settings.vector_path``, or to a GeoPackage next to the output path.
+
+    Args:
+        model: Backend whose ``predict`` returns (N, K, 6) boxes.
+        settings (InferenceSettings): The run parameters.
+    """
+
+    def __init__(self, model, settings):
+        self.model = model
+        self.settings = settings
+
+    def run(self, feedback=None):
+        """Process the whole raster.
+
+        Returns:
+            str: The vector output path, or None if the run was cancelled.
+        """
+        feedback = feedback or EngineFeedback()
+        settings = self.settings
+        size = settings.tile_size
+        scale = size / settings.resolution
+
+        reader = RasterWindowReader(settings.raster_path, settings.bands)
+        aoi_mask_path = settings.output_path + ".aoi.tif"
+        mask_reader = None
+        try:
+            grid = TileGrid(reader.width, reader.height, size, settings.overlap)
+            feedback.pushInfo(f"{reader.width} x {reader.height} px, {len(grid)} tiles of {size} px "
+                              f"({settings.overlap} px overlap), model input {settings.resolution} px")
+            tiles, mask_path, partial = self._plan_tiles(grid, reader, aoi_mask_path, feedback)
+            mask_reader = RasterWindowReader(mask_path) if mask_path else None
+            if settings.workers > 0:
+                scheduler = ParallelTileBatcher(tiles, settings.raster_path, reader.bands, size,
+                                                settings.preprocessor(), settings.batch_size, settings.workers)
+            else:
+                scheduler = TileBatchScheduler(tiles, reader, settings.batch_size, size, settings.preprocessor())
+
+            detections = []
+            done = 0
+            timer = StageTimer()
+            for batch_tiles, batch in scheduler:
+                if feedback.isCanceled():
+                    return None
+                predictions = np.asarray(self.model.predict(batch), dtype=np.float64)
+                for tile, boxes in zip(batch_tiles, predictions):
+                    boxes = self._tile_boxes(tile, boxes, scale, grid)
+                    if tile.index in partial:
+                        boxes = boxes[self._inside_aoi(boxes, mask_reader, grid.core_window(tile))]
+                    detections.append(boxes)
+                done += len(batch_tiles)
+                feedback.setProgress(90.0 * done / len(tiles))
+            timer.lap("inference")
+
+            detections = np.concatenate(detections) if detections else np.zeros((0, 6))
+            keep = grid_nms(detections[:, :4], detections[:, 4], detections[:, 5], settings.iou_threshold)
+            feedback.pushInfo(f"NMS: {len(detections)} boxes -> {len(keep)} in {timer.lap('nms'):.2f}s")
+
+            vector_path = settings.vector_path or os.path.splitext(settings.output_path)[0] + ".gpkg"
+            self._write(vector_path, reader.dataset, detections[keep], feedback)
+            if feedback.isCanceled():
+                return None
+            feedback.pushInfo(f"Write: {timer.lap('write'):.2f}s")
+        finally:
+            reader.close()
+            if mask_reader is not None:
+                mask_reader.close()
+            if os.path.exists(aoi_mask_path):
+                gdal.GetDriverByName("GTiff").Delete(aoi_mask_path)
+
+        feedback.setProgress(100.0)
+        feedback.pushInfo(f"Result written to {vector_path}")
+        return vector_path
+
+    def _plan_tiles(self, grid, reader, aoi_mask_path, feedback):
+        """Tiles to run and how to cull their boxes against the AOI.
+
+        Returns:
+            tuple: (tiles, mask_path, partial) where partial is the set of tile
+            indexes crossing the AOI boundary, whose boxes are checked against
+            the AOI rasterised into mask_path (None without an AOI).
+
+        Raises:
+            ValueError: If the AOI does not overlap the raster.
+        """
+        settings = self.settings
+        if not settings.aoi_wkt:
+            return grid, None, set()
+
+        # Imported here so worker processes, which import this module, never load qgis
+        from .spectra_aoi import AOITileClassifier, rasterize_aoi, OUTSIDE, PARTIAL
+
+        classifier = AOITileClassifier(settings.aoi_wkt, reader.dataset.GetGeoTransform())
+        tiles = []
+        partial = set()
+        for tile in grid:
+            location = classifier.classify(tile)
+            if location == OUTSIDE:
+                continue
+            tiles.append(tile)
+            if location == PARTIAL:
+                partial.add(tile.index)
+        feedback.pushInfo(f"AOI: {len(grid) - len(tiles)} of {len(grid)} tiles culled, "
+                          f"{len(partial)} on the AOI boundary")
+        if not tiles:
+            raise ValueError("The area of interest does not overlap the input raster")
+        if not partial:
+            return tiles, None, partial
+        return tiles, rasterize_aoi(settings.aoi_wkt, reader.dataset, aoi_mask_path), partial
+
+    @staticmethod
+    def _inside_aoi(boxes, mask_reader, window):
+        """Boolean mask of the boxes, owned by the core ``window``, whose centre pixel is inside the AOI."""
+        x, y, xsize, ysize = window
+        mask = mask_reader.dataset.GetRasterBand(1).ReadAsArray(x, y, xsize, ysize)
+        # Boxes are clipped to the raster after the ownership test, keep their centres in the window
+        centres = np.floor((boxes[:, :2] + boxes[:, 2:4]) / 2).astype(np.int64)
+        cols = np.clip(centres[:, 0] - x, 0, xsize - 1)
+        rows = np.clip(centres[:, 1] - y, 0, ysize - 1)
+        return mask[rows, cols] > 0
+
+    def _tile_boxes(self, tile, boxes, scale, grid):
+        """Valid boxes of one tile whose centre lies in its core window, in raster pixels."""
+        boxes = boxes[boxes[:, 4] >= self.settings.score_threshold].copy()
+        boxes[:, :4] *= scale
+        boxes[:, [0, 2]] += tile.x
+        boxes[:, [1, 3]] += tile.y
+
+        # Core windows tile the raster, so exactly one tile owns each centre
+        x, y, xsize, ysize = grid.core_window(tile)
+        centres = (boxes[:, :2] + boxes[:, 2:4]) / 2
+        owned = ((centres[:, 0] >= x) & (centres[:, 0] < x + xsize)
+                 & (centres[:, 1] >= y) & (centres[:, 1] < y + ysize))
+        boxes = boxes[owned]
+        boxes[:, [0, 2]] = np.clip(boxes[:, [0, 2]], 0, grid.width)
+        boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]], 0, grid.height)
+        return boxes
+
+    def _write(self, path, source, detections, feedback):
+        x0, dx, rx, y0, ry, dy = source.GetGeoTransform()
+        names = self.settings.classes or {}
+        writer = FeatureWriter(path, source, [("class", ogr.OFTInteger), ("name", ogr.OFTString),
+                                              ("score", ogr.OFTReal)])
+        try:
+            for left, top, right, bottom, score, value in detections:
+                ring = ogr.Geometry(ogr.wkbLinearRing)
+                for col, row in ((left, top), (right, top), (right, bottom), (left, bottom), (left, top)):
+                    ring.AddPoint_2D(x0 + col * dx + row * rx, y0 + col * ry + row * dy)
+                polygon = ogr.Geometry(ogr.wkbPolygon)
+                polygon.AddGeometry(ring)
+                writer.write(polygon, {"class": int(value), "name": names.get(int(value), ""),
+                                       "score": float(score)})
+                if writer.count % writer.BATCH_SIZE == 0 and feedback.isCanceled():
+                    break
+        finally:
+            writer.close()
+# ----------------------------------------------------------------------------------------------------------
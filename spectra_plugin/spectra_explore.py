@@ -0,0 +1,213 @@
+"""
+On-demand inference of the tiles in view (Explore mode of the graphics view).
+
+Instead of a full-scene run, the model only sees the tiles the graphics view
+shows, on the level-of-detail grid of spectra_tiles: zoomed out, a tile of
+level k covers TILE_SIZE * 2^k raster pixels read from the overviews, so the
+model sees the view's context at the view's scale; zoomed in to level 0 it
+runs at full resolution. Each tile is read with a margin of context on every
+side, cropped from the scores afterwards, so neighbouring tiles meet without
+seams. AOI and mask rasters are ignored, exploring is about the model.
+
+Tiles are inferred one at a time on a worker thread, nearest to the centre of
+the view first. Every viewport change replaces the queue, so tiles that left
+the view before their turn are never run. Coloured results come back on a
+thread-safe queue which the GUI drains, as with the tasks of spectra_task;
+the GUI keeps them in its tile cache.
+"""
+import math
+import queue
+import threading
+import time
+
+import numpy as np
+from osgeo import gdal
+
+from .spectra_backends import load_model
+from .spectra_inference import EngineFeedback
+from .spectra_preprocess import resize
+from .spectra_preview import class_palette, color_classes, color_scores
+from .spectra_quantize import reduced_precision_model
+from .spectra_tiles import TILE_SIZE
+
+
+gdal.UseExceptions()
+
+
+# Tile inference
+# ----------------------------------------------------------------------------------------------------------
+class TileInferencer:
+    """Model scores of single tiles of the level-of-detail grid.
+
+    Args:
+        model: Backend with a ``predict`` method (see spectra_backends).
+        settings (InferenceSettings): The run parameters; ``overlap`` relative
+            to ``tile_size`` sets the context margin of a tile.
+        grid (OverviewPyramid): Pyramid of the input; only its tile grid is
+            used, the input is read through this object's own dataset so it
+            can live on another thread.
+    """
+
+    def __init__(self, model, settings, grid):
+        self.model = model
+        self.settings = settings
+        self.grid = grid
+        self.preprocessor = settings.preprocessor()
+        self.dataset = gdal.Open(settings.raster_path, gdal.GA_ReadOnly)
+        self.bands = settings.bands or list(range(1, self.dataset.RasterCount + 1))
+        self.margin = TILE_SIZE * settings.overlap // max(settings.tile_size, 1)
+
+    def read(self, level, col, row):
+        """(bands, edge, edge) float32 window of a tile and its margin at ``level``, edge padded."""
+        factor = 2 ** level
+        edge = TILE_SIZE + 2 * self.margin
+        x, y = self.grid.tile_rect(level, col, row)[:2]
+        x0, y0 = x - self.margin * factor, y - self.margin * factor
+        left, top = max(0, x0), max(0, y0)
+        right = min(self.grid.width, x0 + edge * factor)
+        bottom = min(self.grid.height, y0 + edge * factor)
+        buffer = (max(1, math.ceil((right - left) / factor)), max(1, math.ceil((bottom - top) / factor)))
+        data = np.stack([
+            self.dataset.GetRasterBand(band).ReadAsArray(left, top, right - left, bottom - top, *buffer)
+            for band in self.bands
+        ]).astype(np.float32, copy=False)
+        pad_x, pad_y = (left - x0) // factor, (top - y0) // factor
+        data = data[:, :edge - pad_y, :edge - pad_x]
+        return np.pad(data, ((0, 0), (pad_y, edge - pad_y - data.shape[1]), (pad_x, edge - pad_x - data.shape[2])),
+                      mode="edge")
+
+    def infer(self, level, col, row):
+        """(classes, h, w) scores of a tile, one value per pixel of the tile at ``level``."""
+        data = self.preprocessor(self.read(level, col, row))
+        batch = np.zeros((self.settings.batch_size,) + data.shape, dtype=np.float32)
+        batch[0] = data
+        scores = np.asarray(self.model.predict(batch), dtype=np.float32)[0]
+
+        factor = 2 ** level
+        width, height = self.grid.tile_rect(level, col, row)[2:]
+        scores = resize(scores, TILE_SIZE + 2 * self.margin)
+        return scores[:, self.margin:self.margin + math.ceil(height / factor),
+                      self.margin:self.margin + math.ceil(width / factor)]
+
+    def close(self):
+        self.dataset = None
+# ----------------------------------------------------------------------------------------------------------
+
+
+
+# Worker
+# ----------------------------------------------------------------------------------------------------------
+class QueueFeedback(EngineFeedback):
+    """Puts log lines on a queue; cancelled once the worker is closed."""
+
+    def __init__(self, worker):
+        self.worker = worker
+
+    def isCanceled(self):
+        return self.worker.stopped
+
+    def pushInfo(self, info):
+        self.worker.messages.put(info)
+
+
+class ViewportInference:
+    """Infers the tiles the view asks for on a worker thread.
+
+    The model is loaded (or reused from the session cache) on the worker
+    thread. Results are (key, RGBA) pairs on ``results`` and log lines are
+    on ``messages``, both drained from the GUI thread.
+
+    Args:
+        settings (InferenceSettings): The run parameters; the output path is unused.
+        grid (OverviewPyramid): Pyramid of the input, whose (level, col, row)
+            tile keys are requested.
+        opacity (int): Alpha of coloured class and score pixels.
+
+    Raises:
+        ValueError: For runs whose results are not per-pixel maps of the input
+            (detection, change detection, forecasts).
+    """
+
+    def __init__(self, settings, grid, opacity=160):
+        if settings.detection:
+            raise ValueError("Explore shows class and score maps, not detected boxes")
+        if settings.change_path or settings.forecast_horizon:
+            raise ValueError("Explore runs on a single image, not on a pair of dates or a time series")
+        self.settings = settings
+        self.grid = grid
+        self.opacity = opacity
+        self.results = queue.Queue()  # (key, RGBA)
+        self.messages = queue.Queue()
+        self.condition = threading.Condition()
+        self.pending = []  # Keys still to infer, in order
+        self.running = None
+        self.failed = set()
+        self.stopped = False
+        self.palette = None
+        self.thread = threading.Thread(target=self.run, name="SPECTRA explore", daemon=True)
+        self.thread.start()
+
+    def request(self, keys):
+        """Queue ``keys`` in place of anything still queued, which is dropped.
+
+        Args:
+            keys (list): (level, col, row) tile keys, the most wanted first.
+        """
+        with self.condition:
+            self.pending = [key for key in keys if key != self.running and key not in self.failed]
+            self.condition.notify()
+
+    def close(self):
+        """Drop the queue and stop the worker once its current tile is done."""
+        with self.condition:
+            self.stopped = True
+            self.pending = []
+            self.condition.notify()
+
+    def colour(self, scores):
+        """(h, w, 4) uint8 RGBA of tile scores; the class palette is fixed by the first tile."""
+        if len(scores) == 1:
+            return color_scores(scores[0], self.opacity)
+        if self.palette is None:
+            self.palette = class_palette(max(len(scores), max(self.settings.classes or [0]) + 1))
+        return color_classes(np.argmax(scores, axis=0), None, self.palette, self.opacity)
+
+    def run(self):
+        """Worker thread entry point; must not touch any widget."""
+        settings = self.settings
+        feedback = QueueFeedback(self)
+        try:
+            model = load_model(reduced_precision_model(settings, feedback), settings.backend, feedback,
+                               **settings.model_options())
+            inferencer = TileInferencer(model, settings, self.grid)
+        except Exception as e:
+            self.messages.put(f"Explore failed: {e}")
+            return
+        feedback.pushInfo(f"Exploring with {settings.model_path}: tiles of {TILE_SIZE} px "
+                          f"with {inferencer.margin} px of context, inferred as they come into view")
+
+        try:
+            while True:
+                with self.condition:
+                    while not self.pending and not self.stopped:
+                        self.condition.wait()
+                    if self.stopped:
+                        return
+                    key = self.running = self.pending.pop(0)
+                start = time.perf_counter()
+                try:
+                    rgba = self.colour(inferencer.infer(*key))
+                except Exception as e:
+                    feedback.pushInfo(f"Tile {key[1]},{key[2]} at 1:{2 ** key[0]} failed: {e}")
+                    rgba = None
+                with self.condition:
+                    self.running = None
+                    if rgba is None:
+                        self.failed.add(key)  # request() reads it under the same lock
+                if rgba is not None:
+                    self.results.put((key, rgba))
+                    feedback.pushInfo(f"Tile {key[1]},{key[2]} at 1:{2 ** key[0]}: "
+                                      f"{time.perf_counter() - start:.2f}s")
+        finally:
+            inferencer.close()
+# ----------------------------------------------------------------------------------------------------------
@@ -0,0 +1,174 @@
+"""
+Per-pixel time-series forecasting (Prediction time mode).
+
+The input is a temporal stack: a multiband GeoTIFF whose bands are dates, or
+a NetCDF / HDF5 variable whose time dimension GDAL exposes as bands. The
+stack is read one spatial chunk at a time (tile_size x tile_size pixels,
+every date), the chunk is reshaped into a (pixels, dates) matrix and every
+pixel series of the chunk is forecast in a single vectorised call. No Python
+code runs per pixel, only per chunk and per forecast step.
+
+Forecasters share the backend ``predict`` API. Series go in as
+(N, dates, 1, 1), which sequence models (LSTM, Transformer) exported to any
+backend take as channels, and come out as (N, horizon) or (N, horizon, 1, 1).
+Batches keep a fixed shape: each chunk fills the same tile_size^2 buffer.
+ARIMA needs no model file, it is fitted per pixel by batched least squares
+(ArimaForecaster).
+
+The result has one float32 band per forecast step, "t+1" to "t+horizon".
+"""
+import numpy as np
+from osgeo import gdal
+
+from .spectra_inference import EngineFeedback, RasterWindowReader, StageTimer, TileGrid, _create_like
+
+
+gdal.UseExceptions()
+
+ARIMA_MODEL = "ARIMA"  # Model name of the built-in forecaster (no model file)
+
+
+# Forecasters
+# ----------------------------------------------------------------------------------------------------------
+class ArimaForecaster:
+    """ARIMA(p, d, 0) fitted to every series of a batch at once.
+
+    Each series is differenced ``d`` times, an AR(p) model with intercept is
+    fitted by least squares (all the normal equations are solved in one
+    batched call), forecast recursively and integrated back.
+
+    Args:
+        horizon (int): Steps forecast.
+        order (tuple): (p, d) autoregressive order and differencing.
+        ridge (float): Relative regularisation keeping flat series solvable.
+    """
+
+    def __init__(self, horizon, order=(3, 1), ridge=1e-6):
+        self.horizon = int(horizon)
+        self.p, self.d = (int(value) for value in order)
+        self.ridge = ridge
+
+    def predict(self, batch):
+        series = batch.reshape(len(batch), -1).astype(np.float64)
+        levels = []
+        for _ in range(self.d):
+            levels.append(series[:, -1])
+            series = np.diff(series, axis=1)
+        if series.shape[1] < 2 * self.p + 1:
+            raise ValueError(f"ARIMA({self.p}, {self.d}, 0) needs at least {2 * self.p + 1 + self.d} dates")
+
+        # Rows of the design matrix are [1, x(t-p), ..., x(t-1)] for every target x(t)
+        lags = np.lib.stride_tricks.sliding_window_view(series, self.p, axis=1)[:, :-1]
+        design = np.concatenate([np.ones(lags.shape[:2] + (1,)), lags], axis=2)
+        normal = design.transpose(0, 2, 1) @ design
+        normal += self.ridge * (np.trace(normal, axis1=1, axis2=2)[:, None, None] + 1) * np.eye(self.p + 1)
+        coefficients = np.linalg.solve(normal, design.transpose(0, 2, 1) @ series[:, self.p:, None])[..., 0]
+
+        window = series[:, -self.p:]
+        forecast = np.empty((len(series), self.horizon))
+        for step in range(self.horizon):
+            forecast[:, step] = coefficients[:, 0] + np.einsum("np,np->n", window, coefficients[:, 1:])
+            window = np.concatenate([window[:, 1:], forecast[:, step:step + 1]], axis=1)
+        for level in reversed(levels):
+            forecast = level[:, None] + np.cumsum(forecast, axis=1)
+        return forecast.astype(np.float32)
+# ----------------------------------------------------------------------------------------------------------
+
+
+
+# Engine
+# ----------------------------------------------------------------------------------------------------------
+class ForecastEngine:
+    """Forecasts every pixel of a temporal stack, chunk by chunk.
+
+    Args:
+        model: Forecaster or backend with a ``predict`` method (see module docstring).
+        settings (InferenceSettings): The run parameters; ``bands`` picks the
+            dates, ``tile_size`` is the chunk edge and ``forecast_horizon`` the
+            steps forecast. A single ``mean`` / ``std`` value normalises the
+            series for the model and is undone on its output.
+    """
+
+    def __init__(self, model, settings):
+        self.model = model
+        self.settings = settings
+
+    def run(self, feedback=None):
+        """Forecast the whole stack.
+
+        Returns:
+            str: Output path, or None if the run was cancelled.
+        """
+        feedback = feedback or EngineFeedback()
+        settings = self.settings
+        if settings.vector_path:
+            raise ValueError("Forecasts are written as a GeoTIFF, pick a .tif export")
+        size = settings.tile_size
+        horizon = settings.forecast_horizon
+
+        reader = RasterWindowReader(settings.raster_path, settings.bands)
+        dates = len(reader.bands)
+        nodata = reader.dataset.GetRasterBand(reader.bands[0]).GetNoDataValue()
+        grid = TileGrid(reader.width, reader.height, size)
+        feedback.pushInfo(f"{reader.width} x {reader.height} px, {dates} dates, {len(grid)} chunks of {size} px, "
+                          f"forecasting {horizon} steps")
+        mean = float(settings.mean[0]) if settings.mean else 0.0
+        std = float(settings.std[0]) if settings.std else 1.0
+
+        output = self._create_output(reader.dataset, horizon)
+        buffer = np.zeros((size * size, dates, 1, 1), dtype=np.float32)
+        timer = StageTimer()
+        try:
+            for number, tile in enumerate(grid, 1):
+                if feedback.isCanceled():
+                    return None
+                data = reader.read(tile, size)[:, :tile.ysize, :tile.xsize]
+                series = data.reshape(dates, -1).T
+                valid = np.isfinite(series).all(axis=1)
+                if nodata is not None:
+                    valid &= (series != nodata).all(axis=1)
+                timer.lap("read")
+
+                forecast = np.full((len(series), horizon), np.nan, dtype=np.float32)
+                if valid.any():
+                    count = int(valid.sum())
+                    buffer[:count, :, 0, 0] = (series[valid] - mean) / std
+                    buffer[count:] = 0
+                    scores = np.asarray(self.model.predict(buffer), dtype=np.float32)
+                    forecast[valid] = scores.reshape(len(buffer), -1)[:count, :horizon] * std + mean
+                timer.lap("model")
+
+                bands = forecast.T.reshape(horizon, tile.ysize, tile.xsize)
+                for step in range(horizon):
+                    output.GetRasterBand(step + 1).WriteArray(bands[step], tile.x, tile.y)
+                timer.lap("write")
+                feedback.setProgress(99.0 * number / len(grid))
+            feedback.pushInfo(f"Read: {timer.totals.get('read', 0.0):.2f}s, "
+                              f"forecast: {timer.totals.get('model', 0.0):.2f}s, "
+                              f"write: {timer.totals.get('write', 0.0):.2f}s")
+        finally:
+            output.FlushCache()
+            output = None
+            reader.close()
+
+        feedback.setProgress(100.0)
+        feedback.pushInfo(f"Result written to {settings.output_path}")
+        return settings.output_path
+
+    def _create_output(self, source, horizon):
+        """Tiled float32 GeoTIFF on the stack's grid, one band per forecast step."""
+        settings = self.settings
+        compression = settings.compression
+        if compression == "ZSTD" and "ZSTD" not in (gdal.GetDriverByName("GTiff")
+                                                    .GetMetadataItem("DMD_CREATIONOPTIONLIST") or ""):
+            compression = "DEFLATE"
+        options = ["TILED=YES", "BIGTIFF=YES" if settings.bigtiff else "BIGTIFF=IF_SAFER"]
+        if compression != "NONE":
+            options += [f"COMPRESS={compression}", "PREDICTOR=3", "NUM_THREADS=ALL_CPUS"]
+        dataset = _create_like(settings.output_path, source, horizon, gdal.GDT_Float32, options)
+        for step in range(horizon):
+            band = dataset.GetRasterBand(step + 1)
+            band.SetNoDataValue(float("nan"))
+            band.SetDescription(f"t+{step + 1}")
+        return dataset
+# ----------------------------------------------------------------------------------------------------------
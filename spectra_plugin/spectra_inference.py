@@ -0,0 +1,975 @@
+"""
+Tiled, windowed raster inference engine.
+
+The input raster is never loaded as a whole: it is read one window at a time
+on an overlapping tile grid, every tile is pushed through the model, the
+overlaps are blended with a linear ramp and the result is streamed to disk.
+Peak memory is bounded by the tile size, not by the scene size.
+"""
+import hashlib
+import inspect
+import json
+import math
+import os
+import shutil
+import tempfile
+import time
+from collections import deque, namedtuple
+
+import numpy as np
+from osgeo import gdal
+
+from .spectra_preprocess import Preprocessor, ChangePreprocessor, ParallelTileBatcher, prepare_tile, resize
+from .spectra_vectorize import StreamingPolygonizer
+from .spectra_cache import TileCache, run_fingerprint
+
+
+gdal.UseExceptions()
+
+
+# Settings / Feedback
+# ----------------------------------------------------------------------------------------------------------
+class InferenceSettings:
+    """Everything the engine needs to know about one run.
+
+    Args:
+        raster_path (str): Source raster (any GDAL readable dataset).
+        output_path (str): Destination GeoTIFF.
+        model_path (str): Model file picked in the Models combo.
+        backend (str): Registered model backend, picked by file extension if None.
+        tile_size (int): Tile edge in pixels (Patch Size field).
+        overlap (int): Overlap between neighbouring tiles in pixels.
+            Defaults to 1/8 of the tile size.
+        batch_size (int): Tiles per model call (Batch Size field).
+        resolution (int): Model input edge in pixels (Image Resolution field).
+        bands (list): 1-based band indexes to read, all bands if None.
+        mean (list): Per-band normalisation mean (model order).
+        std (list): Per-band normalisation standard deviation (model order).
+        classes (dict): Class value -> name table written to the output, if known.
+        aoi_wkt (list): AOI polygons as WKT in the raster CRS; tiles outside are skipped.
+        mask_path (str): Optional mask raster aligned with the input (0 = outside),
+            used when no AOI polygons are given.
+        workers (int): Preprocessing processes; 0 prepares tiles in the calling thread.
+        intra_op_threads (int): Model threads inside one operator, 0 = runtime default.
+        inter_op_threads (int): Model operators run concurrently, 0 = runtime default.
+        optimization (str): Graph optimisation level (see spectra_backends).
+        precision (str): Model precision (see spectra_quantize.PRECISIONS).
+        compression (str): Output GeoTIFF compression, one of COMPRESSIONS.
+        bigtiff (bool): Always write BigTIFF; otherwise only when the output may exceed 4 GB.
+        overviews (bool): Build internal overviews once the output is complete.
+        vector_path (str): Also polygonise the result into this vector file
+            (Shapefile, GeoJSON, GPKG, KML or DXF).
+        detection (bool): The model outputs boxes (see spectra_detection), not score maps.
+        score_threshold (float): Lowest confidence of a kept box.
+        iou_threshold (float): Overlap above which the weaker of two boxes is suppressed.
+        cache_dir (str): Persistent tile output cache (see spectra_cache), disabled if None.
+        cache_size_mb (int): Cache size above which least recently used tiles are evicted.
+        scratch_dir (str): Where the memory-mapped score store of a run is kept until it
+            completes (see MemmapAccumulator); the system temp directory if None.
+        align_blocks (bool): Snap the tile stride to the raster's internal block size
+            (see align_tile_grid).
+        change_path (str): Later-date raster compared with raster_path, for change
+            detection runs (see spectra_change).
+        change_fusion (str): How the two dates are fed to the model, one of
+            spectra_preprocess.CHANGE_FUSIONS.
+        forecast_horizon (int): Time steps forecast per pixel of a temporal stack
+            (see spectra_forecast); 0 for any other run.
+        forecast_order (list): (p, d) of the built-in ARIMA forecaster.
+    """
+
+    def __init__(self, raster_path, output_path, model_path, backend=None, tile_size=256, overlap=None,
+                 batch_size=1, resolution=256, bands=None, mean=None, std=None,
+                 classes=None, aoi_wkt=None, mask_path=None, workers=0, intra_op_threads=0,
+                 inter_op_threads=0, optimization="All", precision="FP32", compression="DEFLATE",
+                 bigtiff=False, overviews=True, vector_path=None, detection=False, score_threshold=0.25,
+                 iou_threshold=0.5, cache_dir=None, cache_size_mb=2048, scratch_dir=None, align_blocks=True,
+                 change_path=None, change_fusion="stack", forecast_horizon=0, forecast_order=(3, 1)):
+        self.raster_path = raster_path
+        self.output_path = output_path
+        self.model_path = model_path
+        self.backend = backend
+        self.tile_size = int(tile_size)
+        self.overlap = self.tile_size // 8 if overlap is None else int(overlap)
+        self.batch_size = max(1, int(batch_size))
+        self.resolution = int(resolution)
+        self.bands = list(bands) if bands else None
+        self.mean = mean
+        self.std = std
+        self.classes = classes
+        self.aoi_wkt = list(aoi_wkt) if aoi_wkt else None
+        self.mask_path = mask_path
+        self.workers = max(0, int(workers))
+        self.intra_op_threads = int(intra_op_threads)
+        self.inter_op_threads = int(inter_op_threads)
+        self.optimization = optimization
+        self.precision = precision
+        self.compression = compression
+        self.bigtiff = bigtiff
+        self.overviews = overviews
+        self.vector_path = vector_path
+        self.detection = detection
+        self.score_threshold = float(score_threshold)
+        self.iou_threshold = float(iou_threshold)
+        self.cache_dir = cache_dir
+        self.cache_size_mb = int(cache_size_mb)
+        self.scratch_dir = scratch_dir
+        self.align_blocks = align_blocks
+        self.change_path = change_path
+        self.change_fusion = change_fusion
+        self.forecast_horizon = int(forecast_horizon)
+        self.forecast_order = list(forecast_order)
+
+    def preprocessor(self):
+        if self.change_path:
+            return ChangePreprocessor(self.resolution, self.mean, self.std, self.change_fusion)
+        return Preprocessor(self.resolution, self.mean, self.std)
+
+    def model_options(self):
+        """Load options of the model (see spectra_backends.load_model)."""
+        options = {
+            "intra_op_threads": self.intra_op_threads,
+            "inter_op_threads": self.inter_op_threads,
+            "optimization": self.optimization,
+        }
+        if self.change_path and self.change_fusion == "siamese":
+            options["siamese"] = True
+        return options
+
+    def to_dict(self):
+        """JSON-serialisable copy of the settings (see from_dict)."""
+        data = dict(vars(self))
+        if self.classes:
+            data["classes"] = {str(value): name for value, name in self.classes.items()}
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        """Settings saved by to_dict; keys this version does not know are ignored."""
+        known = inspect.signature(cls.__init__).parameters
+        data = {key: value for key, value in data.items() if key in known}
+        if data.get("classes"):
+            data["classes"] = {int(value): name for value, name in data["classes"].items()}
+        return cls(**data)
+
+
+def scratch_directory(settings):
+    """Scratch store of a run, stable across runs of the same output so an interrupted run can resume."""
+    output = os.path.abspath(settings.output_path)
+    name = "spectra_" + hashlib.sha1(output.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(settings.scratch_dir or tempfile.gettempdir(), name)
+
+
+class EngineFeedback:
+    """No-op feedback sink.
+
+    Mirrors the subset of QgsProcessingFeedback used by the engine
+    (isCanceled / setProgress / pushInfo), so a QgsProcessingFeedback can be
+    passed in directly where one is available.
+    """
+
+    def isCanceled(self):
+        return False
+
+    def setProgress(self, progress):
+        pass
+
+    def pushInfo(self, info):
+        pass
+# ----------------------------------------------------------------------------------------------------------
+
+
+
+# Tile grid
+# ----------------------------------------------------------------------------------------------------------
+# x, y, xsize, ysize describe the part of the tile that lies inside the raster.
+# Tiles are always read as size x size, the remainder is padded.
+Tile = namedtuple("Tile", ["index", "row", "col", "x", "y", "xsize", "ysize"])
+
+
+class TileGrid:
+    """Overlapping tile grid over a width x height raster (row-major order)."""
+
+    def __init__(self, width, height, tile_size, overlap=0):
+        if tile_size <= 0:
+            raise ValueError("Tile size must be positive")
+        if not 0 <= overlap < tile_size:
+            raise ValueError("Overlap must be smaller than the tile size")
+
+        self.width = width
+        self.height = height
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.stride = tile_size - overlap
+        self.cols = self._count(width)
+        self.rows = self._count(height)
+
+    def _count(self, length):
+        return 1 + max(0, math.ceil((length - self.tile_size) / self.stride))
+
+    def __len__(self):
+        return self.rows * self.cols
+
+    def __iter__(self):
+        for row in range(self.rows):
+            for col in range(self.cols):
+                yield self.tile(row, col)
+
+    def tile(self, row, col):
+        x = col * self.stride
+        y = row * self.stride
+        return Tile(row * self.cols + col, row, col, x, y,
+                    min(self.tile_size, self.width - x),
+                    min(self.tile_size, self.height - y))
+
+    def core_window(self, tile):
+        """Part of the tile it owns once overlaps are blended.
+
+        Neighbouring core windows split each overlap in half, so together they
+        cover every pixel of the raster exactly once.
+
+        Returns:
+            tuple: (x, y, xsize, ysize) in raster pixel coordinates.
+        """
+        half = self.overlap // 2
+        x0 = tile.x if tile.col == 0 else tile.x + half
+        y0 = tile.y if tile.row == 0 else tile.y + half
+        x1 = tile.x + tile.xsize if tile.col == self.cols - 1 else tile.x + self.stride + half
+        y1 = tile.y + tile.ysize if tile.row == self.rows - 1 else tile.y + self.stride + half
+        return x0, y0, x1 - x0, y1 - y0
+
+
+def blend_weights(tile_size, overlap):
+    """2D weight window ramping linearly from the tile border across the overlap.
+
+    Weights never reach zero, so a pixel covered by a single tile (scene border)
+    keeps its value once the accumulated sum is normalised.
+    """
+    ramp = np.ones(tile_size, dtype=np.float32)
+    if overlap > 0:
+        edge = (np.arange(overlap, dtype=np.float32) + 0.5) / overlap
+        ramp[:overlap] = np.minimum(ramp[:overlap], edge)
+        ramp[-overlap:] = np.minimum(ramp[-overlap:], edge[::-1])
+    return np.outer(ramp, ramp)
+# ----------------------------------------------------------------------------------------------------------
+
+
+
+# Windowed I/O
+# ----------------------------------------------------------------------------------------------------------
+# Input rasters picked by extension: GeoTIFF / COG, VRT mosaics, JPEG2000, NetCDF and HDF5
+RASTER_EXTENSIONS = [".tif", ".tiff", ".vrt", ".jp2", ".j2k", ".nc", ".h5", ".hdf5", ".he5", ".hdf"]
+BLOCK_CACHE_LIMIT = 2 * 1024 ** 3  # Largest GDAL block cache align_tile_grid asks for
+
+
+def subdatasets(path):
+    """(name, description) of every subdataset of a NetCDF / HDF5 container, empty for plain rasters."""
+    try:
+        dataset = gdal.Open(path, gdal.GA_ReadOnly)
+    except RuntimeError:
+        return []  # Not readable; opening it as a layer reports the error
+    metadata = dataset.GetMetadata("SUBDATASETS") or {}
+    count = len([key for key in metadata if key.endswith("_NAME")])
+    return [(metadata[f"SUBDATASET_{number}_NAME"], metadata.get(f"SUBDATASET_{number}_DESC", ""))
+            for number in range(1, count + 1)]
+
+
+def resolve_subdataset(path, variable):
+    """GDAL name of the ``variable`` subdataset of a container (``path`` itself if it has none).
+
+    Raises:
+        ValueError: If the container has no such variable.
+    """
+    names = [name for name, _ in subdatasets(path)]
+    if not names:
+        return path
+    for name in names:
+        if name.endswith(":" + variable) or name.rsplit(":", 1)[-1].strip("/") == variable.strip("/"):
+            return name
+    raise ValueError(f"{os.path.basename(path)} has no subdataset {variable}")
+
+
+def align_tile_grid(settings, feedback=None):
+    """Snap the tile stride to the raster's internal blocks, so tiles start on block boundaries.
+
+    JPEG2000 codeblocks and COG tiles are decompressed a whole block at a
+    time; block-aligned windows never straddle more blocks than they need.
+    When a block fits in the stride, the stride is rounded to a multiple of
+    the (square) block size and the tile grows or shrinks with it, keeping
+    the overlap. Striped rasters and VRT mosaics are left alone. The GDAL block cache is also raised to hold
+    one grid row of blocks, so blocks shared by overlapping tiles are
+    decoded once. Calling it again on aligned settings changes nothing.
+    """
+    dataset = gdal.Open(settings.raster_path, gdal.GA_ReadOnly)
+    band = dataset.GetRasterBand(1)
+    block_x, block_y = band.GetBlockSize()
+    width, bands = dataset.RasterXSize, dataset.RasterCount
+    item_size = gdal.GetDataTypeSize(band.DataType) // 8
+    driver = dataset.GetDriver().ShortName
+    dataset = None
+
+    if not settings.align_blocks or driver == "VRT" or block_x != block_y or block_x >= width:
+        return settings
+    stride = settings.tile_size - settings.overlap
+    aligned = max(block_x, round(stride / block_x) * block_x)
+    if block_x <= stride and aligned != stride:
+        settings.tile_size = aligned + settings.overlap
+        if feedback is not None:
+            feedback.pushInfo(f"Tiles aligned to {block_x} px {driver} blocks: {settings.tile_size} px tiles")
+
+    # One grid row of tiles, plus the overlap the next row reads again
+    row_bytes = (settings.tile_size + block_y) * width * bands * item_size
+    if gdal.GetCacheMax() < row_bytes:
+        gdal.SetCacheMax(min(row_bytes, BLOCK_CACHE_LIMIT))
+    return settings
+
+
+class RasterWindowReader:
+    """Reads fixed-size windows from a GDAL dataset, padding past the raster edge.
+
+    ``path`` is anything gdal.Open takes, including the XML of an in-memory VRT.
+    """
+
+    def __init__(self, path, bands=None):
+        self.dataset = gdal.Open(path, gdal.GA_ReadOnly)
+        self.width = self.dataset.RasterXSize
+        self.height = self.dataset.RasterYSize
+        self.bands = bands or list(range(1, self.dataset.RasterCount + 1))
+
+    def read(self, tile, size):
+        """Returns a (bands, size, size) float32 array for the tile."""
+        data = np.stack([
+            self.dataset.GetRasterBand(band).ReadAsArray(tile.x, tile.y, tile.xsize, tile.ysize)
+            for band in self.bands
+        ]).astype(np.float32, copy=False)
+        if tile.xsize < size or tile.ysize < size:
+            data = np.pad(data, ((0, 0), (0, size - tile.ysize), (0, size - tile.xsize)), mode="edge")
+        return data
+
+    def close(self):
+        self.dataset = None
+
+
+class TileBatchScheduler:
+    """Groups tiles into fixed-shape batches for the model, preprocessing in-process.
+
+    Every batch is (batch_size, channels, resolution, resolution) and is filled into
+    the same preallocated buffer; the final partial batch is zero padded, so
+    runtimes see one input shape for the whole run and never retrace or
+    reallocate.
+
+    Yields:
+        tuple: (tiles, batch) where only the first len(tiles) rows of batch are real.
+    """
+
+    def __init__(self, tiles, reader, batch_size, tile_size, preprocessor, mask_reader=None, masked=None):
+        self.tiles = tiles
+        self.reader = reader
+        self.mask_reader = mask_reader
+        self.masked = masked  # Indexes of the tiles needing the mask, None = all of them
+        self.batch_size = batch_size
+        self.tile_size = tile_size
+        self.preprocessor = preprocessor
+        resolution = preprocessor.resolution
+        self.buffer = np.zeros((batch_size, preprocessor.channels(len(reader.bands)), resolution, resolution),
+                               dtype=np.float32)
+
+    def __len__(self):
+        return math.ceil(len(self.tiles) / self.batch_size)
+
+    def __iter__(self):
+        batch = []
+        for tile in self.tiles:
+            mask_reader = self.mask_reader if self.masked is None or tile.index in self.masked else None
+            self.buffer[len(batch)] = prepare_tile(self.reader, mask_reader, tile,
+                                                   self.tile_size, self.preprocessor)
+            batch.append(tile)
+            if len(batch) == self.batch_size:
+                yield batch, self.buffer
+                batch = []
+        if batch:
+            self.buffer[len(batch):] = 0
+            yield batch, self.buffer
+
+
+def _create_like(path, source, bands, data_type, options):
+    """Create a GeoTIFF with the size, CRS and geotransform of ``source``."""
+    driver = gdal.GetDriverByName("GTiff")
+    dataset = driver.Create(path, source.RasterXSize, source.RasterYSize, bands, data_type, options)
+    dataset.SetGeoTransform(source.GetGeoTransform())
+    dataset.SetProjection(source.GetProjection())
+    return dataset
+
+
+class MemmapAccumulator:
+    """Weighted sum of overlapping tile outputs, kept in memory-mapped arrays.
+
+    Class scores (classes, height, width) and overlap weights (height, width)
+    live in float32 files under ``directory``, so blending and the final
+    argmax run out of core whatever the scene size; the OS pages windows in
+    and out as tiles come and go.
+
+    The store is resumable at grid-row granularity: ``checkpoint(rows)``
+    flushes the arrays and saves the overlap band the next grid row will add
+    into. ``restore()`` rewinds a store left by an interrupted run to its
+    last checkpoint, dropping whatever was added after it.
+
+    Args:
+        directory (str): Scratch directory of this run, created if needed.
+        source: GDAL dataset of the input raster.
+        tile_size (int): Tile edge in pixels.
+        overlap (int): Tile overlap in pixels.
+        signature (str): Identifies the run parameters; a store written with
+            another signature is discarded instead of resumed.
+    """
+
+    STATE_NAME = "state.json"
+
+    def __init__(self, directory, source, tile_size, overlap, signature=None):
+        self.directory = directory
+        self.width = source.RasterXSize
+        self.height = source.RasterYSize
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.stride = tile_size - overlap
+        self.signature = signature
+        self.weights_2d = blend_weights(tile_size, overlap)
+        self.scores = None
+        self.weights = None
+        self.classes = 0
+        self.rows_done = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def resumable(self):
+        # One grid row must not reach past the start of the row after next
+        return self.signature is not None and 2 * self.overlap <= self.tile_size
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _open(self, classes, mode):
+        self.classes = classes
+        self.scores = np.memmap(self._path("scores.f32"), np.float32, mode,
+                                shape=(classes, self.height, self.width))
+        self.weights = np.memmap(self._path("weights.f32"), np.float32, mode,
+                                 shape=(self.height, self.width))
+
+    def restore(self):
+        """Reopen the store of an interrupted run; returns the grid rows already done (0 = none)."""
+        try:
+            with open(self._path(self.STATE_NAME), encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        if (not self.resumable or state.get("signature") != self.signature
+                or (state.get("width"), state.get("height"), state.get("tile_size"), state.get("overlap"))
+                != (self.width, self.height, self.tile_size, self.overlap)):
+            # Another run's store: forget it before this run starts overwriting the arrays
+            shutil.rmtree(self.directory, ignore_errors=True)
+            os.makedirs(self.directory, exist_ok=True)
+            return 0
+
+        rows = state["rows_done"]
+        self._open(state["classes"], "r+")
+        # Put the next row's overlap band back as checkpointed and clear what the unfinished row added
+        band_start = min(self.height, rows * self.stride)
+        band_end = min(self.height, band_start + self.overlap) if rows else band_start
+        if rows:
+            band = np.load(self._path(f"band-{rows}.npy"))
+            self.scores[:, band_start:band_end] = band[:-1]
+            self.weights[band_start:band_end] = band[-1]
+        # Checkpoints are throttled, so rows well past the checkpointed one may hold tiles too
+        self.scores[:, band_end:] = 0
+        self.weights[band_end:] = 0
+        self.rows_done = rows
+        return rows
+
+    def checkpoint(self, rows):
+        """Record that every tile of the first ``rows`` grid rows has been added."""
+        if self.scores is None or not self.resumable:
+            return
+        self.scores.flush()
+        self.weights.flush()
+        band_start = min(self.height, rows * self.stride)
+        band_end = min(self.height, band_start + self.overlap)
+        band = np.concatenate([self.scores[:, band_start:band_end],
+                               self.weights[None, band_start:band_end]])
+        np.save(self._path(f"band-{rows}.npy"), band)
+
+        state = {
+            "signature": self.signature, "width": self.width, "height": self.height,
+            "tile_size": self.tile_size, "overlap": self.overlap, "classes": self.classes,
+            "rows_done": rows,
+        }
+        partial_path = self._path(self.STATE_NAME + ".partial")
+        with open(partial_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(partial_path, self._path(self.STATE_NAME))
+        if os.path.exists(self._path(f"band-{self.rows_done}.npy")) and self.rows_done != rows:
+            os.remove(self._path(f"band-{self.rows_done}.npy"))
+        self.rows_done = rows
+
+    def add(self, tile, scores):
+        """Accumulate (classes, tile_size, tile_size) scores for the tile."""
+        if self.scores is None:
+            self._open(scores.shape[0], "w+")
+        rows = slice(tile.y, tile.y + tile.ysize)
+        cols = slice(tile.x, tile.x + tile.xsize)
+        weights = self.weights_2d[:tile.ysize, :tile.xsize]
+        self.scores[:, rows, cols] += scores[:, :tile.ysize, :tile.xsize] * weights
+        self.weights[rows, cols] += weights
+
+    def read_blended(self, x, y, xsize, ysize):
+        """Normalised (classes, ysize, xsize) scores for a window."""
+        weights = self.weights[y:y + ysize, x:x + xsize]
+        return self.scores[:, y:y + ysize, x:x + xsize] / np.maximum(weights, 1e-6)
+
+    def close(self):
+        """Release the arrays, keeping the files for a later resume."""
+        self.scores = None
+        self.weights = None
+
+    def remove(self):
+        """Delete the store once the output is complete."""
+        self.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+# ----------------------------------------------------------------------------------------------------------
+
+
+
+# Output
+# ----------------------------------------------------------------------------------------------------------
+# Output GeoTIFF compressions, by the names shown in the Export group
+COMPRESSIONS = ["DEFLATE", "LZW", "ZSTD", "NONE"]
+
+
+class RasterWindowWriter:
+    """Streams finished windows into an internally tiled, compressed GeoTIFF.
+
+    Multi-class scores are stored as the argmax class index; a single score
+    band is stored as-is. Pixels outside the AOI are set to nodata. The CRS
+    and geotransform are copied from the source raster.
+
+    Args:
+        path (str): Output GeoTIFF.
+        source: GDAL dataset of the input raster.
+        classes (int): Score bands produced by the model.
+        class_names (dict): Class value -> name, written as category names.
+        compression (str): One of COMPRESSIONS; ZSTD falls back to DEFLATE
+            when this GDAL build lacks it.
+        bigtiff (bool): Force BigTIFF instead of letting GDAL decide.
+    """
+
+    BLOCK_SIZE = 256
+
+    def __init__(self, path, source, classes, class_names=None, compression="DEFLATE", bigtiff=False):
+        self.classes = classes
+        if classes == 1:
+            data_type, self.nodata = gdal.GDT_Float32, float("nan")
+        elif classes < 255:
+            data_type, self.nodata = gdal.GDT_Byte, 255
+        else:
+            data_type, self.nodata = gdal.GDT_UInt16, 65535
+        self.compression = compression
+        if compression == "ZSTD" and "ZSTD" not in (gdal.GetDriverByName("GTiff")
+                                                    .GetMetadataItem("DMD_CREATIONOPTIONLIST") or ""):
+            self.compression = "DEFLATE"
+        options = ["TILED=YES", f"BLOCKXSIZE={self.BLOCK_SIZE}", f"BLOCKYSIZE={self.BLOCK_SIZE}",
+                   "BIGTIFF=YES" if bigtiff else "BIGTIFF=IF_SAFER"]
+        if self.compression != "NONE":
+            options += [f"COMPRESS={self.compression}", "NUM_THREADS=ALL_CPUS"]
+            if classes == 1:
+                options.append("PREDICTOR=3")  # Floating point predictor, scores are smooth
+        self.dataset = _create_like(path, source, 1, data_type, options)
+        self.dataset.GetRasterBand(1).SetNoDataValue(self.nodata)
+        if class_names and classes > 1:
+            self.dataset.GetRasterBand(1).SetCategoryNames(
+                [class_names.get(value, "") for value in range(max(class_names) + 1)])
+
+    def write(self, scores, x, y, mask=None):
+        if self.classes == 1:
+            result = scores[0]
+        else:
+            result = np.argmax(scores, axis=0)
+        if mask is not None:
+            result = np.where(mask > 0, result, self.nodata)
+        self.dataset.GetRasterBand(1).WriteArray(result, x, y)
+        return result
+
+    def build_overviews(self, feedback=None):
+        """Add internal overviews down to a single block, so the result opens instantly.
+
+        Class maps are resampled with NEAREST so overviews only hold valid classes.
+        """
+        levels = []
+        size = max(self.dataset.RasterXSize, self.dataset.RasterYSize)
+        while size // (2 ** (len(levels) + 1)) >= self.BLOCK_SIZE:
+            levels.append(2 ** (len(levels) + 1))
+        if not levels:
+            return levels
+
+        def progress(complete, message, data):
+            if feedback is not None:
+                feedback.setProgress(99.0 + complete)
+                return 0 if feedback.isCanceled() else 1
+            return 1
+
+        self.dataset.FlushCache()
+        self.dataset.BuildOverviews("AVERAGE" if self.classes == 1 else "NEAREST", levels, progress)
+        return levels
+
+    def close(self):
+        if self.dataset is not None:
+            self.dataset.FlushCache()
+        self.dataset = None
+# ----------------------------------------------------------------------------------------------------------
+
+
+
+# Engine
+# ----------------------------------------------------------------------------------------------------------
+class StageTimer:
+    """Accumulates wall time per pipeline stage."""
+
+    def __init__(self):
+        self.totals = {}
+        self._last = time.perf_counter()
+
+    def lap(self, stage):
+        """Charge the time since the previous lap to ``stage`` and return it."""
+        now = time.perf_counter()
+        elapsed = now - self._last
+        self.totals[stage] = self.totals.get(stage, 0.0) + elapsed
+        self._last = now
+        return elapsed
+
+    def total(self):
+        return sum(self.totals.values())
+
+
+class InferenceEngine:
+    """Runs a model over a raster tile by tile and writes the blended result to disk.
+
+    Args:
+        model: Backend with a ``predict`` method (see spectra_backends).
+        settings (InferenceSettings): The run parameters.
+        job: Optional job (see spectra_jobs) whose manifest is checkpointed
+            along with the scratch store.
+    """
+
+    CHECKPOINT_SECONDS = 30  # Least time between two scratch store checkpoints
+    JOURNAL_BYTES = 256 * 1024 * 1024  # Size cap of the tile journal of a run without a tile cache
+
+    def __init__(self, model, settings, job=None):
+        self.model = model
+        self.settings = settings
+        self.job = job
+
+    def run(self, feedback=None):
+        """Process the whole raster.
+
+        Args:
+            feedback: QgsProcessingFeedback-like object (see EngineFeedback).
+
+        Returns:
+            str: Output path (the vector file if one was asked for), or None if
+            the run was cancelled.
+        """
+        feedback = feedback or EngineFeedback()
+        settings = self.settings
+        size = settings.tile_size
+
+        reader = self._open_reader()
+        grid = TileGrid(reader.width, reader.height, size, settings.overlap)
+        accumulator = MemmapAccumulator(scratch_directory(settings), reader.dataset, size, settings.overlap,
+                                        self._signature())
+        feedback.pushInfo(f"{reader.width} x {reader.height} px, {len(grid)} tiles of {size} px "
+                          f"({settings.overlap} px overlap), model input {settings.resolution} px")
+        if settings.workers:
+            feedback.pushInfo(f"Preprocessing on {settings.workers} worker processes")
+
+        aoi_mask_path = settings.output_path + ".aoi.tif"
+        mask_reader = None
+        completed = False
+        try:
+            tiles, mask_path, masked = self._plan_tiles(grid, reader, aoi_mask_path, feedback)
+            mask_reader = RasterWindowReader(mask_path) if mask_path else None
+            timer = StageTimer()
+
+            # Grid rows finished by an interrupted run are already in the scratch store
+            rows_done = accumulator.restore()
+            if rows_done:
+                feedback.pushInfo(f"Resuming from the scratch store: {rows_done} of {grid.rows} "
+                                  f"grid rows already done")
+            todo = [tile for tile in tiles if tile.row >= rows_done]
+
+            # Tiles already inferred by an earlier run are blended straight from the cache.
+            # Without a tile cache, a journal in the scratch store keeps the tiles inferred
+            # since the last checkpoint, so a resumed run restarts from its last batch.
+            # It costs one extra write of every tile's scores, and is capped at JOURNAL_BYTES:
+            # tiles evicted from it are inferred again by a resumed run.
+            journal = not settings.cache_dir
+            cache, keys = self._cache_keys(todo, mask_path, masked, accumulator.directory)
+            hits = [tile for tile in todo if cache is not None and cache.contains(keys[tile.index])]
+            if journal and hits:
+                feedback.pushInfo(f"{len(hits)} tiles recovered from the interrupted run")
+            elif cache is not None and not journal:
+                feedback.pushInfo(f"Tile cache: {len(hits)} of {len(todo)} tiles reused "
+                                  f"({100 * cache.hit_rate():.0f}% hit rate)")
+            hit_indexes = {tile.index for tile in hits}
+            pending = [tile for tile in todo if tile.index not in hit_indexes]
+
+            # Pass 1: infer every batch and accumulate the weighted scores, in grid order
+            scheduler = self._scheduler(pending, reader, mask_path, mask_reader, masked)
+            outputs = self._tile_outputs(scheduler, hits, cache, keys, reader, mask_reader, masked,
+                                         timer, feedback)
+            remaining = [0] * grid.rows
+            for tile in todo:
+                remaining[tile.row] += 1
+            row_tiles = [0] * grid.rows
+            for tile in tiles:
+                row_tiles[tile.row] += 1
+            journaled = []
+            last_checkpoint = time.perf_counter()
+            for done, (tile, tile_scores) in enumerate(outputs, 1):
+                accumulator.add(tile, resize(tile_scores, size))
+                if journal and cache is not None:
+                    journaled.append(tile)
+                timer.lap("blend")
+                feedback.setProgress(90.0 * done / len(todo))
+
+                # A finished grid row is a consistent resume point
+                remaining[tile.row] -= 1
+                finished = rows_done
+                while finished < grid.rows and remaining[finished] == 0:
+                    finished += 1
+                if finished > rows_done:
+                    rows_done = finished
+                    if time.perf_counter() - last_checkpoint >= self.CHECKPOINT_SECONDS:
+                        journaled = self._checkpoint(accumulator, rows_done, row_tiles, cache, keys,
+                                                     journaled)
+                        last_checkpoint = time.perf_counter()
+                        timer.lap("checkpoint")
+            if feedback.isCanceled():
+                return None
+            # A cancelled write pass resumes straight to pass 2
+            self._checkpoint(accumulator, rows_done, row_tiles, cache, keys, journaled)
+            self._log_throughput(feedback, len(pending), timer.total(), timer.totals.get("model", 0.0))
+            feedback.pushInfo(f"Blend: {timer.totals.get('blend', 0.0):.2f}s, "
+                              f"checkpoints: {timer.totals.get('checkpoint', 0.0):.2f}s")
+
+            # Pass 2: normalise each tile's core window and stream it out
+            writer = RasterWindowWriter(settings.output_path, reader.dataset, accumulator.classes,
+                                        settings.classes, settings.compression, settings.bigtiff)
+            polygonizer = None
+            if settings.vector_path:
+                polygonizer = StreamingPolygonizer(settings.vector_path, reader.dataset, settings.classes,
+                                                   writer.nodata)
+            try:
+                for number, tile in enumerate(tiles, 1):
+                    if feedback.isCanceled():
+                        return None
+                    x, y, xsize, ysize = grid.core_window(tile)
+                    mask = None
+                    if mask_reader is not None and (masked is None or tile.index in masked):
+                        mask = mask_reader.dataset.GetRasterBand(1).ReadAsArray(x, y, xsize, ysize)
+                    result = writer.write(accumulator.read_blended(x, y, xsize, ysize), x, y, mask)
+                    if polygonizer is not None:
+                        # Windows above this one's grid row are all done
+                        polygonizer.finish_rows(y)
+                        polygonizer.add(result, x, y)
+                    feedback.setProgress(90.0 + 9.0 * number / len(tiles))
+                feedback.pushInfo(f"Write ({writer.compression}): {timer.lap('write'):.2f}s")
+                if polygonizer is not None:
+                    count = polygonizer.close()
+                    feedback.pushInfo(f"Polygonise: {count} features into "
+                                      f"{os.path.basename(settings.vector_path)}, {timer.lap('vector'):.2f}s")
+                if settings.overviews:
+                    levels = writer.build_overviews(feedback)
+                    if feedback.isCanceled():
+                        return None
+                    if levels:
+                        feedback.pushInfo(f"Overviews {', '.join(map(str, levels))}: {timer.lap('overviews'):.2f}s")
+            finally:
+                writer.close()
+                if polygonizer is not None:
+                    polygonizer.close()
+            completed = True
+        finally:
+            if completed:
+                accumulator.remove()
+            else:
+                accumulator.close()
+            reader.close()
+            if mask_reader is not None:
+                mask_reader.close()
+            if os.path.exists(aoi_mask_path):
+                gdal.GetDriverByName("GTiff").Delete(aoi_mask_path)
+
+        feedback.pushInfo(f"Result written to {settings.vector_path or settings.output_path}")
+        return settings.vector_path or settings.output_path
+
+    def _open_reader(self):
+        """Window reader of the input, in the calling thread."""
+        return RasterWindowReader(self.settings.raster_path, self.settings.bands)
+
+    def _reader_source(self):
+        """What preprocessing workers open their own reader from (see ParallelTileBatcher)."""
+        return self.settings.raster_path
+
+    def _signature(self):
+        """Hash of everything the accumulated scores depend on, or None if the input has no mtime."""
+        settings = self.settings
+        fingerprint = run_fingerprint(settings, settings.model_path)
+        if fingerprint is None:
+            return None
+        extra = [settings.overlap, settings.aoi_wkt, settings.mask_path]
+        return hashlib.sha1(json.dumps([fingerprint, extra]).encode("utf-8")).hexdigest()
+
+    def _tile_outputs(self, scheduler, hits, cache, keys, reader, mask_reader, masked, timer, feedback):
+        """Yield (tile, model scores) in grid order, from the model or the tile cache.
+
+        Cache hits are merged in between the inferred tiles so the accumulator
+        always sees tiles in row-major order, which its checkpoints rely on.
+        Stops early if the run is cancelled.
+        """
+        hits = deque(hits)
+
+        def cached_before(index):
+            while hits and hits[0].index < index:
+                tile = hits.popleft()
+                scores = cache.get(keys[tile.index])
+                if scores is None:
+                    # Evicted since the run was planned
+                    scores = self._infer_one(tile, reader, mask_reader, masked)
+                timer.lap("cache")
+                yield tile, scores
+
+        for number, (batch_tiles, batch) in enumerate(scheduler, 1):
+            read_time = timer.lap("read")
+            if feedback.isCanceled():
+                return
+            scores = np.asarray(self.model.predict(batch), dtype=np.float32)
+            model_time = timer.lap("model")
+            feedback.pushInfo(f"Batch {number}/{len(scheduler)}: read {read_time:.3f}s, "
+                              f"model {model_time:.3f}s")
+            for tile, tile_scores in zip(batch_tiles, scores):
+                yield from cached_before(tile.index)
+                if cache is not None:
+                    cache.put(keys[tile.index], tile_scores)
+                yield tile, tile_scores
+            if feedback.isCanceled():
+                return
+        yield from cached_before(math.inf)
+
+    def _infer_one(self, tile, reader, mask_reader, masked):
+        """Model scores of a single tile, in a batch of the usual shape."""
+        settings = self.settings
+        if masked is not None and tile.index not in masked:
+            mask_reader = None
+        data = prepare_tile(reader, mask_reader, tile, settings.tile_size, settings.preprocessor())
+        batch = np.zeros((settings.batch_size,) + data.shape, dtype=np.float32)
+        batch[0] = data
+        return np.asarray(self.model.predict(batch), dtype=np.float32)[0]
+
+    def _plan_tiles(self, grid, reader, aoi_mask_path, feedback):
+        """Tiles to process and how to mask them.
+
+        With AOI polygons, tiles fully outside are dropped and only tiles
+        crossing the AOI boundary are masked, against a rasterised AOI.
+
+        Returns:
+            tuple: (tiles, mask_path, masked) where masked is the set of tile
+            indexes needing the mask, or None for all tiles.
+
+        Raises:
+            ValueError: If the AOI does not overlap the raster.
+        """
+        settings = self.settings
+        if not settings.aoi_wkt:
+            return grid, settings.mask_path, None
+
+        # Imported here so worker processes, which import this module, never load qgis
+        from .spectra_aoi import AOITileClassifier, rasterize_aoi, OUTSIDE, PARTIAL
+
+        classifier = AOITileClassifier(settings.aoi_wkt, reader.dataset.GetGeoTransform())
+        tiles = []
+        masked = set()
+        for tile in grid:
+            location = classifier.classify(tile)
+            if location == OUTSIDE:
+                continue
+            tiles.append(tile)
+            if location == PARTIAL:
+                masked.add(tile.index)
+
+        feedback.pushInfo(f"AOI: {len(grid) - len(tiles)} of {len(grid)} tiles culled, "
+                          f"{len(masked)} on the AOI boundary need per-pixel masking")
+        if not tiles:
+            raise ValueError("The area of interest does not overlap the input raster")
+        if masked:
+            rasterize_aoi(settings.aoi_wkt, reader.dataset, aoi_mask_path)
+            return tiles, aoi_mask_path, masked
+        return tiles, None, masked
+
+    def _checkpoint(self, accumulator, rows_done, row_tiles, cache, keys, journaled):
+        """Checkpoint the scratch store and the job; returns the journaled tiles still needed."""
+        accumulator.checkpoint(rows_done)
+        if self.job is not None:
+            self.job.checkpoint(rows_done, sum(row_tiles[:rows_done]), sum(row_tiles))
+        # Tiles of checkpointed rows are in the store now, their journal entries can go
+        for tile in journaled:
+            if tile.row < rows_done:
+                cache.discard(keys[tile.index])
+        return [tile for tile in journaled if tile.row >= rows_done]
+
+    def _cache_keys(self, tiles, mask_path, masked, scratch):
+        """Open the tile cache and key every tile, or (None, None) when no cache can be used.
+
+        Without a configured cache directory, a journal of at most JOURNAL_BYTES
+        under ``scratch`` is used instead; the engine prunes it at every checkpoint.
+        """
+        settings = self.settings
+        fingerprint = run_fingerprint(settings, settings.model_path)
+        if fingerprint is None:
+            return None, None
+
+        # Masked tiles also depend on the mask: the AOI polygons, or the mask file
+        if settings.aoi_wkt:
+            mask_id = "|".join(settings.aoi_wkt)
+        elif mask_path:
+            mask_id = f"{os.path.abspath(mask_path)}|{os.path.getmtime(mask_path)}"
+        else:
+            mask_id = ""
+        if settings.cache_dir:
+            cache = TileCache(settings.cache_dir, settings.cache_size_mb * 1024 * 1024)
+        else:
+            cache = TileCache(os.path.join(scratch, "tiles"), self.JOURNAL_BYTES)
+        keys = {}
+        for tile in tiles:
+            is_masked = bool(mask_path) and (masked is None or tile.index in masked)
+            keys[tile.index] = cache.key(fingerprint, tile, mask_id if is_masked else "")
+        return cache, keys
+
+    def _scheduler(self, tiles, reader, mask_path, mask_reader, masked):
+        """In-process batching, or the process-pool producer when workers are configured.
+
+        In-process batching reads the mask through ``mask_reader``, the run's own
+        reader of ``mask_path``; worker processes open theirs from the path.
+        """
+        settings = self.settings
+        if settings.workers > 0:
+            return ParallelTileBatcher(tiles, self._reader_source(), reader.bands, settings.tile_size,
+                                       settings.preprocessor(), settings.batch_size, settings.workers,
+                                       mask_path=mask_path, masked=masked)
+        return TileBatchScheduler(tiles, reader, settings.batch_size, settings.tile_size,
+                                  settings.preprocessor(), mask_reader, masked)
+
+    def _log_throughput(self, feedback, tiles, elapsed, model_time):
+        """Report tiles/sec for the batch size in use, for tuning it per machine."""
+        if not tiles:
+            return
+        feedback.pushInfo(f"Batch size {self.settings.batch_size}: "
+                          f"{tiles / max(elapsed, 1e-9):.1f} tiles/s overall, "
+                          f"{tiles / max(model_time, 1e-9):.1f} tiles/s in the model")
+# ----------------------------------------------------------------------------------------------------------
@@ -0,0 +1,135 @@
+"""
+Resumable processing jobs.
+
+Every run is recorded as a job manifest: a JSON file holding the run
+settings (input, AOI, model and the parameter group values), a short
+description of the inputs for the user, and the progress reached at the
+last checkpoint. The engine checkpoints the manifest together with its
+scratch store (see MemmapAccumulator), so a job left "running" by a crash,
+or "interrupted" by a cancel or closing QGIS, can be restarted with the same
+settings and carry on from its last completed tiles.
+"""
+import json
+import os
+import time
+import uuid
+
+from .spectra_inference import InferenceSettings
+
+
+RUNNING, INTERRUPTED, FAILED = "running", "interrupted", "failed"
+
+
+class Job:
+    """One processing job and its manifest file.
+
+    Args:
+        path (str): Manifest file.
+        data (dict): Manifest content.
+    """
+
+    def __init__(self, path, data):
+        self.path = path
+        self.data = data
+
+    @property
+    def id(self):
+        return self.data["id"]
+
+    @property
+    def status(self):
+        return self.data["status"]
+
+    @property
+    def settings(self):
+        return InferenceSettings.from_dict(self.data["settings"])
+
+    @property
+    def progress(self):
+        """(tiles done, tiles in total) at the last checkpoint."""
+        progress = self.data.get("progress", {})
+        return progress.get("tiles_done", 0), progress.get("tiles_total", 0)
+
+    def describe(self):
+        """One line summary for the resume prompt."""
+        inputs = self.data.get("inputs", {})
+        done, total = self.progress
+        started = time.strftime("%Y-%m-%d %H:%M", time.localtime(self.data["created"]))
+        return (f"{inputs.get('raster', '?')} with {inputs.get('model', '?')}, started {started}, "
+                f"{done} of {total or '?'} tiles done")
+
+    def save(self):
+        """Atomically rewrite the manifest (safe to call from the worker thread)."""
+        self.data["updated"] = time.time()
+        partial_path = self.path + ".partial"
+        with open(partial_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, indent=1)
+        os.replace(partial_path, self.path)
+
+    def set_status(self, status):
+        self.data["status"] = status
+        self.save()
+
+    def checkpoint(self, rows_done, tiles_done, tiles_total):
+        """Record the progress the scratch store can resume from."""
+        self.data["progress"] = {"rows_done": rows_done, "tiles_done": tiles_done, "tiles_total": tiles_total}
+        self.save()
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class JobStore:
+    """Directory of job manifests.
+
+    Args:
+        directory (str): Where manifests are kept, created if needed.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def create(self, settings, inputs=None):
+        """Record a new running job for ``settings``.
+
+        Args:
+            inputs (dict): Human readable names (raster, aoi, model) shown when offering to resume.
+        """
+        job_id = uuid.uuid4().hex[:12]
+        job = Job(os.path.join(self.directory, f"job-{job_id}.json"), {
+            "id": job_id,
+            "created": time.time(),
+            "status": RUNNING,
+            "inputs": inputs or {},
+            "settings": settings.to_dict(),
+            "progress": {},
+        })
+        job.save()
+        return job
+
+    def jobs(self):
+        found = []
+        for name in sorted(os.listdir(self.directory)):
+            if not (name.startswith("job-") and name.endswith(".json")):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path, encoding="utf-8") as f:
+                    found.append(Job(path, json.load(f)))
+            except (OSError, ValueError):
+                continue  # Half written by a crash; the next save of that job replaces it
+        return found
+
+    def resumable(self, running_ids=()):
+        """Jobs that stopped before completing, most recent first.
+
+        Jobs still marked running are crashed ones, unless their id is in
+        ``running_ids`` (tasks of this session).
+        """
+        jobs = [job for job in self.jobs()
+                if job.status == INTERRUPTED or (job.status == RUNNING and job.id not in running_ids)]
+        return sorted(jobs, key=lambda job: job.data.get("updated", 0), reverse=True)
@@ -0,0 +1,108 @@
+"""
+Bounded log of the Log tab.
+
+A million-tile job writes a log line per batch, far more than a text widget
+can hold without stalling the GUI. Every line is kept twice: in full, as a
+JSON object per line in a log file on disk, and in a bounded ring buffer of
+the most recent lines, which is all the Log tab ever shows. The tab pulls
+the lines appended since its last refresh in one batch, a few times a second
+(see TabLogWidget), and lines that scrolled out of the ring buffer before a
+refresh are skipped there and only counted. Exports stream the disk log, so
+they hold the whole run whatever the widget shows.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+class LogPipeline:
+    """Ring buffer of recent log lines backed by a full JSONL log file.
+
+    Safe to append to from any thread.
+
+    Args:
+        path (str): JSONL log file, truncated when the pipeline is created.
+        capacity (int): Lines kept in memory (and shown).
+    """
+
+    def __init__(self, path, capacity=5000):
+        self.path = path
+        self.capacity = capacity
+        self.recent = deque(maxlen=capacity)
+        self.pending = deque(maxlen=capacity)  # Appended since the last take_pending
+        self.dropped = 0  # Pending lines pushed out of the ring buffer before being taken
+        self.count = 0
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.file = open(path, "w", encoding="utf-8")
+
+    def __len__(self):
+        return self.count
+
+    def append(self, message, level="info"):
+        record = {"time": time.time(), "level": level, "message": message}
+        line = json.dumps(record)
+        with self.lock:
+            self.file.write(line + "\n")
+            self.recent.append(message)
+            if len(self.pending) == self.capacity:
+                self.dropped += 1
+            self.pending.append(message)
+            self.count += 1
+
+    def take_pending(self):
+        """(lines, dropped): the lines appended since the last call, and how many were skipped."""
+        with self.lock:
+            lines, dropped = list(self.pending), self.dropped
+            self.pending.clear()
+            self.dropped = 0
+            self.file.flush()
+        return lines, dropped
+
+    def lines(self):
+        """The lines of the ring buffer, oldest first."""
+        with self.lock:
+            return list(self.recent)
+
+    def records(self):
+        """Yield every logged record from the disk log, oldest first."""
+        with self.lock:
+            self.file.flush()
+        with open(self.path, encoding="utf-8") as log:
+            for line in log:
+                if line.strip():
+                    yield json.loads(line)
+
+    def export(self, path):
+        """Write the whole log to ``path``: as JSONL for a .jsonl path, as timestamped text otherwise.
+
+        Returns:
+            int: Lines written.
+        """
+        written = 0
+        structured = path.lower().endswith(".jsonl")
+        with open(path, "w", encoding="utf-8") as output:
+            for record in self.records():
+                if structured:
+                    output.write(json.dumps(record) + "\n")
+                else:
+                    stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(record["time"]))
+                    output.write(f"{stamp}  {record['message']}\n")
+                written += 1
+        return written
+
+    def clear(self):
+        """Forget every line, on disk too."""
+        with self.lock:
+            self.recent.clear()
+            self.pending.clear()
+            self.dropped = 0
+            self.count = 0
+            self.file.seek(0)
+            self.file.truncate()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
@@ -0,0 +1,240 @@
+"""
+Model manifests and the on-disk model catalogue.
+
+A manifest is a small JSON (or YAML) file next to a model file, sharing its
+name: ``unet.onnx`` is described by ``unet.json`` / ``unet.yaml``. Example::
+
+    {
+        "name": "UNet Buildings",
+        "task": "Detection",
+        "subtask": "Building",
+        "backend": "onnx",
+        "input_shape": [3, 512, 512],
+        "bands": [3, 2, 1],
+        "mean": [0.485, 0.456, 0.406],
+        "std": [0.229, 0.224, 0.225],
+        "classes": {"0": "Background", "1": "Building"},
+        "tile_size": 1024,
+        "precision": "FP32",
+        "output": "scores"
+    }
+
+``output`` is "scores" for (N, classes, H, W) score maps or "boxes" for
+detection models (see spectra_detection), which may also set
+``score_threshold`` and ``iou_threshold``. Change detection models set
+``change`` to how they take the two dates: "stack" (earlier and later
+bands concatenated), "siamese" (one date per input of a two-input ONNX
+model) or "difference" (later minus earlier). ``precision`` is one of
+spectra_quantize.PRECISIONS, or the short "INT8" for the dynamic variant;
+a manifest naming any other is invalid, and the catalogue indexes its model
+as having no manifest.
+
+Every key is optional. The catalogue scans a models directory once, reads
+only the manifests (never the model files) and caches the result in an index
+file, so filling the Models combo is a dictionary lookup.
+"""
+import json
+import os
+
+from .spectra_backends import supported_extensions
+from .spectra_quantize import resolve_precision
+
+
+MANIFEST_EXTENSIONS = [".json", ".yaml", ".yml"]
+INDEX_NAME = ".spectra_catalogue.json"
+INDEX_VERSION = 2  # 2: precisions are validated
+
+
+# Manifest
+# ----------------------------------------------------------------------------------------------------------
+def find_manifest(model_path):
+    """Path of the manifest next to ``model_path``, or None."""
+    stem = os.path.splitext(model_path)[0]
+    for extension in MANIFEST_EXTENSIONS:
+        if os.path.isfile(stem + extension):
+            return stem + extension
+    return None
+
+
+class ModelManifest:
+    """Metadata describing how a model expects to be fed.
+
+    Args:
+        data (dict): Parsed manifest content.
+        model_path (str): The model file the manifest describes.
+    """
+
+    def __init__(self, data, model_path):
+        self.data = data
+        self.model_path = model_path
+        self.name = data.get("name") or os.path.splitext(os.path.basename(model_path))[0]
+        self.task = data.get("task")
+        self.subtask = data.get("subtask")
+        self.backend = data.get("backend")
+        self.input_shape = data.get("input_shape")  # [channels, height, width]
+        self.bands = data.get("bands")  # 1-based raster bands, in model order
+        self.mean = data.get("mean")
+        self.std = data.get("std")
+        self.tile_size = data.get("tile_size")
+        self.precision = resolve_precision(data.get("precision", "FP32"))  # "INT8" reads as "INT8 dynamic"
+        self.output = data.get("output", "scores")
+        self.score_threshold = data.get("score_threshold")
+        self.iou_threshold = data.get("iou_threshold")
+        self.change = data.get("change")  # Fusion of the two dates, change detection models only
+        # Class table, as {"value": "name"} or a list of names indexed by value
+        classes = data.get("classes") or {}
+        if isinstance(classes, list):
+            classes = {index: name for index, name in enumerate(classes)}
+        self.classes = {int(value): name for value, name in classes.items()}
+
+    @classmethod
+    def read(cls, manifest_path, model_path):
+        """Parse a manifest file.
+
+        Raises:
+            ValueError: If the file cannot be parsed or names an unknown precision.
+        """
+        with open(manifest_path, encoding="utf-8") as f:
+            if manifest_path.lower().endswith(".json"):
+                try:
+                    data = json.load(f)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"Invalid manifest {os.path.basename(manifest_path)}: {e}")
+            else:
+                try:
+                    import yaml
+                except ImportError:
+                    raise ValueError("YAML manifests need PyYAML, use a .json manifest instead")
+                data = yaml.safe_load(f) or {}
+        if not isinstance(data, dict):
+            raise ValueError(f"Invalid manifest {os.path.basename(manifest_path)}")
+        return cls(data, model_path)
+
+    @classmethod
+    def for_model(cls, model_path):
+        """Manifest of a model file, or None if it has none."""
+        manifest_path = find_manifest(model_path)
+        return cls.read(manifest_path, model_path) if manifest_path else None
+
+    @property
+    def resolution(self):
+        """Model input edge in pixels, if the manifest fixes it."""
+        return self.input_shape[-1] if self.input_shape else None
+
+    def apply(self, settings):
+        """Copy input preparation fields onto an InferenceSettings."""
+        if self.backend:
+            settings.backend = self.backend
+        if self.bands:
+            settings.bands = list(self.bands)
+        if self.mean is not None:
+            settings.mean = self.mean
+        if self.std is not None:
+            settings.std = self.std
+        if self.classes:
+            settings.classes = self.classes
+        settings.detection = self.output == "boxes"
+        if self.score_threshold is not None:
+            settings.score_threshold = float(self.score_threshold)
+        if self.iou_threshold is not None:
+            settings.iou_threshold = float(self.iou_threshold)
+        if self.change:
+            settings.change_fusion = self.change
+        return settings
+# ----------------------------------------------------------------------------------------------------------
+
+
+
+# Catalogue
+# ----------------------------------------------------------------------------------------------------------
+def _mtime(path):
+    return os.path.getmtime(path) if path else None
+
+
+class ModelCatalogue:
+    """Index of the models found under a directory.
+
+    The index is stored as INDEX_NAME in that directory. Refreshing walks the
+    tree and re-reads a manifest only when it or its model changed since the
+    index was written.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.index_path = os.path.join(directory, INDEX_NAME)
+        self.entries = []
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if index.get("version") != INDEX_VERSION:
+            return {}
+        return {entry["path"]: entry for entry in index.get("models", [])}
+
+    def _save_index(self):
+        try:
+            with open(self.index_path, "w", encoding="utf-8") as f:
+                json.dump({"version": INDEX_VERSION, "models": self.entries}, f, indent=1)
+        except OSError:
+            pass  # Read-only models directory, keep the index in memory only
+
+    def refresh(self):
+        """Rescan the directory, reusing cached entries that are still current."""
+        if not os.path.isdir(self.directory):
+            self.entries = []
+            return self.entries
+
+        cached = self._load_index()
+        extensions = supported_extensions()
+        entries = []
+        changed = False
+        for root, dirs, files in os.walk(self.directory):
+            for file_name in sorted(files):
+                if os.path.splitext(file_name)[1].lower() not in extensions:
+                    continue
+                path = os.path.join(root, file_name)
+                manifest_path = find_manifest(path)
+                entry = cached.get(path)
+                if (entry is None or entry["model_mtime"] != _mtime(path)
+                        or entry["manifest_path"] != manifest_path
+                        or entry["manifest_mtime"] != _mtime(manifest_path)):
+                    entry = self._entry(path, manifest_path)
+                    changed = True
+                entries.append(entry)
+
+        self.entries = entries
+        if changed or len(entries) != len(cached):
+            self._save_index()
+        return self.entries
+
+    def _entry(self, path, manifest_path):
+        manifest = {}
+        if manifest_path:
+            try:
+                manifest = ModelManifest.read(manifest_path, path).data
+            except (OSError, ValueError):
+                manifest = {}
+        return {
+            "path": path,
+            "name": manifest.get("name") or os.path.splitext(os.path.basename(path))[0],
+            "subtask": manifest.get("subtask"),
+            "model_mtime": _mtime(path),
+            "manifest_path": manifest_path,
+            "manifest_mtime": _mtime(manifest_path),
+            "manifest": manifest,
+        }
+
+    def models_for(self, subtask):
+        """Catalogue entries for a subtask (entries without one match every subtask)."""
+        return [entry for entry in self.entries if entry["subtask"] in (None, subtask)]
+
+    def manifest(self, model_path):
+        """Manifest of a catalogued model, without touching the disk."""
+        for entry in self.entries:
+            if entry["path"] == model_path:
+                return ModelManifest(entry["manifest"], model_path)
+        return None
+# ----------------------------------------------------------------------------------------------------------
@@ -24,11 +24,13 @@
 from qgis.PyQt.QtCore import QSettings, QTranslator, QCoreApplication
 from qgis.PyQt.QtGui import QIcon
 from qgis.PyQt.QtWidgets import QAction
+from qgis.core import QgsApplication
 
 # Initialize Qt resources from file resources.py
 from .resources import *
 # Import the code for the dialog
 from .spectra_plugin_dialog import SpectraPluginDialog
+from .spectra_processing import SpectraProcessingProvider
 import os.path
 
 
@@ -70,6 +72,9 @@ class SpectraPlugin:
         # Must be set in initGui() to survive plugin reloads
         self.first_start = None
 
+        # Processing provider, also registered when loaded by qgis_process (no GUI)
+        self.provider = None
+
     # noinspection PyMethodMayBeStatic
     def tr(self, message):
         """Get the translation for a string using Qt translation API.
@@ -160,8 +165,14 @@ class SpectraPlugin:
 
         return action
 
+    def initProcessing(self):
+        """Register the SPECTRA algorithms with the Processing framework."""
+        self.provider = SpectraProcessingProvider()
+        QgsApplication.processingRegistry().addProvider(self.provider)
+
     def initGui(self):
         """Create the menu entries and toolbar icons inside the QGIS GUI."""
+        self.initProcessing()
 
         icon_path = os.path.join(os.path.dirname(__file__), 'spectra_logo.png')
         self.add_action(
@@ -181,6 +192,11 @@ class SpectraPlugin:
                 self.tr(u'&SPECTRA'),
                 action)
             self.iface.removeToolBarIcon(action)
+        if self.provider is not None:
+            QgsApplication.processingRegistry().removeProvider(self.provider)
+            self.provider = None
+        if self.first_start is False:
+            self.dlg.Tab2.close_log()  # Flushes the session's log file
 
 
     def run(self):
@@ -192,14 +208,8 @@ class SpectraPlugin:
             self.first_start = False
             self.dlg = SpectraPluginDialog()
 
-        # show the dialog
+        # show the dialog (non-modal, processing runs as a background task
+        # so QGIS stays usable while a job is running)
         self.dlg.show()
-        # Run the dialog event loop
-        result = self.dlg.exec_()
-        # See if OK was pressed
-        if result:
-            # Do something useful here - delete the line containing pass and
-            # substitute with your code.
-            pass
-
-    
\ No newline at end of file
+        self.dlg.raise_()
+        self.dlg.activateWindow()
@@ -23,13 +23,23 @@
 """
 
 import os
+import shutil
 
 from qgis.PyQt import uic, QtWidgets
 from PyQt5.QtWidgets import  QFrame, QLabel, QVBoxLayout, QSizePolicy
-from qgis.core import QgsProject, QgsMapLayer
+from PyQt5.QtWidgets import  QMessageBox, QSpinBox, QComboBox, QPushButton
+from qgis.core import QgsProject, QgsMapLayer, QgsRasterLayer, QgsVectorLayer, QgsProcessingUtils, QgsApplication
 from PyQt5.QtGui import QIcon
-from PyQt5.QtCore import Qt, QRect, QEvent
+from PyQt5.QtCore import Qt, QRect, QEvent, QTimer, QSettings
 from .spectra_widget_script import AOIMenu, InputImageMenu, ModelMenuGroup, TabLogWidget, ExportMenuGroup, CustomGraphicsView
+from .spectra_inference import InferenceSettings, COMPRESSIONS, scratch_directory
+from .spectra_jobs import JobStore
+from .spectra_backends import GRAPH_OPTIMIZATION_LEVELS
+from .spectra_quantize import PRECISIONS, resolve_precision
+from .spectra_task import InferenceTask, BatchTask, PreviewTask
+from .spectra_batch import plan_concurrency, FAILED
+from .spectra_forecast import ARIMA_MODEL
+from .spectra_vectorize import is_vector_path
 
 # This loads your .ui file so that PyQt can populate your plugin with the elements from Qt Designer
 FORM_CLASS, _ = uic.loadUiType(os.path.join(
@@ -57,8 +67,16 @@ class SpectraPluginDialog(QtWidgets.QDialog, FORM_CLASS):
         # ----------------------------------------------------------------------------------------------------
         self.input_box = InputImageMenu(self.comboBox)  # Pass the button to handler
         self.toolButton.clicked.connect(self.input_box.browse_raster_file)  # Connect signal
+        self.input_box.add_browse_menu(self.toolButton)  # Several files or a folder make a batch queue
         self.input_box.populate_raster_combo()  # Call setup method (if public)
 
+        # Change Detection time mode compares the input with a later image
+        self.input_box.add_change_input(self.groupBox)
+        self.radioButton.setEnabled(True)
+        self.radioButton.toggled.connect(self.input_box.set_change_mode)
+        # Prediction time mode forecasts every pixel of a stack of dates (Forecast Steps field)
+        self.radioButton_3.setEnabled(True)
+
 
         # input AOI | input group============================================================================
         self.aoi_box = AOIMenu(self.comboBox_2)  # Pass the button to handler
@@ -112,6 +130,53 @@ class SpectraPluginDialog(QtWidgets.QDialog, FORM_CLASS):
         # Toggle parameter
         self.toolButton_5.toggled.connect(self.model_mgr.setup_menu_toggle)
 
+        # Workers field (preprocessing processes), added below Image Resolution
+        self.workers_spin = QSpinBox()
+        self.workers_spin.setRange(0, os.cpu_count() or 1)
+        self.workers_spin.setToolTip("0 = prepare tiles inside QGIS")
+        self.model_mgr.add_parameter_field(self.widget_8, "Workers :", self.workers_spin, ModelMenuGroup.show_text7)
+
+        # ONNX Runtime session options
+        self.intra_threads_spin = QSpinBox()
+        self.intra_threads_spin.setRange(0, os.cpu_count() or 1)
+        self.intra_threads_spin.setToolTip("0 = ONNX Runtime default")
+        self.model_mgr.add_parameter_field(self.widget_8, "Threads per Operator :", self.intra_threads_spin,
+                                           ModelMenuGroup.show_text8)
+        self.inter_threads_spin = QSpinBox()
+        self.inter_threads_spin.setRange(0, os.cpu_count() or 1)
+        self.inter_threads_spin.setToolTip("0 = ONNX Runtime default")
+        self.model_mgr.add_parameter_field(self.widget_8, "Parallel Operators :", self.inter_threads_spin,
+                                           ModelMenuGroup.show_text8)
+        self.optimization_combo = QComboBox()
+        self.optimization_combo.addItems(GRAPH_OPTIMIZATION_LEVELS)
+        self.optimization_combo.setCurrentText("All")
+        self.model_mgr.add_parameter_field(self.widget_8, "Graph Optimisation :", self.optimization_combo,
+                                           ModelMenuGroup.show_text8)
+
+        # Precision field (reduced precision variants are built once and cached next to the model)
+        self.precision_combo = QComboBox()
+        self.precision_combo.addItems(PRECISIONS)
+        self.model_mgr.add_parameter_field(self.widget_8, "Precision :", self.precision_combo,
+                                           ModelMenuGroup.show_text9)
+
+        # Persistent tile cache, so re-runs only infer new or invalidated tiles
+        self.cache_spin = QSpinBox()
+        self.cache_spin.setRange(0, 1024 * 1024)
+        self.cache_spin.setSingleStep(512)
+        self.cache_spin.setSuffix(" MB")
+        self.cache_spin.setValue(int(QSettings().value("SpectraPlugin/cache_size_mb", 2048)))
+        self.cache_spin.setToolTip("0 = no tile cache")
+        self.model_mgr.add_parameter_field(self.widget_8, "Tile Cache :", self.cache_spin,
+                                           ModelMenuGroup.show_text10)
+
+        # Forecast horizon of the Prediction time mode
+        self.horizon_spin = QSpinBox()
+        self.horizon_spin.setRange(1, 120)
+        self.horizon_spin.setValue(12)
+        self.horizon_spin.setToolTip("Dates forecast ahead in Prediction time mode")
+        self.model_mgr.add_parameter_field(self.widget_8, "Forecast Steps :", self.horizon_spin,
+                                           ModelMenuGroup.show_text11)
+
         # ----------------------------------------------------------------------------------------------------
 
 
@@ -125,6 +190,8 @@ class SpectraPluginDialog(QtWidgets.QDialog, FORM_CLASS):
         self.toolButton_4.clicked.connect(self.exportmenu.select_export_path)
         # Pop up information for question mark button in parameter menu group (?)
         self.pushButton_14.clicked.connect(ModelMenuGroup.show_text6)
+        # GeoTIFF compression and BigTIFF, used by the streaming result writer
+        self.exportmenu.add_geotiff_options(self.groupBox_3, COMPRESSIONS)
         # ---------------------------------------------------------------------------------------------------
 
         # ****************************************************************************************************
@@ -135,11 +202,14 @@ class SpectraPluginDialog(QtWidgets.QDialog, FORM_CLASS):
         # ****************************************************************************************************
         # Connecting button to slot
         # ===================================================================================================
-        self.Tab2 = TabLogWidget(self.plainTextEdit, self.tabWidget)
+        # Full log of the session on disk, only the recent lines in the widget
+        self.Tab2 = TabLogWidget(self.plainTextEdit, self.tabWidget,
+                                 os.path.join(QgsProcessingUtils.tempFolder(), "spectra_log.jsonl"))
         self.pushButton_4.clicked.connect(self.Tab2.change_tab)
         self.pushButton_9.clicked.connect(self.Tab2.clear_log)
         self.pushButton_10.clicked.connect(self.Tab2.copy_log)
         self.pushButton_8.clicked.connect(self.Tab2.export_log)
+        self.Tab2.add_scene_table()  # Per-scene status of a batch run
         # ===================================================================================================
         # ****************************************************************************************************
     
@@ -169,6 +239,40 @@ class SpectraPluginDialog(QtWidgets.QDialog, FORM_CLASS):
         
         # Styling tool bar widget
         self.widget_11.setStyleSheet("#widget_11 { border: 1px solid white; background-color: white; }")
+        # ****************************************************************************************************
+
+
+
+        # Processing
+        # ****************************************************************************************************
+        self.task = None
+        self.pushButton_2.clicked.connect(self.run_processing) # for run processing button
+        self.pushButton_3.clicked.connect(self.cancel_processing) # cancels a running job, closes otherwise
+
+        # Quick run on the overview pyramid, shown in the graphics view
+        self.preview_button = QPushButton("Preview", self.widget_2)
+        self.preview_button.setToolTip("Run the model on a reduced-resolution overview of the input and "
+                                       "show the result here; Run Processing then runs at full resolution")
+        self.widget_2.layout().insertWidget(1, self.preview_button)
+        self.preview_button.clicked.connect(self.run_preview)
+
+        # Infers only the tiles in the graphics view, at its zoom, as it pans and zooms
+        self.explore_button = QPushButton("Explore", self.widget_2)
+        self.explore_button.setCheckable(True)
+        self.explore_button.setToolTip("Show the input here and run the model only on the tiles in view, "
+                                       "at the current zoom, as you pan and zoom")
+        self.widget_2.layout().insertWidget(2, self.explore_button)
+        self.explore_button.toggled.connect(self.toggle_explore)
+        self.explore_layer = None
+
+        # Log lines from the worker thread are queued and flushed here, on the GUI thread
+        self.log_timer = QTimer(self)
+        self.log_timer.setInterval(200)
+        self.log_timer.timeout.connect(self.flush_task_log)
+
+        # Job manifests, checkpointed while a job runs so an interrupted one can be resumed
+        self.jobs = JobStore(os.path.join(QgsApplication.qgisSettingsDirPath(), "spectra_jobs"))
+        # ****************************************************************************************************
 
 # ||||||||||||||||||||||||||||||||||||||||||||||| INITIALIZATION |||||||||||||||||||||||||||||||||||||||||||||||
 
@@ -181,6 +285,22 @@ class SpectraPluginDialog(QtWidgets.QDialog, FORM_CLASS):
     # Example slot
     def on_model_changed(self, model_path):
         print(f"Model changed to: {model_path}")
+
+        # Prefill the parameter group with what the model's manifest prefers
+        manifest = self.model_mgr.get_manifest(model_path)
+        if manifest is None:
+            return
+        for combo, value in ((self.comboBox_6, manifest.tile_size), (self.comboBox_9, manifest.resolution)):
+            if value:
+                index = combo.findText(str(value))
+                if index == -1:
+                    combo.addItem(str(value))
+                    index = combo.count() - 1
+                combo.setCurrentIndex(index)
+        try:
+            self.precision_combo.setCurrentText(resolve_precision(manifest.precision))
+        except ValueError as e:
+            self.Tab2.append_log(f"{manifest.name}: {e}")
     # ****************************************************************************************************
 
 
@@ -200,10 +320,321 @@ class SpectraPluginDialog(QtWidgets.QDialog, FORM_CLASS):
 
         # for reset graphics view
     def closeEvent(self, event):
+        self.explore_button.setChecked(False)
         self.graphics_view_nav.resetTransform()
         self.graphics_view_nav.reset_view()
         super().closeEvent(event)
 
+    def showEvent(self, event):
+        super().showEvent(event)
+        # Once the dialog is on screen, so the prompt has a visible parent
+        QTimer.singleShot(0, self.offer_resume)
+
+    # ****************************************************************************************************
+
+
+
+    # Processing (method)
+    # ****************************************************************************************************
+    @staticmethod
+    def _combo_int(combo, default):
+        try:
+            return int(combo.currentText())
+        except ValueError:
+            return default
+
+    def collect_settings(self, layer=None, output_path=None):
+        """Build InferenceSettings from the current state of the first tab.
+
+        Args:
+            layer: Input raster, the selected one if None (scenes of a batch are passed in).
+            output_path (str): Result path, the Export field if None.
+
+        Returns None (after telling the user why) if an input is missing.
+        """
+        layer = layer or self.input_box.get_image()
+        if layer is None:
+            QMessageBox.warning(self, "Error", "Please select an input raster layer!")
+            return None
+
+        model_path = self.model_mgr.get_current_model()
+        # ARIMA forecasts need no model file
+        builtin = self.radioButton_3.isChecked() and model_path == ARIMA_MODEL
+        if not builtin and not os.path.isfile(model_path):
+            QMessageBox.warning(self, "Error", "Please select a model file with Explore...!")
+            return None
+
+        output_path = self.lineEdit.text() if output_path is None else output_path
+        vector_path = None
+        if output_path and is_vector_path(output_path):
+            # Detection outputs are polygonised tile by tile; the class raster is kept as a temporary file
+            vector_path = output_path
+            stem = os.path.splitext(os.path.basename(vector_path))[0]
+            output_path = QgsProcessingUtils.generateTempFilename(f"{stem}.tif")
+        elif not output_path:
+            output_path = QgsProcessingUtils.generateTempFilename("spectra_result.tif")
+        elif os.path.splitext(output_path)[1].lower() not in (".tif", ".tiff"):
+            output_path = os.path.splitext(output_path)[0] + ".tif"
+
+        # Batch size lives in comboBox_8, patch size in comboBox_6 (0 = use the image resolution)
+        resolution = self._combo_int(self.comboBox_9, 256)
+        tile_size = self._combo_int(self.comboBox_6, 0) or resolution
+
+        compression, bigtiff = self.exportmenu.get_geotiff_options()
+        QSettings().setValue("SpectraPlugin/cache_size_mb", self.cache_spin.value())
+        cache_dir = QSettings().value("SpectraPlugin/cache_dir",
+                                      os.path.join(QgsApplication.qgisSettingsDirPath(), "spectra_cache"))
+        settings = InferenceSettings(
+            raster_path=layer.source(),
+            output_path=output_path,
+            model_path=model_path,
+            tile_size=tile_size,
+            batch_size=self._combo_int(self.comboBox_8, 1),
+            resolution=resolution,
+            workers=self.workers_spin.value(),
+            intra_op_threads=self.intra_threads_spin.value(),
+            inter_op_threads=self.inter_threads_spin.value(),
+            optimization=self.optimization_combo.currentText(),
+            precision=self.precision_combo.currentText(),
+            aoi_wkt=self.aoi_box.get_aoi_wkt(layer.crs()),
+            compression=compression,
+            bigtiff=bigtiff,
+            vector_path=vector_path,
+            cache_dir=cache_dir if self.cache_spin.value() else None,
+            cache_size_mb=self.cache_spin.value(),
+            scratch_dir=QSettings().value("SpectraPlugin/scratch_dir") or None,
+        )
+
+        if self.input_box.change_mode:
+            later = self.input_box.get_change_image()
+            if later is None or later.source() == layer.source():
+                QMessageBox.warning(self, "Error", "Please select a later image different from the input!")
+                return None
+            settings.change_path = later.source()
+
+        if self.radioButton_3.isChecked():
+            settings.forecast_horizon = self.horizon_spin.value()
+
+        # Band order, normalisation and class table come from the model manifest
+        manifest = None if builtin else self.model_mgr.get_manifest(model_path)
+        if manifest is not None:
+            manifest.apply(settings)
+        return settings
+
+    def run_processing(self):
+        if self.task is not None:
+            QMessageBox.information(self, "Info", "A processing job is already running.")
+            return
+
+        if self.input_box.is_batch():
+            if self.input_box.change_mode:
+                QMessageBox.information(self, "Info", "Change Detection compares two single rasters, "
+                                                      "not a batch queue.")
+                return
+            self.run_batch()
+            return
+
+        settings = self.collect_settings()
+        if settings is None:
+            return
+
+        aoi_layer = self.aoi_box.get_aoi_mask()
+        job = self.jobs.create(settings, {
+            "raster": self.input_box.get_image().name() + (
+                f" -> {self.input_box.get_change_image().name()}" if settings.change_path else ""),
+            "aoi": aoi_layer.name() if aoi_layer is not None else None,
+            "model": os.path.basename(settings.model_path),
+        })
+        self.start_task(settings, job)
+
+    def run_preview(self):
+        """Run the current configuration on the overview pyramid and show the result in the graphics view."""
+        if self.task is not None:
+            QMessageBox.information(self, "Info", "A processing job is already running.")
+            return
+        if self.input_box.is_batch():
+            QMessageBox.information(self, "Info", "Preview runs on a single raster, pick one of the queued scenes.")
+            return
+
+        settings = self.collect_settings(output_path="")
+        if settings is None:
+            return
+        if settings.detection:
+            QMessageBox.information(self, "Info", "Preview shows class and score maps, not detected boxes.")
+            return
+
+        self.task = PreviewTask(settings, os.path.join(QgsProcessingUtils.tempFolder(), "spectra_preview"))
+        self.task.progressChanged.connect(self.on_task_progress)
+        self.task.taskCompleted.connect(self.on_task_finished)
+        self.task.taskTerminated.connect(self.on_task_finished)
+
+        self.Tab2.append_log(f"Preview of {self.input_box.get_image().name()}")
+        self.pushButton_2.setEnabled(False)
+        self.preview_button.setEnabled(False)
+        self.log_timer.start()
+        QgsApplication.taskManager().addTask(self.task)
+
+    def toggle_explore(self, enabled):
+        """Start or stop inferring the tiles in view with the current configuration."""
+        if not enabled:
+            if self.explore_layer is not None:
+                self.explore_layer = None
+                self.graphics_view_nav.clear_layers()
+            return
+        if self.input_box.is_batch():
+            QMessageBox.information(self, "Info", "Explore runs on a single raster, pick one of the queued scenes.")
+            self.explore_button.setChecked(False)
+            return
+        settings = self.collect_settings(output_path="")
+        if settings is None:
+            self.explore_button.setChecked(False)
+            return
+        try:
+            self.explore_layer = self.graphics_view_nav.explore(settings)
+        except ValueError as e:
+            QMessageBox.information(self, "Info", str(e))
+            self.explore_button.setChecked(False)
+            return
+        self.explore_layer.message.connect(self.Tab2.append_log)
+        self.Tab2.append_log(f"Exploring {self.input_box.get_image().name()}: "
+                             "tiles are inferred as they come into view")
+
+    def run_batch(self):
+        """Queue every scene of the batch, each with its own output named after the scene.
+
+        Outputs go to the folder and format of the Export field, or to temporary files.
+        """
+        layers = self.input_box.get_images()
+        if not layers:
+            QMessageBox.warning(self, "Error", "None of the queued rasters can be opened!")
+            return
+        export_path = self.lineEdit.text()
+        scene_settings = {}
+        for layer in layers:
+            if export_path:
+                extension = os.path.splitext(export_path)[1] or ".tif"
+                output_path = os.path.join(os.path.dirname(export_path), layer.name() + extension)
+            else:
+                output_path = QgsProcessingUtils.generateTempFilename(f"{layer.name()}.tif")
+            settings = self.collect_settings(layer, output_path)
+            if settings is None:
+                return
+            scene_settings[layer.source()] = settings
+
+        scenes = plan_concurrency(next(iter(scene_settings.values())), len(scene_settings))
+        self.task = BatchTask(scene_settings, scenes)
+        self.task.progressChanged.connect(self.on_task_progress)
+        self.task.taskCompleted.connect(self.on_task_finished)
+        self.task.taskTerminated.connect(self.on_task_finished)
+
+        self.Tab2.show_log_tab()
+        self.Tab2.show_scenes(list(scene_settings))
+        self.Tab2.append_log(f"Batch of {len(scene_settings)} scenes, {scenes} at a time")
+        self.pushButton_2.setEnabled(False)
+        self.preview_button.setEnabled(False)
+        self.log_timer.start()
+        QgsApplication.taskManager().addTask(self.task)
+
+    def start_task(self, settings, job=None):
+        self.task = InferenceTask(settings, job=job)
+        self.task.progressChanged.connect(self.on_task_progress)
+        self.task.taskCompleted.connect(self.on_task_finished)
+        self.task.taskTerminated.connect(self.on_task_finished)
+
+        self.Tab2.show_log_tab()
+        self.pushButton_2.setEnabled(False)
+        self.preview_button.setEnabled(False)
+        self.log_timer.start()
+        QgsApplication.taskManager().addTask(self.task)
+
+    def offer_resume(self):
+        """Offer to resume the most recent job that stopped before completing."""
+        if self.task is not None:
+            return
+        jobs = self.jobs.resumable()
+        if not jobs:
+            return
+        job = jobs[0]
+        answer = QMessageBox.question(
+            self, "Resume processing",
+            f"A processing job did not complete:\n\n{job.describe()}\n\n"
+            "Resume it from its last completed tiles? Discard deletes its saved progress.",
+            QMessageBox.Yes | QMessageBox.No | QMessageBox.Discard, QMessageBox.Yes)
+        if answer == QMessageBox.Yes:
+            settings = job.settings
+            # A temporary output lived in the previous session's processing folder
+            os.makedirs(os.path.dirname(settings.output_path), exist_ok=True)
+            self.Tab2.append_log(f"Resuming job {job.id}: {job.describe()}")
+            self.start_task(settings, job)
+        elif answer == QMessageBox.Discard:
+            shutil.rmtree(scratch_directory(job.settings), ignore_errors=True)
+            job.remove()
+
+    def cancel_processing(self):
+        if self.task is None:
+            self.close()
+            return
+        self.Tab2.append_log("Cancelling, waiting for the current batch to finish...")
+        self.task.cancel()
+
+    def flush_task_log(self):
+        if self.task is None:
+            return
+        for line in self.task.drain_messages():
+            self.Tab2.append_log(line)
+        if isinstance(self.task, BatchTask):
+            for path, status, detail in self.task.drain_statuses():
+                self.Tab2.set_scene_status(path, status, detail)
+
+    def on_task_progress(self, progress):
+        self.pushButton_2.setText(f"Processing {progress:.0f}%")
+
+    def on_task_finished(self):
+        task = self.task
+        self.flush_task_log()
+        self.log_timer.stop()
+        self.task = None
+        self.pushButton_2.setEnabled(True)
+        self.pushButton_2.setText("Run Processing")
+        self.preview_button.setEnabled(True)
+
+        if task.exception is not None:
+            self.Tab2.append_log(f"Processing failed: {task.exception}")
+            QMessageBox.critical(self, "Error", f"Processing failed:\n{task.exception}")
+            return
+        if isinstance(task, PreviewTask):
+            if task.output_path is None:
+                self.Tab2.append_log("Preview cancelled.")
+                return
+            self.explore_button.setChecked(False)
+            self.graphics_view_nav.show_preview(task.input_rgba, task.result_rgba)
+            self.Tab2.append_log("Preview ready. Run Processing runs this configuration at full resolution.")
+            return
+        if isinstance(task, BatchTask):
+            failed = sum(isinstance(result, Exception) for result in task.results.values())
+            self.Tab2.append_log(f"Batch finished: {len(task.outputs)} of {len(task.scene_settings)} scenes done, "
+                                 f"{failed} {FAILED}" + (", cancelled." if task.isCanceled() else "."))
+            outputs = task.outputs
+        elif task.output_path is None:
+            self.Tab2.append_log("Processing cancelled.")
+            return
+        else:
+            outputs = [task.output_path]
+            # Drawn from the result's overviews, only the tiles in view
+            if os.path.isfile(task.settings.output_path):
+                self.explore_button.setChecked(False)
+                self.graphics_view_nav.show_result(task.settings.output_path, task.settings.raster_path)
+
+        if self.checkBox.isChecked():
+            for output_path in outputs:
+                self.add_result_layer(output_path)
+
+    def add_result_layer(self, output_path):
+        layer_name = os.path.splitext(os.path.basename(output_path))[0]
+        if is_vector_path(output_path):
+            QgsProject.instance().addMapLayer(QgsVectorLayer(output_path, layer_name, "ogr"))
+        else:
+            QgsProject.instance().addMapLayer(QgsRasterLayer(output_path, layer_name))
     # ****************************************************************************************************
 
 # |||||||||||||||||||||||||||||||||||||||||||||||||| METHOD ||||||||||||||||||||||||||||||||||||||||||||||||||||
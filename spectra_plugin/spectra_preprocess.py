@@ -0,0 +1,245 @@
+"""
+Tile preprocessing and the process pool that runs it in parallel with the model.
+
+Normalisation, AOI masking and resizing to the model resolution are CPU
+heavy. With workers > 0 they run in a pool of separate
+processes: each worker opens the raster itself, reads its windows and writes
+the prepared tiles straight into shared-memory batch buffers, while the model
+consumes the previous batch in the calling thread.
+"""
+import multiprocessing
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+# Preprocessing
+# ----------------------------------------------------------------------------------------------------------
+def resize(array, size, nearest=False):
+    """Resize a (channels, H, W) array to (channels, size, size).
+
+    Bilinear by default (pixel centres aligned), nearest neighbour for labels.
+    """
+    channels, height, width = array.shape
+    if height == size and width == size:
+        return array
+
+    if nearest:
+        rows = np.minimum(((np.arange(size) + 0.5) * height / size).astype(np.intp), height - 1)
+        cols = np.minimum(((np.arange(size) + 0.5) * width / size).astype(np.intp), width - 1)
+        return array[:, rows[:, np.newaxis], cols]
+
+    def axis(length):
+        position = np.clip((np.arange(size) + 0.5) * length / size - 0.5, 0, length - 1)
+        low = np.floor(position).astype(np.intp)
+        high = np.minimum(low + 1, length - 1)
+        return low, high, (position - low).astype(np.float32)
+
+    y0, y1, wy = axis(height)
+    x0, x1, wx = axis(width)
+    rows = array[:, y0] * (1 - wy)[:, np.newaxis] + array[:, y1] * wy[:, np.newaxis]
+    return rows[:, :, x0] * (1 - wx) + rows[:, :, x1] * wx
+
+
+class Preprocessor:
+    """Turns a raw (bands, tile, tile) window into a model-ready tile.
+
+    Holds plain attributes only, so it pickles cheaply to worker processes.
+
+    Args:
+        resolution (int): Model input edge in pixels (Image Resolution field).
+        mean (list): Per-band mean subtracted, skipped if None.
+        std (list): Per-band standard deviation divided by, skipped if None.
+    """
+
+    def __init__(self, resolution, mean=None, std=None):
+        self.resolution = int(resolution)
+        self.mean = np.asarray(mean, dtype=np.float32)[:, np.newaxis, np.newaxis] if mean is not None else None
+        self.std = np.asarray(std, dtype=np.float32)[:, np.newaxis, np.newaxis] if std is not None else None
+
+    def channels(self, bands):
+        """Number of model input channels for ``bands`` read bands."""
+        return bands
+
+    def __call__(self, data, mask=None):
+        if self.mean is not None:
+            data = data - self.mean
+        if self.std is not None:
+            data = data / self.std
+        if mask is not None:
+            # Masking happens at native resolution, before any resampling
+            data = data * (mask > 0)
+        return resize(data, self.resolution)
+
+
+# How the two dates of a change detection run are fed to the model
+CHANGE_FUSIONS = ["stack", "siamese", "difference"]
+
+
+class ChangePreprocessor(Preprocessor):
+    """Preprocesses a window pair read as (2 x bands, tile, tile), earlier date first.
+
+    Each date is normalised and resized on its own, then fused:
+    "stack" concatenates them (earlier date first, 2 x channels),
+    "siamese" concatenates them too, for a two-input ONNX model that the
+    backend feeds one date per input (see spectra_backends.OnnxModel),
+    "difference" feeds later minus earlier (channels).
+    """
+
+    def __init__(self, resolution, mean=None, std=None, fusion="stack"):
+        super().__init__(resolution, mean, std)
+        if fusion not in CHANGE_FUSIONS:
+            raise ValueError(f"Unknown change fusion {fusion!r}, expected one of {', '.join(CHANGE_FUSIONS)}")
+        self.fusion = fusion
+
+    def channels(self, bands):
+        per_date = super().channels(bands // 2)
+        return per_date if self.fusion == "difference" else 2 * per_date
+
+    def __call__(self, data, mask=None):
+        half = len(data) // 2
+        earlier = super().__call__(data[:half], mask)
+        later = super().__call__(data[half:], mask)
+        if self.fusion == "difference":
+            return later - earlier
+        return np.concatenate([earlier, later])
+
+
+def prepare_tile(reader, mask_reader, tile, tile_size, preprocessor):
+    """Read one tile (and its AOI mask window, if any) and preprocess it."""
+    data = reader.read(tile, tile_size)
+    mask = mask_reader.read(tile, tile_size)[0] if mask_reader is not None else None
+    return preprocessor(data, mask)
+# ----------------------------------------------------------------------------------------------------------
+
+
+
+# Process pool
+# ----------------------------------------------------------------------------------------------------------
+def python_executable():
+    """Interpreter used to spawn workers.
+
+    QGIS embeds Python, so sys.executable can be the QGIS binary itself;
+    spawning that would start a new QGIS instead of a worker.
+    """
+    names = ["pythonw.exe", "python.exe"] if os.name == "nt" else ["python3", "python"]
+    for folder in (sys.exec_prefix, os.path.join(sys.exec_prefix, "bin")):
+        for name in names:
+            path = os.path.join(folder, name)
+            if os.path.isfile(path):
+                return path
+    return sys.executable
+
+
+# Per-process state of a pool worker, set once by _init_worker
+_worker = {}
+
+
+def _init_worker(memory_name, shape, raster_path, bands, mask_path, tile_size, preprocessor):
+    from .spectra_inference import RasterWindowReader  # Deferred: spectra_inference imports this module
+
+    # A callable source opens a reader of its own kind (see spectra_change.PairSource)
+    reader = raster_path() if callable(raster_path) else RasterWindowReader(raster_path, bands)
+
+    # Spawned workers share the parent's resource tracker, so the parent's unlink stays authoritative
+    memory = shared_memory.SharedMemory(name=memory_name)
+    _worker.update(
+        memory=memory,
+        buffers=np.ndarray(shape, dtype=np.float32, buffer=memory.buf),
+        reader=reader,
+        mask_reader=RasterWindowReader(mask_path) if mask_path else None,
+        tile_size=tile_size,
+        preprocessor=preprocessor,
+    )
+
+
+def _prepare_into(slot, position, tile, use_mask):
+    mask_reader = _worker["mask_reader"] if use_mask else None
+    _worker["buffers"][slot, position] = prepare_tile(
+        _worker["reader"], mask_reader, tile, _worker["tile_size"], _worker["preprocessor"])
+
+
+class ParallelTileBatcher:
+    """Producer/consumer batcher backed by a process pool and shared memory.
+
+    Drop-in replacement for TileBatchScheduler: yields the same fixed-shape
+    (tiles, batch) pairs. ``prefetch`` batches are prepared ahead while the
+    consumer works on the current one, each in its own shared-memory slot.
+    A yielded batch is only valid until the next iteration.
+
+    ``raster_path`` may also be a picklable callable returning a window reader,
+    for inputs that are not a single raster.
+    """
+
+    def __init__(self, tiles, raster_path, bands, tile_size, preprocessor, batch_size, workers,
+                 mask_path=None, masked=None, prefetch=2):
+        self.tiles = list(tiles)
+        self.raster_path = raster_path
+        self.bands = bands
+        self.mask_path = mask_path
+        self.masked = masked  # Indexes of the tiles needing the mask, None = all of them
+        self.tile_size = tile_size
+        self.preprocessor = preprocessor
+        self.batch_size = batch_size
+        self.workers = workers
+        self.prefetch = max(1, prefetch)
+        resolution = preprocessor.resolution
+        self.shape = (self.prefetch + 1, batch_size, preprocessor.channels(len(bands)), resolution, resolution)
+
+    def __len__(self):
+        return -(-len(self.tiles) // self.batch_size)
+
+    def __iter__(self):
+        batches = [self.tiles[i:i + self.batch_size] for i in range(0, len(self.tiles), self.batch_size)]
+        if not batches:
+            return
+        slots = self.shape[0]
+        memory = shared_memory.SharedMemory(create=True, size=int(np.prod(self.shape)) * 4)
+        buffers = np.ndarray(self.shape, dtype=np.float32, buffer=memory.buf)
+
+        context = multiprocessing.get_context("spawn")
+        context.set_executable(python_executable())
+        pool = ProcessPoolExecutor(self.workers, mp_context=context, initializer=_init_worker,
+                                   initargs=(memory.name, self.shape, self.raster_path, self.bands,
+                                             self.mask_path, self.tile_size, self.preprocessor))
+        pending = deque()
+
+        def submit(number):
+            slot = number % slots
+            futures = [pool.submit(_prepare_into, slot, position, tile,
+                                   bool(self.mask_path) and (self.masked is None or tile.index in self.masked))
+                       for position, tile in enumerate(batches[number])]
+            pending.append((slot, batches[number], futures))
+
+        try:
+            for number in range(min(self.prefetch, len(batches))):
+                submit(number)
+            next_batch = len(pending)
+
+            while pending:
+                slot, tiles, futures = pending.popleft()
+                for future in futures:
+                    future.result()
+                buffers[slot, len(tiles):] = 0
+                # Keep the pool busy on the following batch while this one is consumed
+                if next_batch < len(batches):
+                    submit(next_batch)
+                    next_batch += 1
+                yield tiles, buffers[slot]
+        finally:
+            for _, _, futures in pending:
+                for future in futures:
+                    future.cancel()
+            pool.shutdown(wait=True)
+            del buffers
+            try:
+                memory.close()
+            except BufferError:
+                # The consumer still holds a view of the last batch; unlink frees it once released
+                pass
+            memory.unlink()
+# ----------------------------------------------------------------------------------------------------------
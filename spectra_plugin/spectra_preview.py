@@ -0,0 +1,182 @@
+"""
+Fast preview runs on the overview pyramid.
+
+A preview runs the model on the overview level whose size is closest to a
+few model inputs (PREVIEW_TILES x Image Resolution on the longest side),
+instead of the full-resolution raster. The level is exposed as a VRT, so
+GDAL reads the existing overviews (or decimates on the fly when there are
+none), and the normal engine runs on it unchanged: a handful of tiles, done
+in seconds. The settings are otherwise those of the full run, which can be
+started afterwards with the same configuration.
+
+The render helpers turn the preview input and result into RGBA arrays for
+the preview pane.
+"""
+import os
+
+import numpy as np
+from osgeo import gdal
+
+from .spectra_inference import InferenceSettings
+
+
+gdal.UseExceptions()
+
+PREVIEW_TILES = 4  # Model inputs across the longest side of the preview
+
+
+# Level selection
+# ----------------------------------------------------------------------------------------------------------
+def overview_sizes(dataset):
+    """(width, height) of the full-resolution raster followed by each overview of band 1."""
+    band = dataset.GetRasterBand(1)
+    sizes = [(dataset.RasterXSize, dataset.RasterYSize)]
+    for level in range(band.GetOverviewCount()):
+        overview = band.GetOverview(level)
+        sizes.append((overview.XSize, overview.YSize))
+    return sizes
+
+
+def preview_size(dataset, target_edge):
+    """Size of the preview: the pyramid level whose longest side is closest to ``target_edge``.
+
+    Without overviews, the raster is decimated to ``target_edge`` on its
+    longest side (never upsampled).
+
+    Returns:
+        tuple: (width, height, level) where level is 0 for full resolution and
+        n for the n-th overview, or None when decimated on the fly.
+    """
+    sizes = overview_sizes(dataset)
+    if len(sizes) == 1:
+        width, height = sizes[0]
+        scale = min(1.0, target_edge / max(width, height))
+        return max(1, round(width * scale)), max(1, round(height * scale)), None if scale < 1 else 0
+    level = min(range(len(sizes)), key=lambda index: abs(max(sizes[index]) - target_edge))
+    return sizes[level] + (level,)
+
+
+def preview_settings(settings, directory, feedback=None):
+    """Settings of the preview run of ``settings``, writing into ``directory``.
+
+    The input becomes a VRT of the chosen pyramid level; the result is a
+    plain GeoTIFF without vector export, tile cache or overviews.
+    """
+    dataset = gdal.Open(settings.raster_path, gdal.GA_ReadOnly)
+    width, height, level = preview_size(dataset, PREVIEW_TILES * settings.resolution)
+
+    os.makedirs(directory, exist_ok=True)
+    preview = InferenceSettings.from_dict(settings.to_dict())
+    if level == 0:
+        preview.raster_path = settings.raster_path
+    else:
+        preview.raster_path = os.path.join(directory, "preview_input.vrt")
+        gdal.Translate(preview.raster_path, dataset, format="VRT", width=width, height=height)
+        # A mask raster is pixel-aligned with the full resolution; AOI polygons still apply
+        preview.mask_path = None
+    dataset = None
+
+    preview.output_path = os.path.join(directory, "preview_result.tif")
+    preview.vector_path = None
+    preview.cache_dir = None
+    preview.overviews = False
+    preview.workers = 0
+    # Preview pixels already match the model input scale
+    preview.tile_size = settings.resolution
+    preview.overlap = settings.resolution // 8
+    preview.scratch_dir = directory
+    if feedback is not None:
+        source = "full resolution" if level == 0 else (f"overview {level}" if level else "decimated")
+        feedback.pushInfo(f"Preview on {width} x {height} px ({source})")
+    return preview
+# ----------------------------------------------------------------------------------------------------------
+
+
+
+# Rendering
+# ----------------------------------------------------------------------------------------------------------
+def stretch_limits(data):
+    """(channels, 2) 2-98 percentile limits of each (channels, H, W) channel, ignoring NaN."""
+    limits = []
+    for channel in data:
+        finite = channel[np.isfinite(channel)]
+        limits.append(np.percentile(finite, (2, 98)) if finite.size else (0.0, 1.0))
+    return np.asarray(limits, dtype=np.float32)
+
+
+def stretch_channels(data, limits):
+    """(H, W, 4) uint8 RGBA of a (1 or 3, H, W) array stretched between ``limits``; one channel is grey."""
+    if len(data) < 3:
+        data, limits = np.repeat(data[:1], 3, axis=0), np.repeat(limits[:1], 3, axis=0)
+    rgba = np.full(data.shape[1:] + (4,), 255, dtype=np.uint8)
+    for index, (channel, (low, high)) in enumerate(zip(data, limits)):
+        scaled = (channel - low) / max(high - low, 1e-6)
+        rgba[..., index] = np.clip(np.nan_to_num(scaled) * 255, 0, 255).astype(np.uint8)
+    return rgba
+
+
+def stretch_rgb(path, bands=None):
+    """(height, width, 4) uint8 RGBA of a small raster, 2-98 percentile stretched per band.
+
+    Args:
+        bands (list): 1-based bands shown as red, green, blue; the first three
+            (or the single band as grey) if None.
+    """
+    dataset = gdal.Open(path, gdal.GA_ReadOnly)
+    bands = (bands or list(range(1, min(3, dataset.RasterCount) + 1)))[:3]
+    data = np.stack([dataset.GetRasterBand(band).ReadAsArray() for band in bands]).astype(np.float32)
+    dataset = None
+    return stretch_channels(data, stretch_limits(data))
+
+
+def class_palette(count):
+    """(count, 3) uint8 colours, evenly spaced hues; class 0 (background) is black."""
+    hues = np.arange(count) / max(count - 1, 1) * 300.0
+    colours = np.zeros((count, 3), dtype=np.uint8)
+    for index, hue in enumerate(hues):
+        sector, fraction = divmod(hue / 60.0, 1)
+        rising, falling = int(255 * fraction), int(255 * (1 - fraction))
+        colours[index] = [(255, rising, 0), (falling, 255, 0), (0, 255, rising),
+                          (0, falling, 255), (rising, 0, 255), (255, 0, falling)][int(sector) % 6]
+    colours[0] = 0
+    return colours
+
+
+def color_classes(values, nodata, palette, opacity=160):
+    """(H, W, 4) uint8 RGBA of a class map; background, nodata and classes past the palette are transparent."""
+    classes = values.astype(np.int64)
+    valid = (classes > 0) & (classes < len(palette))
+    if nodata is not None:
+        valid &= values != nodata
+    rgba = np.zeros(values.shape + (4,), dtype=np.uint8)
+    rgba[..., :3] = palette[np.where(valid, classes, 0)]
+    rgba[..., 3] = np.where(valid, opacity, 0)
+    return rgba
+
+
+def color_scores(values, opacity=160):
+    """(H, W, 4) uint8 RGBA of a score band, as a red ramp over 0-1; NaN is transparent."""
+    rgba = np.zeros(values.shape + (4,), dtype=np.uint8)
+    rgba[..., 0] = 255
+    rgba[..., 3] = (np.clip(np.nan_to_num(values), 0, 1) * opacity).astype(np.uint8)
+    return rgba
+
+
+def colorize(path, opacity=160):
+    """(height, width, 4) uint8 RGBA of a result raster.
+
+    Class maps get one colour per class with background and nodata fully
+    transparent; a score band is shown as a red ramp.
+    """
+    dataset = gdal.Open(path, gdal.GA_ReadOnly)
+    band = dataset.GetRasterBand(1)
+    values = band.ReadAsArray()
+    nodata = band.GetNoDataValue()
+    dataset = None
+
+    if values.dtype.kind == "f":
+        return color_scores(values, opacity)
+    valid = values != nodata if nodata is not None else np.ones(values.shape, dtype=bool)
+    return color_classes(values, nodata, class_palette(int(values[valid].max()) + 1 if valid.any() else 1),
+                         opacity)
+# ----------------------------------------------------------------------------------------------------------
@@ -0,0 +1,240 @@
+"""
+QGIS Processing provider.
+
+Exposes the engine as Processing algorithms (classify, detect, segment), so
+SPECTRA runs can be chained in the graphical modeller, run over many rasters
+with the batch interface and called from ``qgis_process``. Every algorithm
+goes through spectra_batch.run_settings, like the dialog; the Processing
+feedback object drives progress, the log and cancellation.
+"""
+import os
+
+from qgis.PyQt.QtCore import QCoreApplication
+from qgis.PyQt.QtGui import QIcon
+from qgis.core import (QgsCoordinateTransform, QgsProcessing, QgsProcessingAlgorithm, QgsProcessingException,
+                       QgsProcessingParameterEnum, QgsProcessingParameterFile,
+                       QgsProcessingParameterNumber, QgsProcessingParameterRasterDestination,
+                       QgsProcessingParameterRasterLayer, QgsProcessingParameterVectorDestination,
+                       QgsProcessingParameterFeatureSource, QgsProcessingProvider, QgsProcessingUtils)
+
+from .spectra_backends import supported_extensions
+from .spectra_batch import run_settings
+from .spectra_inference import InferenceSettings, COMPRESSIONS
+from .spectra_manifest import ModelManifest
+from .spectra_quantize import PRECISIONS
+
+
+class SpectraAlgorithm(QgsProcessingAlgorithm):
+    """Parameters shared by every SPECTRA algorithm: the dialog's input, model and export groups."""
+
+    INPUT = "INPUT"
+    AOI = "AOI"
+    MODEL = "MODEL"
+    TILE_SIZE = "TILE_SIZE"
+    BATCH_SIZE = "BATCH_SIZE"
+    RESOLUTION = "RESOLUTION"
+    PRECISION = "PRECISION"
+    WORKERS = "WORKERS"
+    COMPRESSION = "COMPRESSION"
+    OUTPUT = "OUTPUT"
+
+    def tr(self, text):
+        return QCoreApplication.translate("SpectraProcessing", text)
+
+    def createInstance(self):
+        return type(self)()
+
+    def group(self):
+        return self.tr("Inference")
+
+    def groupId(self):
+        return "inference"
+
+    def icon(self):
+        return QIcon(os.path.join(os.path.dirname(__file__), "spectra_logo.png"))
+
+    def initAlgorithm(self, config=None):
+        self.addParameter(QgsProcessingParameterRasterLayer(self.INPUT, self.tr("Input image")))
+        self.addParameter(QgsProcessingParameterFeatureSource(
+            self.AOI, self.tr("Area of interest"), [QgsProcessing.TypeVectorPolygon], optional=True))
+        extensions = " ".join(f"*{ext}" for ext in supported_extensions())
+        self.addParameter(QgsProcessingParameterFile(
+            self.MODEL, self.tr("Model"), fileFilter=f"Model files ({extensions})"))
+        self.addParameter(QgsProcessingParameterNumber(
+            self.TILE_SIZE, self.tr("Patch size (0 = model manifest or image resolution)"),
+            defaultValue=0, minValue=0))
+        self.addParameter(QgsProcessingParameterNumber(
+            self.BATCH_SIZE, self.tr("Batch size"), defaultValue=1, minValue=1))
+        self.addParameter(QgsProcessingParameterNumber(
+            self.RESOLUTION, self.tr("Image resolution (0 = model manifest or 256)"), defaultValue=0, minValue=0))
+        self.addParameter(QgsProcessingParameterEnum(
+            self.PRECISION, self.tr("Precision"), PRECISIONS, defaultValue=0))
+        self.addParameter(QgsProcessingParameterNumber(
+            self.WORKERS, self.tr("Preprocessing workers"), defaultValue=0, minValue=0,
+            maxValue=os.cpu_count() or 1))
+        self.addParameter(QgsProcessingParameterEnum(
+            self.COMPRESSION, self.tr("GeoTIFF compression"), COMPRESSIONS, defaultValue=0))
+        self.initOutputs()
+
+    def initOutputs(self):
+        self.addParameter(QgsProcessingParameterRasterDestination(self.OUTPUT, self.tr("Result")))
+
+    def settings(self, parameters, context):
+        """InferenceSettings from the algorithm parameters, completed by the model manifest."""
+        layer = self.parameterAsRasterLayer(parameters, self.INPUT, context)
+        if layer is None:
+            raise QgsProcessingException(self.invalidRasterError(parameters, self.INPUT))
+        model_path = self.parameterAsFile(parameters, self.MODEL, context)
+        manifest = ModelManifest.for_model(model_path)
+
+        resolution = (self.parameterAsInt(parameters, self.RESOLUTION, context)
+                      or (manifest.resolution if manifest else None) or 256)
+        tile_size = (self.parameterAsInt(parameters, self.TILE_SIZE, context)
+                     or (manifest.tile_size if manifest else None) or resolution)
+        settings = InferenceSettings(
+            raster_path=layer.source(),
+            output_path=self.parameterAsOutputLayer(parameters, self.OUTPUT, context),
+            model_path=model_path,
+            tile_size=tile_size,
+            batch_size=self.parameterAsInt(parameters, self.BATCH_SIZE, context),
+            resolution=resolution,
+            workers=self.parameterAsInt(parameters, self.WORKERS, context),
+            precision=PRECISIONS[self.parameterAsEnum(parameters, self.PRECISION, context)],
+            compression=COMPRESSIONS[self.parameterAsEnum(parameters, self.COMPRESSION, context)],
+        )
+        if manifest is not None:
+            manifest.apply(settings)
+
+        source = self.parameterAsSource(parameters, self.AOI, context)
+        if source is not None:
+            transform = QgsCoordinateTransform(source.sourceCrs(), layer.crs(), context.transformContext())
+            settings.aoi_wkt = []
+            for feature in source.getFeatures():
+                geometry = feature.geometry()
+                if geometry.isEmpty():
+                    continue
+                geometry.transform(transform)
+                settings.aoi_wkt.append(geometry.asWkt())
+        return settings
+
+    def run(self, settings, feedback):
+        output = run_settings(settings, feedback)
+        if output is None:
+            raise QgsProcessingException(self.tr("Processing cancelled"))
+        return output
+
+    def processAlgorithm(self, parameters, context, feedback):
+        settings = self.settings(parameters, context)
+        if settings.detection:
+            raise QgsProcessingException(self.tr("This model outputs boxes, use the Detect algorithm"))
+        return {self.OUTPUT: self.run(settings, feedback)}
+
+
+class ClassifyAlgorithm(SpectraAlgorithm):
+    """Per-pixel class map (or score band) of a scene."""
+
+    def name(self):
+        return "classify"
+
+    def displayName(self):
+        return self.tr("Classify image")
+
+    def shortHelpString(self):
+        return self.tr("Runs a classification model over the image tile by tile and writes the class map "
+                       "as a tiled GeoTIFF. Band order, normalisation and class names come from the model "
+                       "manifest when there is one.")
+
+
+class SegmentAlgorithm(SpectraAlgorithm):
+    """Class map of a scene, optionally polygonised."""
+
+    OUTPUT_VECTOR = "OUTPUT_VECTOR"
+
+    def name(self):
+        return "segment"
+
+    def displayName(self):
+        return self.tr("Segment image")
+
+    def shortHelpString(self):
+        return self.tr("Runs a segmentation model over the image tile by tile and writes the class map. "
+                       "The segments can also be polygonised into a vector layer (class 0 is background).")
+
+    def initOutputs(self):
+        super().initOutputs()
+        self.addParameter(QgsProcessingParameterVectorDestination(
+            self.OUTPUT_VECTOR, self.tr("Segments"), QgsProcessing.TypeVectorPolygon, optional=True,
+            createByDefault=False))
+
+    def processAlgorithm(self, parameters, context, feedback):
+        settings = self.settings(parameters, context)
+        if settings.detection:
+            raise QgsProcessingException(self.tr("This model outputs boxes, use the Detect algorithm"))
+        settings.vector_path = self.parameterAsOutputLayer(parameters, self.OUTPUT_VECTOR, context) or None
+        self.run(settings, feedback)
+        results = {self.OUTPUT: settings.output_path}
+        if settings.vector_path:
+            results[self.OUTPUT_VECTOR] = settings.vector_path
+        return results
+
+
+class DetectAlgorithm(SpectraAlgorithm):
+    """Deduplicated object boxes of a scene."""
+
+    SCORE_THRESHOLD = "SCORE_THRESHOLD"
+    IOU_THRESHOLD = "IOU_THRESHOLD"
+
+    def name(self):
+        return "detect"
+
+    def displayName(self):
+        return self.tr("Detect objects")
+
+    def shortHelpString(self):
+        return self.tr("Runs an object detection model (manifest output \"boxes\") over the image tile by "
+                       "tile. Boxes seen twice in tile overlaps are removed by non-maximum suppression "
+                       "and the rest are written as polygons with their class and score.")
+
+    def initOutputs(self):
+        self.addParameter(QgsProcessingParameterNumber(
+            self.SCORE_THRESHOLD, self.tr("Score threshold (-1 = model manifest)"),
+            QgsProcessingParameterNumber.Double, defaultValue=-1, minValue=-1, maxValue=1))
+        self.addParameter(QgsProcessingParameterNumber(
+            self.IOU_THRESHOLD, self.tr("IoU threshold (-1 = model manifest)"),
+            QgsProcessingParameterNumber.Double, defaultValue=-1, minValue=-1, maxValue=1))
+        self.addParameter(QgsProcessingParameterVectorDestination(
+            self.OUTPUT, self.tr("Detections"), QgsProcessing.TypeVectorPolygon))
+
+    def processAlgorithm(self, parameters, context, feedback):
+        settings = self.settings(parameters, context)
+        if not settings.detection:
+            raise QgsProcessingException(self.tr("This model does not output boxes (set \"output\": "
+                                                 "\"boxes\" in its manifest)"))
+        # The detection engine only writes the vector; output_path just names the run
+        settings.vector_path = settings.output_path
+        settings.output_path = QgsProcessingUtils.generateTempFilename("spectra_detect.tif")
+        for name, attribute in ((self.SCORE_THRESHOLD, "score_threshold"), (self.IOU_THRESHOLD, "iou_threshold")):
+            value = self.parameterAsDouble(parameters, name, context)
+            if value >= 0:
+                setattr(settings, attribute, value)
+        return {self.OUTPUT: self.run(settings, feedback)}
+
+
+class SpectraProcessingProvider(QgsProcessingProvider):
+    """Provider registered by the plugin for the Processing toolbox and qgis_process."""
+
+    def id(self):
+        return "spectra"
+
+    def name(self):
+        return "SPECTRA"
+
+    def icon(self):
+        return QIcon(os.path.join(os.path.dirname(__file__), "spectra_logo.png"))
+
+    def supportedOutputRasterLayerExtensions(self):
+        return ["tif"]  # The result writer only produces GeoTIFF
+
+    def loadAlgorithms(self):
+        for algorithm in (ClassifyAlgorithm(), SegmentAlgorithm(), DetectAlgorithm()):
+            self.addAlgorithm(algorithm)
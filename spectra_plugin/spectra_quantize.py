@@ -0,0 +1,209 @@
+"""
+Reduced-precision (FP16 / INT8) variants of ONNX models.
+
+The first run at a reduced precision converts the model offline and caches
+the result next to the original (``unet.onnx`` -> ``unet.int8-dynamic.onnx``).
+Static INT8 is calibrated on sample tiles of the raster being processed, so
+its variant is also keyed by the calibration source and preprocessing
+(``unet.int8-static-<key>.onnx``, see calibration_key).
+After a build, both variants are run on the same sample tiles and their
+agreement and latency are reported to the log.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from .spectra_backends import backend_for, load_model
+from .spectra_change import window_reader
+from .spectra_inference import TileGrid, TileBatchScheduler
+
+
+PRECISIONS = ["FP32", "FP16", "INT8 dynamic", "INT8 static"]
+_SUFFIXES = {"FP16": "fp16", "INT8 dynamic": "int8-dynamic", "INT8 static": "int8-static"}
+_build_lock = threading.Lock()  # Scenes of a batch starting together build a variant once
+
+
+def resolve_precision(value):
+    """One of PRECISIONS for a precision as written in a manifest, in any case.
+
+    The short "INT8" is the dynamic variant, which needs no calibration.
+
+    Raises:
+        ValueError: If ``value`` names no known precision.
+    """
+    names = {precision.upper(): precision for precision in PRECISIONS}
+    names["INT8"] = "INT8 dynamic"
+    precision = names.get(str(value).strip().upper())
+    if precision is None:
+        raise ValueError(f"Unknown precision {value!r}, expected INT8 or one of {', '.join(PRECISIONS)}")
+    return precision
+
+
+def calibration_key(settings):
+    """Short hash of what static INT8 calibration samples: the input rasters and their preprocessing."""
+    fields = []
+    for path in (settings.raster_path, settings.change_path):
+        if path:
+            # Subdatasets and VRT XML are not files, their name identifies them
+            fields.append([os.path.abspath(path), os.path.getmtime(path)] if os.path.isfile(path) else path)
+    fields += [settings.tile_size, settings.overlap, settings.resolution, settings.bands, settings.mean,
+               settings.std, settings.change_fusion if settings.change_path else None]
+    return hashlib.sha1(json.dumps(fields, default=str).encode("utf-8")).hexdigest()[:12]
+
+
+def reduced_precision_path(model_path, precision, calibration=None):
+    """Where the ``precision`` variant of a model is cached.
+
+    Args:
+        calibration (str): calibration_key of a static INT8 variant.
+    """
+    stem, extension = os.path.splitext(model_path)
+    suffix = _SUFFIXES[precision] + (f"-{calibration}" if calibration else "")
+    return f"{stem}.{suffix}{extension}"
+
+
+def sample_batches(settings, count=4):
+    """Up to ``count`` preprocessed batches of tiles spread evenly over the raster."""
+    reader = window_reader(settings)
+    try:
+        grid = TileGrid(reader.width, reader.height, settings.tile_size, settings.overlap)
+        step = max(1, len(grid) // (count * settings.batch_size))
+        tiles = [grid.tile(*divmod(index, grid.cols)) for index in range(0, len(grid), step)]
+        tiles = tiles[:count * settings.batch_size]
+        scheduler = TileBatchScheduler(tiles, reader, settings.batch_size, settings.tile_size,
+                                       settings.preprocessor())
+        return [batch.copy() for _, batch in scheduler]
+    finally:
+        reader.close()
+
+
+def calibration_feeds(input_names, batch, siamese=False):
+    """Model inputs of a sample batch; a Siamese model gets one date per input, as in OnnxModel."""
+    if siamese:
+        return dict(zip(input_names, np.split(batch, 2, axis=1)))
+    return {input_names[0]: batch}
+
+
+def _calibration_reader(input_names, batches, siamese):
+    from onnxruntime.quantization import CalibrationDataReader
+
+    class TileCalibrationReader(CalibrationDataReader):
+        def __init__(self):
+            self.batches = iter(batches)
+
+        def get_next(self):
+            batch = next(self.batches, None)
+            return None if batch is None else calibration_feeds(input_names, batch, siamese)
+
+    return TileCalibrationReader()
+
+
+def build_reduced_precision(model_path, precision, output_path, batches=None, siamese=False):
+    """Convert an ONNX model to ``precision`` and save it as ``output_path``.
+
+    Args:
+        batches (list): Calibration batches, required for "INT8 static".
+        siamese (bool): The model takes one date of each batch per input (see OnnxModel).
+    """
+    import onnx
+
+    # Written under a temporary name first, so an interrupted build is never mistaken for a cached one
+    stem, extension = os.path.splitext(output_path)
+    partial_path = f"{stem}.partial{extension}"
+
+    if precision == "FP16":
+        from onnxconverter_common import float16
+
+        # Inputs and outputs stay float32, so the engine feeds it like any other model
+        model = float16.convert_float_to_float16(onnx.load(model_path), keep_io_types=True)
+        onnx.save(model, partial_path)
+    elif precision == "INT8 dynamic":
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        quantize_dynamic(model_path, partial_path, weight_type=QuantType.QInt8)
+    elif precision == "INT8 static":
+        from onnxruntime.quantization import quantize_static, QuantFormat, QuantType
+
+        graph = onnx.load(model_path).graph
+        # Older exports list their weights as graph inputs too
+        weights = {initializer.name for initializer in graph.initializer}
+        input_names = [node.name for node in graph.input if node.name not in weights]
+        quantize_static(model_path, partial_path, _calibration_reader(input_names, batches, siamese),
+                        quant_format=QuantFormat.QDQ, activation_type=QuantType.QUInt8,
+                        weight_type=QuantType.QInt8)
+    else:
+        raise ValueError(f"Unknown precision: {precision}")
+
+    os.replace(partial_path, output_path)
+    return output_path
+
+
+def compare_models(reference, candidate, batches):
+    """Latency and agreement of a reduced-precision model against the original.
+
+    Agreement is the share of pixels with the same argmax class for
+    multi-class outputs, or the mean absolute difference for one score band.
+
+    Returns:
+        dict: reference_ms, candidate_ms (mean per batch), metric name and value.
+    """
+    reference_time = candidate_time = 0.0
+    values = []
+    for batch in batches:
+        start = time.perf_counter()
+        expected = np.asarray(reference.predict(batch), dtype=np.float32)
+        middle = time.perf_counter()
+        actual = np.asarray(candidate.predict(batch), dtype=np.float32)
+        reference_time += middle - start
+        candidate_time += time.perf_counter() - middle
+        if expected.shape[1] > 1:
+            values.append(np.mean(expected.argmax(axis=1) == actual.argmax(axis=1)))
+        else:
+            values.append(np.mean(np.abs(expected - actual)))
+
+    multi_class = expected.shape[1] > 1
+    return {
+        "reference_ms": 1000 * reference_time / len(batches),
+        "candidate_ms": 1000 * candidate_time / len(batches),
+        "metric": "pixel agreement" if multi_class else "mean abs difference",
+        "value": float(np.mean(values)),
+    }
+
+
+def reduced_precision_model(settings, feedback):
+    """Model file to run for ``settings.precision``, building it on first use.
+
+    Raises:
+        ValueError: If a reduced precision is asked for a non-ONNX model.
+    """
+    precision = settings.precision
+    if precision == "FP32":
+        return settings.model_path
+    if backend_for(settings.model_path, settings.backend) != "onnx":
+        raise ValueError(f"{precision} inference needs an ONNX model")
+
+    calibration = calibration_key(settings) if precision == "INT8 static" else None
+    output_path = reduced_precision_path(settings.model_path, precision, calibration)
+    options = settings.model_options()
+    with _build_lock:
+        if os.path.isfile(output_path) and os.path.getmtime(output_path) >= os.path.getmtime(settings.model_path):
+            feedback.pushInfo(f"Using cached {precision} model {os.path.basename(output_path)}")
+            return output_path
+
+        feedback.pushInfo(f"Building {precision} model from sample tiles...")
+        batches = sample_batches(settings)
+        start = time.perf_counter()
+        build_reduced_precision(settings.model_path, precision, output_path, batches, options.get("siamese", False))
+        feedback.pushInfo(f"{precision} model built in {time.perf_counter() - start:.1f}s: "
+                          f"{os.path.basename(output_path)}")
+
+    comparison = compare_models(load_model(settings.model_path, "onnx", **options),
+                                load_model(output_path, "onnx", **options), batches)
+    feedback.pushInfo(f"FP32 vs {precision} on {len(batches)} sample batches: "
+                      f"{comparison['reference_ms']:.1f} ms -> {comparison['candidate_ms']:.1f} ms per batch, "
+                      f"{comparison['metric']} {comparison['value']:.4f}")
+    return output_path
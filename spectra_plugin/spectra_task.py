@@ -0,0 +1,184 @@
+"""
+Background execution of the inference engine.
+
+The engine runs inside a QgsTask so QGIS stays responsive for the whole job.
+The worker thread never touches widgets: log lines (and, for a batch, scene
+statuses) are put on thread-safe queues which the dialog drains from the GUI
+thread.
+"""
+import queue
+import threading
+
+from qgis.core import QgsTask
+
+from .spectra_batch import BatchRunner, run_settings, RUNNING as SCENE_RUNNING, SKIPPED, CANCELLED
+from .spectra_cache import raster_name
+from .spectra_inference import EngineFeedback
+from .spectra_jobs import RUNNING, INTERRUPTED, FAILED
+from .spectra_preview import preview_settings, stretch_rgb, colorize
+
+
+def drain(items):
+    """Pop everything queued so far (call from the GUI thread)."""
+    drained = []
+    while True:
+        try:
+            drained.append(items.get_nowait())
+        except queue.Empty:
+            return drained
+
+
+class TaskFeedback(EngineFeedback):
+    """Routes engine feedback to the owning task (progress / cancel) and its log queue."""
+
+    def __init__(self, task):
+        self.task = task
+
+    def isCanceled(self):
+        return self.task.isCanceled()
+
+    def setProgress(self, progress):
+        self.task.setProgress(progress)
+
+    def pushInfo(self, info):
+        self.task.messages.put(info)
+
+
+class InferenceTask(QgsTask):
+    """Runs one InferenceEngine job on a QGIS worker thread.
+
+    Cancellation is cooperative: the engine checks it once per tile batch.
+    A job (see spectra_jobs), if given, is kept up to date: removed once the
+    output is written, marked interrupted on cancel and failed on error.
+    """
+
+    def __init__(self, settings, description="SPECTRA inference", job=None):
+        super().__init__(description, QgsTask.CanCancel)
+        self.settings = settings
+        self.job = job
+        self.messages = queue.Queue()
+        self.output_path = None
+        self.exception = None
+
+    def run(self):
+        """Worker thread entry point; must not touch any widget."""
+        feedback = TaskFeedback(self)
+        job = self.job
+        try:
+            if job is not None:
+                job.set_status(RUNNING)
+            self.output_path = run_settings(self.settings, feedback, job)
+        except Exception as e:
+            self.exception = e
+            if job is not None:
+                job.set_status(FAILED)
+            return False
+        if job is not None:
+            if self.output_path is None:
+                job.set_status(INTERRUPTED)
+            else:
+                job.remove()
+        return self.output_path is not None
+
+    def drain_messages(self):
+        """Pop every queued log line (call from the GUI thread)."""
+        return drain(self.messages)
+
+
+class PreviewTask(InferenceTask):
+    """Runs the preview of ``settings`` on its overview pyramid (see spectra_preview).
+
+    The input and result are rendered to RGBA arrays on the worker thread;
+    the GUI thread only wraps them in a pixmap.
+    """
+
+    def __init__(self, settings, directory, description="SPECTRA preview"):
+        super().__init__(settings, description)
+        self.directory = directory
+        self.input_rgba = None
+        self.result_rgba = None
+
+    def run(self):
+        """Worker thread entry point; must not touch any widget."""
+        feedback = TaskFeedback(self)
+        try:
+            preview = preview_settings(self.settings, self.directory, feedback)
+            self.output_path = run_settings(preview, feedback)
+            if self.output_path is not None:
+                self.input_rgba = stretch_rgb(preview.raster_path, preview.bands)
+                self.result_rgba = colorize(self.output_path)
+        except Exception as e:
+            self.exception = e
+            return False
+        return self.output_path is not None
+
+
+class SceneFeedback(EngineFeedback):
+    """Feedback of one scene of a BatchTask: prefixed log lines, progress folded into the task's."""
+
+    def __init__(self, task, path):
+        self.task = task
+        self.path = path
+        self.name = raster_name(path)
+
+    def isCanceled(self):
+        return self.task.isCanceled()
+
+    def setProgress(self, progress):
+        self.task.scene_progress(self.path, progress)
+
+    def pushInfo(self, info):
+        self.task.messages.put(f"[{self.name}] {info}")
+
+
+class BatchTask(QgsTask):
+    """Runs a queue of scenes on a QGIS worker thread, ``scenes`` of them at once.
+
+    Args:
+        scene_settings (dict): Scene path -> InferenceSettings, built on the GUI thread.
+        scenes (int): Scenes processed concurrently (see spectra_batch.plan_concurrency).
+    """
+
+    def __init__(self, scene_settings, scenes=1, description="SPECTRA batch"):
+        super().__init__(description, QgsTask.CanCancel)
+        self.scene_settings = scene_settings
+        self.scenes = scenes
+        self.messages = queue.Queue()
+        self.statuses = queue.Queue()  # (scene path, status, detail)
+        self.progress = {path: 0.0 for path in scene_settings}
+        self.lock = threading.Lock()
+        self.results = {}
+        self.outputs = []
+        self.exception = None
+
+    def scene_progress(self, path, progress):
+        with self.lock:
+            reported = int(self.progress[path]) != int(progress)
+            self.progress[path] = progress
+            total = sum(self.progress.values()) / len(self.progress)
+        self.setProgress(total)
+        if reported:
+            self.statuses.put((path, SCENE_RUNNING, f"{progress:.0f}%"))
+
+    def run(self):
+        """Worker thread entry point; must not touch any widget."""
+        runner = BatchRunner(self.scene_settings.get, self.scenes, overwrite=True,
+                             feedback_for=lambda path, cancel: SceneFeedback(self, path),
+                             on_status=lambda path, status, detail: self.statuses.put((path, status, detail)))
+        try:
+            self.results = runner.run(list(self.scene_settings))
+        except Exception as e:
+            self.exception = e
+            return False
+        # Output paths of the scenes that completed
+        self.outputs = [result for result in self.results.values()
+                        if isinstance(result, str) and result not in (SKIPPED, CANCELLED)]
+        return not self.isCanceled()
+
+    def drain_messages(self):
+        """Pop every queued log line (call from the GUI thread)."""
+        return drain(self.messages)
+
+    def drain_statuses(self):
+        """Pop every queued scene status, as (path, status, detail) (call from the GUI thread)."""
+        return drain(self.statuses)
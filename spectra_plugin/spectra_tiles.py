@@ -0,0 +1,159 @@
+"""
+Level-of-detail tiles of a raster, for the graphics view.
+
+A raster is drawn as a quadtree of TILE_SIZE pixel tiles: level 0 is full
+resolution and every level above halves it, up to the level where the whole
+raster fits in one tile. A tile of level k covers TILE_SIZE * 2^k raster
+pixels and is read with a TILE_SIZE buffer, so GDAL serves it from the
+nearest overview of the pyramid (RasterWindowWriter builds one for every
+result) instead of the full-resolution data. The view only asks for the
+tiles it shows at its current zoom, and keeps them in an LRU cache.
+
+Tiles come back as RGBA arrays; class maps, score bands and imagery are
+coloured with the preview render helpers so the colours do not change from
+tile to tile.
+"""
+import math
+from collections import OrderedDict
+
+import numpy as np
+from osgeo import gdal
+
+from .spectra_preview import class_palette, color_classes, color_scores, stretch_channels, stretch_limits
+
+
+gdal.UseExceptions()
+
+TILE_SIZE = 256  # Tile edge in screen (level) pixels
+
+# How a raster is coloured
+CLASSES, SCORES, IMAGE = "classes", "scores", "image"
+
+
+# Tile cache
+# ----------------------------------------------------------------------------------------------------------
+class LRUCache:
+    """Mapping that keeps the ``capacity`` most recently used entries."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+# ----------------------------------------------------------------------------------------------------------
+
+
+
+# Pyramid
+# ----------------------------------------------------------------------------------------------------------
+class OverviewPyramid:
+    """Level-of-detail tile reader of a raster.
+
+    Args:
+        path (str): Raster to draw.
+        mode (str): CLASSES, SCORES or IMAGE; guessed from the raster if None
+            (one float band: scores, one integer band: classes, otherwise imagery).
+        bands (list): 1-based bands shown as red, green, blue in IMAGE mode.
+        opacity (int): Alpha of coloured class and score pixels.
+    """
+
+    def __init__(self, path, mode=None, bands=None, opacity=160):
+        self.path = path
+        self.dataset = gdal.Open(path, gdal.GA_ReadOnly)
+        self.width = self.dataset.RasterXSize
+        self.height = self.dataset.RasterYSize
+        self.levels = 1 + max(0, math.ceil(math.log2(max(self.width, self.height) / TILE_SIZE)))
+        self.opacity = opacity
+
+        first = self.dataset.GetRasterBand(1)
+        if mode is None:
+            if self.dataset.RasterCount > 1:
+                mode = IMAGE
+            else:
+                mode = SCORES if gdal.GetDataTypeName(first.DataType).startswith("Float") else CLASSES
+        self.mode = mode
+        self.nodata = first.GetNoDataValue()
+        self.bands = (bands or list(range(1, min(3, self.dataset.RasterCount) + 1)))[:3]
+        if mode == SCORES:
+            self.bands = self.bands[:1]
+
+        # Colours fixed once from the coarsest level, so every tile uses the same ones
+        overview = self.read_window(self.levels - 1, 0, 0, self.width, self.height)
+        self.palette = self.limits = None
+        if mode == CLASSES:
+            names = first.GetCategoryNames()
+            values = overview[0][overview[0] != self.nodata] if self.nodata is not None else overview[0]
+            count = max(len(names or []), int(values.max()) + 1 if values.size else 1)
+            self.palette = class_palette(count)
+        elif mode == IMAGE:
+            self.limits = stretch_limits(overview.astype(np.float32))
+
+    @property
+    def has_overviews(self):
+        return self.dataset.GetRasterBand(1).GetOverviewCount() > 0
+
+    def level_for(self, scale):
+        """Coarsest level still showing at least one raster pixel per screen pixel at ``scale``.
+
+        Args:
+            scale (float): Screen pixels per raster pixel.
+        """
+        if scale <= 0:
+            return self.levels - 1
+        return min(self.levels - 1, max(0, int(math.floor(math.log2(1.0 / scale)))))
+
+    def span(self, level):
+        """Raster pixels covered by a tile edge at ``level``."""
+        return TILE_SIZE * 2 ** level
+
+    def tiles(self, level, x0, y0, x1, y1):
+        """(level, col, row) of the tiles of ``level`` meeting the raster pixel rectangle."""
+        span = self.span(level)
+        cols = range(max(0, int(x0 // span)), min(math.ceil(self.width / span), int(x1 // span) + 1))
+        rows = range(max(0, int(y0 // span)), min(math.ceil(self.height / span), int(y1 // span) + 1))
+        return [(level, col, row) for row in rows for col in cols]
+
+    def tile_rect(self, level, col, row):
+        """(x, y, width, height) of a tile in raster pixels."""
+        span = self.span(level)
+        x, y = col * span, row * span
+        return x, y, min(span, self.width - x), min(span, self.height - y)
+
+    def read_window(self, level, x, y, width, height):
+        """(bands, h, w) data of a raster pixel window, decimated to ``level``."""
+        factor = 2 ** level
+        buffer = (max(1, math.ceil(width / factor)), max(1, math.ceil(height / factor)))
+        return np.stack([self.dataset.GetRasterBand(band).ReadAsArray(x, y, width, height, *buffer)
+                         for band in self.bands])
+
+    def read(self, level, col, row):
+        """(h, w, 4) uint8 RGBA of a tile."""
+        data = self.read_window(level, *self.tile_rect(level, col, row))
+        if self.mode == CLASSES:
+            return color_classes(data[0], self.nodata, self.palette, self.opacity)
+        if self.mode == SCORES:
+            return color_scores(data[0], self.opacity)
+        return stretch_channels(data.astype(np.float32), self.limits)
+
+    def close(self):
+        self.dataset = None
+# ----------------------------------------------------------------------------------------------------------
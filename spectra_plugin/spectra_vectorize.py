@@ -0,0 +1,225 @@
+"""
+Streaming polygonisation of class maps.
+
+Every finished core window of the class map is polygonised on its own. A
+polygon touching an inner window edge is kept pending and merged with the
+pieces of the neighbouring windows that share an edge with it. Windows come
+in row-major order, so once a grid row is done, pending polygons that do not
+reach its lower seam cannot grow any more and are written out. Memory is
+bounded by the polygons along the open seams, not by the scene.
+
+Features are inserted in batches inside transactions, so a GeoPackage sees
+one commit per batch instead of one per feature.
+"""
+import os
+
+import numpy as np
+from osgeo import gdal, ogr, osr
+
+
+# Vector output file extension -> OGR driver, for the formats of the Export group
+VECTOR_DRIVERS = {
+    ".shp": "ESRI Shapefile",
+    ".geojson": "GeoJSON",
+    ".gpkg": "GPKG",
+    ".kml": "KML",
+    ".dxf": "DXF",
+}
+
+
+def is_vector_path(path):
+    return os.path.splitext(path)[1].lower() in VECTOR_DRIVERS
+
+
+def _shares_edge(first, second):
+    """True if two polygons share a boundary segment (a common corner is not enough)."""
+    intersection = first.Intersection(second)
+    return intersection is not None and (intersection.Length() > 0 or intersection.Area() > 0)
+
+
+class FeatureWriter:
+    """Streams features into a vector file, committing in batches.
+
+    Args:
+        path (str): Output file; the format follows the extension (VECTOR_DRIVERS).
+        source: GDAL dataset of the input raster, whose CRS the layer takes.
+        fields (list): (name, ogr field type) pairs.
+
+    Raises:
+        ValueError: If the extension is not a supported vector format.
+    """
+
+    BATCH_SIZE = 20000  # Features per transaction
+
+    def __init__(self, path, source, fields):
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in VECTOR_DRIVERS:
+            raise ValueError(f"Unsupported vector format: {os.path.basename(path)}")
+        driver = ogr.GetDriverByName(VECTOR_DRIVERS[extension])
+        if os.path.exists(path):
+            driver.DeleteDataSource(path)
+
+        srs = None
+        if source.GetProjection():
+            srs = osr.SpatialReference()
+            srs.ImportFromWkt(source.GetProjection())
+        self.dataset = driver.CreateDataSource(path)
+        self.layer = self.dataset.CreateLayer(os.path.splitext(os.path.basename(path))[0], srs,
+                                              ogr.wkbMultiPolygon)
+        for name, field_type in fields:
+            field = ogr.FieldDefn(name, field_type)
+            if field_type == ogr.OFTString:
+                field.SetWidth(64)
+            self.layer.CreateField(field)
+        self.definition = self.layer.GetLayerDefn()
+
+        self.count = 0
+        self.queued = 0
+        self.transactions = self.dataset.TestCapability(ogr.ODsCTransactions)
+        self._begin()
+
+    def _begin(self):
+        if self.transactions:
+            self.dataset.StartTransaction()
+
+    def _commit(self):
+        if self.transactions:
+            self.dataset.CommitTransaction()
+        self.queued = 0
+
+    def write(self, geometry, values):
+        """Queue one feature; ``values`` maps field names to values."""
+        feature = ogr.Feature(self.definition)
+        for name, value in values.items():
+            feature.SetField(name, value)
+        feature.SetGeometry(ogr.ForceToMultiPolygon(geometry))
+        self.layer.CreateFeature(feature)
+        self.count += 1
+        self.queued += 1
+        if self.queued >= self.BATCH_SIZE:
+            self._commit()
+            self._begin()
+
+    def close(self):
+        """Commit the last batch; returns the feature count."""
+        if self.dataset is not None:
+            self._commit()
+            self.layer = None
+            self.dataset = None
+        return self.count
+
+
+class StreamingPolygonizer:
+    """Polygonises class map windows and streams the features into a vector file.
+
+    Args:
+        path (str): Output file; the format follows the extension (VECTOR_DRIVERS).
+        source: GDAL dataset of the input raster (size, CRS and geotransform).
+        class_names (dict): Class value -> name, stored in the "name" field.
+        nodata: Class map value outside the AOI, never polygonised.
+        threshold (float): Score above which a single-band score map is foreground.
+
+    Raises:
+        ValueError: If the extension is not a supported vector format.
+    """
+
+    def __init__(self, path, source, class_names=None, nodata=None, threshold=0.5):
+        self.writer = FeatureWriter(path, source, [("class", ogr.OFTInteger), ("name", ogr.OFTString)])
+        self.class_names = class_names or {}
+        self.nodata = nodata
+        self.threshold = threshold
+        self.width = source.RasterXSize
+        self.height = source.RasterYSize
+        self.geotransform = source.GetGeoTransform()
+        # Pending seam polygons by class value: [geometry, (col0, row0, col1, row1)]
+        self.pending = {}
+
+    def _write(self, value, geometry):
+        self.writer.write(geometry, {"class": int(value), "name": self.class_names.get(int(value), "")})
+
+    def _window_geotransform(self, x, y):
+        x0, dx, rx, y0, ry, dy = self.geotransform
+        return (x0 + x * dx + y * rx, dx, rx, y0 + x * ry + y * dy, ry, dy)
+
+    def _pixel_box(self, geometry, inverse):
+        """Pixel (col0, row0, col1, row1) bounds of a geometry of one window."""
+        min_x, max_x, min_y, max_y = geometry.GetEnvelope()
+        corners = [gdal.ApplyGeoTransform(inverse, px, py) for px in (min_x, max_x) for py in (min_y, max_y)]
+        cols = [col for col, _ in corners]
+        rows = [row for _, row in corners]
+        return (round(min(cols)), round(min(rows)), round(max(cols)), round(max(rows)))
+
+    def add(self, class_map, x, y):
+        """Polygonise one finished window of the class map (or of a single score band)."""
+        ysize, xsize = class_map.shape
+        if np.issubdtype(class_map.dtype, np.floating):
+            values = (np.nan_to_num(class_map) >= self.threshold).astype(np.uint8)
+        else:
+            values = class_map
+            if self.nodata is not None:
+                values = np.where(class_map == self.nodata, 0, class_map)
+        if not values.any():
+            return  # Background only (class 0 is never polygonised)
+
+        memory = gdal.GetDriverByName("MEM").Create("", xsize, ysize, 2, gdal.GDT_UInt16)
+        window_geotransform = self._window_geotransform(x, y)
+        memory.SetGeoTransform(window_geotransform)
+        memory.GetRasterBand(1).WriteArray(values)
+        memory.GetRasterBand(2).WriteArray((values > 0).astype(np.uint16))
+        vectors = ogr.GetDriverByName("Memory").CreateDataSource("window")
+        window_layer = vectors.CreateLayer("window", None, ogr.wkbPolygon)
+        window_layer.CreateField(ogr.FieldDefn("class", ogr.OFTInteger))
+        gdal.Polygonize(memory.GetRasterBand(1), memory.GetRasterBand(2), window_layer, 0, [])
+
+        inverse = gdal.InvGeoTransform(self.geotransform)
+        # Window edges shared with another window (the raster border is not a seam)
+        inner = (x > 0, y > 0, x + xsize < self.width, y + ysize < self.height)
+        for feature in window_layer:
+            value = feature.GetField(0)
+            geometry = feature.GetGeometryRef().Clone()
+            box = self._pixel_box(geometry, inverse)
+            on_seam = ((inner[0] and box[0] <= x) or (inner[1] and box[1] <= y)
+                       or (inner[2] and box[2] >= x + xsize) or (inner[3] and box[3] >= y + ysize))
+            if on_seam:
+                self._merge(value, geometry, box)
+            else:
+                self._write(value, geometry)
+
+    def _merge(self, value, geometry, box):
+        """Union a seam polygon with the pending polygons of its class it shares an edge with."""
+        remaining = []
+        for other, other_box in self.pending.get(value, []):
+            touching = (other_box[0] <= box[2] and box[0] <= other_box[2]
+                        and other_box[1] <= box[3] and box[1] <= other_box[3])
+            if touching and _shares_edge(geometry, other):
+                geometry = geometry.Union(other)
+                box = (min(box[0], other_box[0]), min(box[1], other_box[1]),
+                       max(box[2], other_box[2]), max(box[3], other_box[3]))
+            else:
+                remaining.append((other, other_box))
+        remaining.append((geometry, box))
+        self.pending[value] = remaining
+
+    def finish_rows(self, row):
+        """Write the pending polygons lying entirely above pixel ``row``.
+
+        Call once every window above ``row`` has been added; polygons that
+        reach ``row`` may still continue into the next grid row.
+        """
+        for value, polygons in self.pending.items():
+            kept = []
+            for geometry, box in polygons:
+                if box[3] < row:
+                    self._write(value, geometry)
+                else:
+                    kept.append((geometry, box))
+            self.pending[value] = kept
+
+    def close(self):
+        """Write the remaining polygons and commit; returns the feature count."""
+        if self.writer.dataset is not None:
+            for value, polygons in self.pending.items():
+                for geometry, _ in polygons:
+                    self._write(value, geometry)
+            self.pending = {}
+        return self.writer.close()
@@ -1,9 +1,20 @@
 import os
+
+import numpy as np
 from qgis.PyQt import uic, QtWidgets
-from PyQt5.QtWidgets import QFileDialog, QMessageBox, QWidget, QScrollArea, QGraphicsView, QGraphicsScene, QRubberBand, QApplication
-from qgis.core import QgsProject, QgsMapLayer,QgsVectorLayer, QgsWkbTypes, QgsRasterLayer
-from PyQt5.QtGui import QIcon, QWheelEvent, QPen, QCursor, QPixmap, QPainter, QFont
-from PyQt5.QtCore import Qt, pyqtSignal, QObject, QRectF, QLineF, QRect, QSize
+from PyQt5.QtWidgets import QFileDialog, QMessageBox, QWidget, QScrollArea, QGraphicsView, QGraphicsScene, QRubberBand, QApplication, QLabel, QPushButton, QComboBox, QCheckBox, QHBoxLayout, QMenu, QToolButton, QSplitter, QTableWidget, QTableWidgetItem, QHeaderView, QInputDialog, QGraphicsObject, QGraphicsItem, QStyleOptionGraphicsItem
+from qgis.core import QgsProject, QgsMapLayer,QgsVectorLayer, QgsWkbTypes, QgsRasterLayer, QgsCoordinateTransform
+from PyQt5.QtGui import QIcon, QWheelEvent, QPen, QCursor, QPixmap, QPainter, QFont, QImage
+from PyQt5.QtCore import Qt, pyqtSignal, QObject, QRectF, QLineF, QRect, QSize, QSettings, QTimer
+from .spectra_backends import supported_extensions
+from .spectra_batch import scene_paths
+from .spectra_cache import raster_name
+from .spectra_explore import ViewportInference
+from .spectra_inference import RASTER_EXTENSIONS, subdatasets, resolve_subdataset
+from .spectra_log import LogPipeline
+from .spectra_manifest import ModelCatalogue, ModelManifest
+from .spectra_task import drain
+from .spectra_tiles import IMAGE, LRUCache, OverviewPyramid
 
 
 # First Tab (Menu Tab)
@@ -11,10 +22,15 @@ from PyQt5.QtCore import Qt, pyqtSignal, QObject, QRectF, QLineF, QRect, QSize
 # Input Menu Group
 # ----------------------------------------------------------------------------------------------------------
 class InputImageMenu:
+    BATCH = "batch"  # Combo item data of the batch queue entry
+
     def __init__(self, input_combo, parent=None):
         self.input_combo = input_combo
         self.parent = parent
         self.user_layers = []  # Store user-selected layers here
+        self.batch_paths = []  # Scenes queued by a multi-file or folder selection
+        self.change_combo = None  # Later image of a Change Detection run, see add_change_input
+        self.change_mode = False
         
 
         # Connect to layer tree signals
@@ -37,6 +53,11 @@ class InputImageMenu:
         # Add placeholder at the top
         self.input_combo.addItem("...", None)
 
+        # Batch queue entry, right below the placeholder
+        if self.batch_paths:
+            file_path = os.path.join(os.path.dirname(__file__), 'raster layer logo.png')
+            self.input_combo.addItem(QIcon(file_path), f"Batch queue ({len(self.batch_paths)} scenes)", self.BATCH)
+
         # Add them to combo box
         for layer in all_layers:
             crs = layer.crs().authid() if layer.crs().isValid() else "Unknown CRS"
@@ -52,18 +73,82 @@ class InputImageMenu:
             if index >= 0:
                 self.input_combo.setCurrentIndex(index)
 
+        # Same layers for the later image of a change detection run
+        if self.change_combo is not None:
+            current_layer = self.change_combo.currentData()
+            self.change_combo.clear()
+            self.change_combo.addItem("...", None)
+            for index in range(self.input_combo.count()):
+                layer = self.input_combo.itemData(index)
+                if isinstance(layer, QgsRasterLayer):
+                    self.change_combo.addItem(self.input_combo.itemIcon(index), self.input_combo.itemText(index), layer)
+            if current_layer:
+                index = self.change_combo.findData(current_layer)
+                if index >= 0:
+                    self.change_combo.setCurrentIndex(index)
+
+    def add_change_input(self, group):
+        """Add a "Later image" combo to the Input group, shown in Change Detection mode only."""
+        self.group = group
+        self.change_row = QWidget(group)
+        row = QHBoxLayout(self.change_row)
+        row.setContentsMargins(0, 0, 0, 0)
+        row.addWidget(QLabel("Later image :", self.change_row))
+        self.change_combo = QComboBox(self.change_row)
+        self.change_combo.setFixedHeight(25)
+        self.change_combo.setToolTip("Raster of the later date; the layer above is the earlier one. "
+                                     "Use Explore... to add files that are not in the project.")
+        row.addWidget(self.change_combo, 1)
+        # Row 3 sits between the input combo and the AOI label
+        group.layout().addWidget(self.change_row, 3, 0, 1, 2)
+        self.change_row.hide()
+        self.populate_raster_combo()
+
+    def set_change_mode(self, enabled):
+        if self.change_combo is None or enabled == self.change_mode:
+            return
+        self.change_mode = enabled
+        self.change_row.setVisible(enabled)
+        # The Input group has a fixed height
+        self.group.setFixedHeight(self.group.maximumHeight() + (34 if enabled else -34))
+
+    def get_change_image(self):
+        """Later raster layer of a change detection run (None outside Change Detection mode)."""
+        if not self.change_mode:
+            return None
+        return self.change_combo.currentData()
+
+    def add_browse_menu(self, button):
+        """Give the Explore button a menu to pick several files or a whole folder as a batch."""
+        menu = QMenu(button)
+        menu.addAction("Raster Files...", self.browse_raster_file)
+        menu.addAction("Folder...", self.browse_raster_folder)
+        button.setMenu(menu)
+        button.setPopupMode(QToolButton.MenuButtonPopup)
+
     def browse_raster_file(self):
-        """Browse for a raster file (GeoTIFF, etc.) without adding it to QGIS."""
-        file_path, _ = QFileDialog.getOpenFileName(
+        """Browse for raster files (GeoTIFF, etc.) without adding them to QGIS.
+
+        Picking several files queues them as a batch. NetCDF / HDF5 containers
+        are read through a subdataset picked by the user.
+        """
+        file_paths, _ = QFileDialog.getOpenFileNames(
             self.parent,
-            "Select Raster File",
+            "Select Raster Files",
             "",
-            "Raster Files (*.tif *.tiff)"
+            "Raster Files ({})".format(" ".join(f"*{ext}" for ext in RASTER_EXTENSIONS))
         )
+        if len(file_paths) > 1:
+            self.set_batch(file_paths)
+            return
+        if not file_paths:
+            return
+        file_path = self.pick_subdataset(file_paths)
         if not file_path:
             return
+        file_path = file_path[0]
 
-        layer_name = os.path.splitext(os.path.basename(file_path))[0]
+        layer_name = raster_name(file_path)
         layer = QgsRasterLayer(file_path, layer_name)
 
         if not layer.isValid():
@@ -78,8 +163,70 @@ class InputImageMenu:
         self.populate_raster_combo()
         self.input_combo.setCurrentIndex(self.input_combo.findData(layer))
 
+    def browse_raster_folder(self):
+        """Queue every raster of a folder as a batch."""
+        directory = QFileDialog.getExistingDirectory(self.parent, "Select Raster Folder")
+        if not directory:
+            return
+        paths = scene_paths([directory])
+        if not paths:
+            QMessageBox.warning(self.parent, "Error", "No raster files found in this folder!")
+            return
+        self.set_batch(paths)
+
+    def pick_subdataset(self, paths):
+        """Replace NetCDF / HDF5 containers by one of their subdatasets, asked once for all of them.
+
+        Containers without the picked variable are left out. Returns an empty
+        list if the user cancels.
+        """
+        for path in paths:
+            choices = subdatasets(path)
+            if choices:
+                break
+        else:
+            return list(paths)
+
+        labels = [f"{name.rsplit(':', 1)[-1]}  {description}" for name, description in choices]
+        label, ok = QInputDialog.getItem(self.parent, "Select Subdataset",
+                                         f"{os.path.basename(path)} holds several datasets:", labels, 0, False)
+        if not ok:
+            return []
+        variable = choices[labels.index(label)][0].rsplit(":", 1)[-1]
+        picked = []
+        for path in paths:
+            try:
+                picked.append(resolve_subdataset(path, variable))
+            except ValueError:
+                continue
+        return picked
+
+    def set_batch(self, paths):
+        paths = self.pick_subdataset(paths)
+        if not paths:
+            return
+        self.batch_paths = list(paths)
+        self.populate_raster_combo()
+        self.input_combo.setCurrentIndex(self.input_combo.findData(self.BATCH))
+
+    def is_batch(self):
+        return self.input_combo.currentData() == self.BATCH
+
+    def get_images(self):
+        """Selected raster layers: every scene of the batch queue, or the single selected layer.
+
+        Scenes that GDAL cannot open are left out.
+        """
+        if not self.is_batch():
+            layer = self.input_combo.currentData()
+            return [layer] if layer is not None else []
+        layers = [QgsRasterLayer(path, raster_name(path)) for path in self.batch_paths]
+        return [layer for layer in layers if layer.isValid()]
+
     def get_image(self):
-        """Get the currently selected raster layer."""
+        """Get the currently selected raster layer (None for a batch queue)."""
+        if self.is_batch():
+            return None
         return self.input_combo.currentData()
 
 
@@ -166,6 +313,21 @@ class AOIMenu:
     def get_aoi_mask(self):
         """Get currently selected AOI mask layer."""
         return self.aoi_combo.currentData()
+
+    def get_aoi_wkt(self, target_crs):
+        """AOI polygons of the selected layer as WKT, reprojected to ``target_crs``."""
+        layer = self.get_aoi_mask()
+        if layer is None:
+            return None
+        transform = QgsCoordinateTransform(layer.crs(), target_crs, QgsProject.instance())
+        geometries = []
+        for feature in layer.getFeatures():
+            geometry = feature.geometry()
+            if geometry.isEmpty():
+                continue
+            geometry.transform(transform)
+            geometries.append(geometry.asWkt())
+        return geometries
     
 # ----------------------------------------------------------------------------------------------------------
 
@@ -225,6 +387,12 @@ class ModelMenuGroup(QObject):
 
         # Current models (can be replaced with real paths later)
         self.current_models = self.model_library.copy()
+
+        # Model catalogue (index of the manifests found in the models directory)
+        models_dir = QSettings().value("SpectraPlugin/models_dir",
+                                       os.path.join(os.path.dirname(__file__), "models"))
+        self.catalogue = ModelCatalogue(models_dir)
+        self.catalogue.refresh()
         # ============================================================================
 
         
@@ -242,6 +410,12 @@ class ModelMenuGroup(QObject):
 
         # For explore model button
         self.explore_btn.clicked.connect(self.browse_model)
+        # Its menu also rescans the models directory, for manifests added while the dialog is open
+        menu = QMenu(self.explore_btn)
+        menu.addAction("Model File...", self.browse_model)
+        menu.addAction("Refresh Models", self.refresh_catalogue)
+        self.explore_btn.setMenu(menu)
+        self.explore_btn.setPopupMode(QToolButton.MenuButtonPopup)
         
         
 
@@ -259,18 +433,29 @@ class ModelMenuGroup(QObject):
     def update_models(self, task):
         """Updates model_combo based on selected task."""
         self.model_combo.clear()
-        
+
+        # Catalogued models first (display name, model path as item data)
+        for entry in self.catalogue.models_for(task):
+            self.model_combo.addItem(entry["name"], entry["path"])
+
         models = self.current_models.get(task, [])
         if models:
             self.model_combo.addItems(models)
-            self.model_changed.emit(models[0])  # Emit first model by default
+        if self.model_combo.count():
+            self.model_changed.emit(self.get_current_model())  # Emit first model by default
         else:
             self.model_combo.addItem("...")
 
+    def refresh_catalogue(self):
+        """Rescan the models directory and refill the Models combo."""
+        self.catalogue.refresh()
+        self.update_models(self.subtask_combo.currentText())
+
     def browse_model(self):
         """Opens file dialog and updates model list."""
+        patterns = " ".join(f"*{ext}" for ext in supported_extensions())
         file_path, _ = QFileDialog.getOpenFileName(
-            None, "Select Model", "", "Model Files (*.pt *.pth *.h5 *.onnx)")
+            None, "Select Model", "", f"Model Files ({patterns})")
         
         if file_path:
             task = self.task_combo.currentText()
@@ -297,7 +482,17 @@ class ModelMenuGroup(QObject):
 
     def get_current_model(self):
         """Returns the selected model path/name."""
-        return self.model_combo.currentText()
+        return self.model_combo.currentData() or self.model_combo.currentText()
+
+    def get_manifest(self, model_path):
+        """Manifest of a model (from the catalogue when indexed), or None."""
+        manifest = self.catalogue.manifest(model_path)
+        if manifest is not None:
+            return manifest
+        try:
+            return ModelManifest.for_model(model_path)
+        except (OSError, ValueError):
+            return None
 
     def show_text1():
             QMessageBox.information(None, "Info", "Batch size is used to determine "
@@ -330,9 +525,10 @@ class ModelMenuGroup(QObject):
             <br>
             ●  Prediction : Predict future conditions from past data <br>
             <br>
-            * Note: Only Present Time Mode available right now, <br>
-            &nbsp;&nbsp;&nbsp;&nbsp;Change Detection and Prediction are still under<br>
-            &nbsp;&nbsp;&nbsp;&nbsp;development
+            * Note: Change Detection compares the input layer (earlier) <br>
+            &nbsp;&nbsp;&nbsp;&nbsp;with the Later image, over the area both cover. <br>
+            &nbsp;&nbsp;&nbsp;&nbsp;Prediction reads the input bands as dates and forecasts <br>
+            &nbsp;&nbsp;&nbsp;&nbsp;Forecast Steps ahead for every pixel
             """
             QMessageBox.information(None, "Info", msg)
 
@@ -358,6 +554,66 @@ class ModelMenuGroup(QObject):
             """
             QMessageBox.information(None, "Info", msg)
 
+    def add_parameter_field(self, container, label_text, field, info_callback=None):
+        """Append a label / field row pair to the parameter grid in ``container``.
+
+        The parameter group and its grid container have fixed heights in the
+        .ui file, so both are grown by the height of the new rows.
+        """
+        layout = container.layout()
+        row = layout.rowCount()
+        layout.addWidget(QLabel(label_text), row, 0)
+        layout.addWidget(field, row + 1, 0)
+        if info_callback is not None:
+            info_button = QPushButton()
+            info_button.setMaximumWidth(25)
+            info_button.setIcon(QIcon(os.path.join(os.path.dirname(__file__), 'questionmark.png')))
+            info_button.clicked.connect(info_callback)
+            layout.addWidget(info_button, row + 1, 1)
+
+        extra = 2 * 21 + 2 * layout.verticalSpacing()
+        for widget in (container, self.menu):
+            widget.setFixedHeight(widget.maximumHeight() + extra)
+
+    def show_text7():
+            QMessageBox.information(None, "Info", "Workers sets how many separate processes "
+            "read and prepare tiles (band order, normalisation, resizing and AOI masking) "
+            "while the model is busy with the previous batch. 0 prepares tiles inside QGIS itself. "
+            "On machines with many cores, a value close to the number of cores minus two "
+            "keeps the model fed without starving QGIS.")
+
+    def show_text8():
+            QMessageBox.information(None, "Info", "These fields tune the ONNX Runtime CPU session. "
+            "Threads per Operator splits each layer across cores, Parallel Operators runs independent "
+            "branches of the model at the same time (0 lets the runtime pick for both). "
+            "Graph Optimisation fuses and simplifies the model once when it is first loaded; "
+            "keep it on All unless a model misbehaves. Loaded sessions are cached, so running "
+            "the same model again skips this setup.")
+
+    def show_text9():
+            QMessageBox.information(None, "Info", "Precision sets the number format the model "
+            "runs in. FP32 is the original model. FP16 halves the model size. INT8 is usually "
+            "the fastest on CPUs: dynamic quantises the weights only, static also quantises "
+            "activations using sample tiles from the selected image for calibration. "
+            "Reduced precision needs an ONNX model; the converted model is saved next to the "
+            "original and reused, and the Log tab shows its speed and agreement with FP32.")
+
+    def show_text10():
+            QMessageBox.information(None, "Info", "The tile cache keeps the model output of every "
+            "tile on disk, keyed by the image file, the tile window, the model and the input "
+            "settings. Running the same image again, for example with another area of interest "
+            "or export format, only runs the model on tiles it has not seen. The least recently "
+            "used tiles are removed once the cache grows past this size; 0 turns it off. "
+            "The Log tab reports the cache hit rate of each run.")
+
+    def show_text11():
+            QMessageBox.information(None, "Info", "Forecast Steps is used in Prediction time mode. "
+            "The input is a stack of dates: a multiband GeoTIFF with one band per date, or a NetCDF "
+            "variable with a time dimension. Every pixel's series is forecast this many dates ahead "
+            "and the result has one band per step (t+1, t+2, ...). Pick a sequence model file (LSTM, "
+            "Transformer), or ARIMA to fit a small autoregressive model to every pixel without any "
+            "model file.")
+
     def setup_menu_toggle(self):
         is_visible = not self.menu.isVisible()
         self.menu.setVisible(is_visible)
@@ -443,6 +699,31 @@ class ExportMenuGroup(QWidget):
                 path += default_ext
             
             self.lineEdit.setText(path)
+
+    def add_geotiff_options(self, group, compressions):
+        """Add the GeoTIFF compression / BigTIFF row under the export fields of ``group``.
+
+        The Export group has a fixed height in the .ui file, so it is grown by one row.
+        """
+        row = QWidget()
+        row_layout = QHBoxLayout(row)
+        row_layout.setContentsMargins(0, 0, 0, 0)
+        self.compression_combo = QComboBox()
+        self.compression_combo.addItems(compressions)
+        self.compression_combo.setToolTip("GeoTIFF compression; ZSTD is the fastest when GDAL supports it")
+        self.bigtiff_check = QCheckBox("BigTIFF")
+        self.bigtiff_check.setToolTip("Always write BigTIFF (otherwise only when the result may exceed 4 GB)")
+        row_layout.addWidget(QLabel("Compression :"))
+        row_layout.addWidget(self.compression_combo, 1)
+        row_layout.addWidget(self.bigtiff_check)
+
+        layout = group.layout()
+        layout.addWidget(row, layout.rowCount(), 0, 1, 2)
+        group.setFixedHeight(group.maximumHeight() + 25 + layout.verticalSpacing())
+
+    def get_geotiff_options(self):
+        """(compression, bigtiff) picked in the Export group."""
+        return self.compression_combo.currentText(), self.bigtiff_check.isChecked()
     # ----------------------------------------------------------------------------------------------------------
 
 # **************************************************************************************************************
@@ -452,46 +733,110 @@ class ExportMenuGroup(QWidget):
 # Second Tab (Log Tab)
 # **************************************************************************************************************
 class TabLogWidget(QWidget):
-    def __init__(self, logtext, tab, parent=None):
+    """Log tab: shows the recent lines of a LogPipeline (see spectra_log), refreshed in batches.
+
+    Lines are appended to the pipeline and the text widget is refreshed at
+    most every FLUSH_MS with everything appended since, so a burst of log
+    lines costs one widget update. The widget keeps as many lines as the
+    ring buffer; copy works on those, export on the full log on disk.
+    """
+
+    FLUSH_MS = 250
+
+    def __init__(self, logtext, tab, log_path, parent=None):
         super().__init__(parent)
         self.log_text_edit = logtext
         self.widgettab = tab
+        self.log = LogPipeline(log_path)
+        self.log_text_edit.setMaximumBlockCount(self.log.capacity)
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(self.FLUSH_MS)
+        self.flush_timer.timeout.connect(self.flush_log)
 
         # self.setup_connections()
 
     def change_tab(self):
         self.widgettab.setCurrentIndex(0)
 
+    def show_log_tab(self):
+        self.widgettab.setCurrentIndex(1)
+
+    def append_log(self, message):
+        self.log.append(message)
+        if not self.flush_timer.isActive():
+            self.flush_timer.start()
+
+    def flush_log(self):
+        """Show the lines appended since the last flush, in a single widget update."""
+        lines, dropped = self.log.take_pending()
+        if dropped:
+            lines.insert(0, f"... {dropped} lines not shown, Export Log has the full log")
+        if lines:
+            self.log_text_edit.appendPlainText("\n".join(lines))
+
+    def add_scene_table(self):
+        """Put a per-scene status table above the log; it is only shown while a batch runs."""
+        self.scene_rows = {}
+        self.scene_table = QTableWidget(0, 2)
+        self.scene_table.setHorizontalHeaderLabels(["Scene", "Status"])
+        self.scene_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.scene_table.verticalHeader().setVisible(False)
+        self.scene_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.scene_table.setVisible(False)
+
+        splitter = QSplitter(Qt.Vertical)
+        self.log_text_edit.parentWidget().layout().replaceWidget(self.log_text_edit, splitter)
+        splitter.addWidget(self.scene_table)
+        splitter.addWidget(self.log_text_edit)
+
+    def show_scenes(self, paths):
+        """List the scenes of a batch, all queued."""
+        self.scene_rows = {path: row for row, path in enumerate(paths)}
+        self.scene_table.setRowCount(len(paths))
+        for row, path in enumerate(paths):
+            self.scene_table.setItem(row, 0, QTableWidgetItem(os.path.basename(path)))
+            self.scene_table.setItem(row, 1, QTableWidgetItem("queued"))
+        self.scene_table.setVisible(True)
+
+    def set_scene_status(self, path, status, detail=""):
+        row = self.scene_rows.get(path)
+        if row is None:
+            return
+        item = QTableWidgetItem(f"{status} {detail}".strip())
+        item.setToolTip(detail)
+        self.scene_table.setItem(row, 1, item)
+
     def clear_log(self):
-        log_text = self.log_text_edit.toPlainText()
-        if not log_text:
+        if not len(self.log):
             QMessageBox.information(self,"No Log", "There is no log to clear.")
             return
+        self.flush_timer.stop()
+        self.log.clear()
         self.log_text_edit.clear()
 
     def copy_log(self):
-        log_text = self.log_text_edit.toPlainText()
-        if not log_text:
+        lines = self.log.lines()
+        if not lines:
             QMessageBox.information(self,"No Log", "There is no log to copy.")
             return
-        self.log_text_edit.selectAll()
-        self.log_text_edit.copy()
-        cursor = self.log_text_edit.textCursor()
-        cursor.clearSelection()
-        self.log_text_edit.setTextCursor(cursor)
+        QApplication.clipboard().setText("\n".join(lines))
 
     def export_log(self):
-        log_text = self.log_text_edit.toPlainText()
-        if not log_text:
+        if not len(self.log):
             QMessageBox.information(self,"No Log", "There is no log to export.")
             return
 
         file_path, _ = QFileDialog.getSaveFileName(
-            self, "Export Log", "", "Text Files (*.txt);;All Files (*)"
+            self, "Export Log", "", "Text Files (*.txt);;JSON Lines (*.jsonl);;All Files (*)"
         )
         if file_path:
-            with open(file_path, 'w') as f:
-                f.write(log_text)
+            # Streamed from the log file, every line of the session whatever the widget shows
+            self.log.export(file_path)
+
+    def close_log(self):
+        self.flush_timer.stop()
+        self.log.close()
 
 # *************************************************************************************************************
 
@@ -500,6 +845,174 @@ class TabLogWidget(QWidget):
 # Graphics View
 # **************************************************************************************************************
 
+def rgba_pixmap(rgba):
+    """QPixmap of a (height, width, 4) uint8 array."""
+    height, width = rgba.shape[:2]
+    data = np.ascontiguousarray(rgba).tobytes()  # Must outlive the QImage until it is copied
+    image = QImage(data, width, height, 4 * width, QImage.Format_RGBA8888)
+    return QPixmap.fromImage(image)
+
+
+class TileLayerItem(QGraphicsObject):
+    """Scene item drawing a raster through its overview pyramid (see spectra_tiles).
+
+    The item lives in raster pixel coordinates. Each paint picks the pyramid
+    level matching the view's zoom and draws only the tiles in the exposed
+    rectangle, from an LRU cache of pixmaps. At most MAX_LOADS missing tiles
+    are read per paint; the coarsest level is drawn under the gaps and the
+    item repaints on the next event loop pass, so zooming never blocks on a
+    whole screen of reads.
+
+    Args:
+        pyramid (OverviewPyramid): The raster to draw.
+        cache_size (int): Pixmaps kept (a 256 px tile is 256 KB).
+    """
+
+    MAX_LOADS = 8
+
+    def __init__(self, pyramid, cache_size=512, parent=None):
+        super().__init__(parent)
+        self.pyramid = pyramid
+        self.cache = LRUCache(cache_size)
+        self.repaint_pending = False
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+
+    def boundingRect(self):
+        return QRectF(0, 0, self.pyramid.width, self.pyramid.height)
+
+    def pixmap(self, key):
+        pixmap = self.cache.get(key)
+        if pixmap is None:
+            pixmap = rgba_pixmap(self.pyramid.read(*key))
+            self.cache.put(key, pixmap)
+        return pixmap
+
+    def draw(self, painter, key, pixmap):
+        x, y, width, height = self.pyramid.tile_rect(*key)
+        painter.drawPixmap(QRectF(x, y, width, height), pixmap, QRectF(pixmap.rect()))
+
+    def paint(self, painter, option, widget=None):
+        scale = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+        level = self.pyramid.level_for(scale)
+        exposed = option.exposedRect
+        keys = self.pyramid.tiles(level, exposed.left(), exposed.top(), exposed.right(), exposed.bottom())
+        missing = [key for key in keys if key not in self.cache]
+
+        deferred = set(missing[self.MAX_LOADS:])
+        if deferred and level != self.pyramid.levels - 1:
+            # Placeholder under the tiles read on the next passes
+            coarsest = self.pyramid.levels - 1
+            for key in self.pyramid.tiles(coarsest, exposed.left(), exposed.top(), exposed.right(), exposed.bottom()):
+                self.draw(painter, key, self.pixmap(key))
+        for key in keys:
+            if key not in deferred:
+                self.draw(painter, key, self.pixmap(key))
+        if deferred and not self.repaint_pending:
+            self.repaint_pending = True
+            QTimer.singleShot(0, self.repaint_deferred)
+
+    def repaint_deferred(self):
+        self.repaint_pending = False
+        self.update()
+
+    def close(self):
+        self.cache.clear()
+        self.pyramid.close()
+
+
+class InferenceLayerItem(QGraphicsObject):
+    """Scene item drawing model results inferred on demand for the tiles in view (see spectra_explore).
+
+    Each paint works out the tiles covering the whole viewport at the level
+    matching the zoom and, when they changed, hands the missing ones to the
+    worker, centre first; whatever was still queued for the previous view is
+    dropped. A tile not inferred yet shows the nearest coarser result already
+    cached. Finished tiles are polled from the worker and repainted.
+
+    Args:
+        inference (ViewportInference): The worker.
+        cache_size (int): Result pixmaps kept.
+    """
+
+    message = pyqtSignal(str)  # Log lines of the worker
+    POLL_MS = 100
+
+    def __init__(self, inference, cache_size=1024, parent=None):
+        super().__init__(parent)
+        self.inference = inference
+        self.pyramid = inference.grid
+        self.cache = LRUCache(cache_size)
+        self.requested = None
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+        self.timer = QTimer(self)
+        self.timer.setInterval(self.POLL_MS)
+        self.timer.timeout.connect(self.poll)
+        self.timer.start()
+
+    def boundingRect(self):
+        return QRectF(0, 0, self.pyramid.width, self.pyramid.height)
+
+    def tile_rect(self, key):
+        return QRectF(*self.pyramid.tile_rect(*key))
+
+    def request_view(self, level, view):
+        """Ask for the missing tiles of the whole viewport, nearest to its centre first."""
+        visible = view.mapToScene(view.viewport().rect()).boundingRect()
+        centre = visible.center()
+        keys = self.pyramid.tiles(level, visible.left(), visible.top(), visible.right(), visible.bottom())
+        missing = [key for key in keys if key not in self.cache]
+        missing.sort(key=lambda key: (self.tile_rect(key).center() - centre).manhattanLength())
+        if missing != self.requested:
+            self.requested = missing
+            self.inference.request(missing)
+
+    def placeholder(self, key):
+        """(key, pixmap) of the nearest coarser cached tile covering ``key``, or None."""
+        level, col, row = key
+        for parent in range(level + 1, self.pyramid.levels):
+            shift = parent - level
+            coarser = (parent, col >> shift, row >> shift)
+            pixmap = self.cache.get(coarser)
+            if pixmap is not None:
+                return coarser, pixmap
+        return None
+
+    def paint(self, painter, option, widget=None):
+        scale = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+        level = self.pyramid.level_for(scale)
+        if widget is not None and isinstance(widget.parentWidget(), QGraphicsView):
+            self.request_view(level, widget.parentWidget())
+
+        exposed = option.exposedRect
+        for key in self.pyramid.tiles(level, exposed.left(), exposed.top(), exposed.right(), exposed.bottom()):
+            rect = self.tile_rect(key)
+            pixmap = self.cache.get(key)
+            if pixmap is not None:
+                painter.drawPixmap(rect, pixmap, QRectF(pixmap.rect()))
+                continue
+            found = self.placeholder(key)
+            if found is not None:
+                # Clipped to the tile, so translucent placeholders never overlap
+                coarser, pixmap = found
+                painter.save()
+                painter.setClipRect(rect, Qt.IntersectClip)
+                painter.drawPixmap(self.tile_rect(coarser), pixmap, QRectF(pixmap.rect()))
+                painter.restore()
+
+    def poll(self):
+        """Cache the tiles finished since the last poll and pass the worker's log lines on."""
+        for key, rgba in drain(self.inference.results):
+            self.cache.put(key, rgba_pixmap(rgba))
+            self.update(self.tile_rect(key))
+        for line in drain(self.inference.messages):
+            self.message.emit(line)
+
+    def close(self):
+        self.timer.stop()
+        self.inference.close()
+        self.cache.clear()
+
+
 class CustomGraphicsView(QGraphicsView):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -510,6 +1023,7 @@ class CustomGraphicsView(QGraphicsView):
         self._zoom_mode = None
         self._rubber_band = QRubberBand(QRubberBand.Rectangle, self)
         self._origin = None
+        self.preview_extent = None  # Scene rect of the shown preview, if any
         
 
 
@@ -633,10 +1147,71 @@ class CustomGraphicsView(QGraphicsView):
         super().mouseReleaseEvent(event)
     
     def reset_view(self):
+        if self.preview_extent is not None:
+            self.fitInView(self.preview_extent, Qt.KeepAspectRatio)
+            return
         self.setTransform(self.initial_transform)
         self.centerOn(0, 0)  # Reset position to center at origin
 
     def zoom_full_extent(self):
-        self.setTransform(self.initial_transform)
-        self.centerOn(0, 0)
+        self.reset_view()
+
+    def clear_layers(self):
+        for item in self.scene().items():
+            if isinstance(item, (TileLayerItem, InferenceLayerItem)):
+                item.close()
+        self.scene().clear()
+
+    def show_preview(self, input_rgba, result_rgba):
+        """Replace the scene with a preview: the input with the result drawn over it."""
+        scene = self.scene()
+        self.clear_layers()
+        scene.addPixmap(rgba_pixmap(input_rgba))
+        scene.addPixmap(rgba_pixmap(result_rgba))
+        height, width = input_rgba.shape[:2]
+        self.preview_extent = QRectF(0, 0, width, height)
+        scene.setSceneRect(self.preview_extent)
+        self.reset_view()
+
+    def show_result(self, result_path, input_path=None):
+        """Replace the scene with a result raster drawn tile by tile at the current zoom.
+
+        The input is drawn underneath when given and on the same grid.
+        """
+        self.clear_layers()
+        result = OverviewPyramid(result_path)
+        if input_path:
+            pyramid = OverviewPyramid(input_path, IMAGE)
+            if (pyramid.width, pyramid.height) == (result.width, result.height):
+                self.scene().addItem(TileLayerItem(pyramid))
+            else:
+                pyramid.close()
+        self.scene().addItem(TileLayerItem(result))
+        self.preview_extent = QRectF(0, 0, result.width, result.height)
+        self.scene().setSceneRect(self.preview_extent)
+        self.reset_view()
+
+    def explore(self, settings):
+        """Replace the scene with the input of ``settings`` and infer the tiles in view as the view moves.
+
+        Returns:
+            InferenceLayerItem: The result layer; its ``message`` signal carries the worker's log lines.
+
+        Raises:
+            ValueError: If the run cannot be explored (see ViewportInference).
+        """
+        pyramid = OverviewPyramid(settings.raster_path, IMAGE, settings.bands)
+        try:
+            inference = ViewportInference(settings, pyramid)
+        except ValueError:
+            pyramid.close()
+            raise
+        self.clear_layers()
+        layer = InferenceLayerItem(inference)
+        self.scene().addItem(TileLayerItem(pyramid))
+        self.scene().addItem(layer)
+        self.preview_extent = QRectF(0, 0, pyramid.width, pyramid.height)
+        self.scene().setSceneRect(self.preview_extent)
+        self.reset_view()
+        return layer
 # **************************************************************************************************************
\ No newline at end of file
@@ -0,0 +1,100 @@
+# coding=utf-8
+"""Model backend registry and cache tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'deepresense@gmail.com'
+__date__ = '2025-07-22'
+__copyright__ = 'Copyright 2025, Deepresense'
+
+import os
+import sys
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from spectra_plugin.spectra_backends import ModelCache, backend_for, load_model, supported_extensions
+
+
+class BackendRegistryTest(unittest.TestCase):
+    """Test backend lookup."""
+
+    def test_backend_by_extension(self):
+        self.assertEqual(backend_for("/models/unet.onnx"), "onnx")
+        self.assertEqual(backend_for("/models/unet.PT"), "torchscript")
+        self.assertEqual(backend_for("/models/unet.h5"), "keras")
+        self.assertEqual(backend_for("/models/unet.tflite"), "tflite")
+        self.assertIn(".onnx", supported_extensions())
+
+    def test_explicit_backend_wins(self):
+        self.assertEqual(backend_for("/models/unet.bin", "onnx"), "onnx")
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            backend_for("/models/unet.bin")
+        with self.assertRaises(ValueError):
+            backend_for("/models/unet.onnx", "caffe")
+
+    def test_siamese_needs_onnx(self):
+        with self.assertRaises(ValueError):
+            load_model("/models/change.pt", siamese=True)
+
+    def test_frameworks_not_imported(self):
+        """Importing the registry must not pull in any framework."""
+        for module in ("onnxruntime", "torch", "tensorflow"):
+            self.assertNotIn(module, sys.modules)
+
+
+class ModelCacheTest(unittest.TestCase):
+    """Test the LRU model cache."""
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix=".onnx")
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_hit_and_eviction(self):
+        cache = ModelCache(max_size=1)
+        model, hit = cache.get("onnx", self.path, {}, object)
+        self.assertFalse(hit)
+        self.assertEqual(cache.get("onnx", self.path, {}, object), (model, True))
+        _, hit = cache.get("onnx", self.path, {"intra_op_threads": 2}, object)
+        self.assertFalse(hit)
+        _, hit = cache.get("onnx", self.path, {}, object)
+        self.assertFalse(hit)
+
+    def test_modified_file_reloads(self):
+        cache = ModelCache()
+        cache.get("onnx", self.path, {}, object)
+        stat = os.stat(self.path)
+        os.utime(self.path, (stat.st_atime, stat.st_mtime + 10))
+        _, hit = cache.get("onnx", self.path, {}, object)
+        self.assertFalse(hit)
+
+    def test_concurrent_misses_load_once(self):
+        cache = ModelCache()
+        loads = []
+
+        def create():
+            loads.append(1)
+            time.sleep(0.1)
+            return object()
+
+        with ThreadPoolExecutor(4) as executor:
+            models = list(executor.map(lambda _: cache.get("onnx", self.path, {}, create)[0], range(4)))
+        self.assertEqual(len(loads), 1)
+        self.assertTrue(all(model is models[0] for model in models))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(BackendRegistryTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
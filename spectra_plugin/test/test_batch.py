@@ -0,0 +1,105 @@
+# coding=utf-8
+"""Headless batch runner tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'deepresense@gmail.com'
+__date__ = '2025-07-22'
+__copyright__ = 'Copyright 2025, Deepresense'
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+
+from spectra_plugin.spectra_batch import (BatchRunner, main, parse_args, plan_concurrency, scene_paths, settings_factory,
+                                          FAILED, QUEUED, RUNNING, SKIPPED, UNFINISHED_SUFFIX)
+from spectra_plugin.spectra_inference import InferenceSettings
+
+
+class BatchRunnerTest(unittest.TestCase):
+    """Test scene discovery, per-scene settings and skipping finished scenes."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        for name in ("a.tif", "b.TIFF", "notes.txt"):
+            open(os.path.join(self.directory, name), "w").close()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_scene_paths(self):
+        expected = [os.path.join(self.directory, name) for name in ("a.tif", "b.TIFF")]
+        self.assertEqual(scene_paths([self.directory]), expected)
+        pattern = os.path.join(self.directory, "*.tif")
+        self.assertEqual(scene_paths([pattern, expected[0]]), expected[:1])
+
+    def test_settings_for_scene(self):
+        args = parse_args(["in.tif", "--model", "unet.onnx", "--output-dir", self.directory,
+                           "--format", "gpkg", "--resolution", "512", "--batch-size", "4"])
+        settings = settings_factory(args)("/data/scene_1.tif")
+        self.assertEqual(settings.output_path, os.path.join(self.directory, "scene_1.tif"))
+        self.assertEqual(settings.vector_path, os.path.join(self.directory, "scene_1.gpkg"))
+        self.assertEqual((settings.tile_size, settings.resolution, settings.batch_size), (512, 512, 4))
+
+    def test_manifest_precision(self):
+        model_path = os.path.join(self.directory, "unet.onnx")
+        with open(os.path.join(self.directory, "unet.json"), "w") as f:
+            f.write('{"precision": "INT8"}')
+        args = parse_args(["in.tif", "--model", model_path, "--output-dir", self.directory])
+        self.assertEqual(settings_factory(args)("/data/scene_1.tif").precision, "INT8 dynamic")
+        args = parse_args(["in.tif", "--model", model_path, "--output-dir", self.directory, "--precision", "FP16"])
+        self.assertEqual(settings_factory(args)("/data/scene_1.tif").precision, "FP16")
+
+    def test_bad_manifest_reported(self):
+        model_path = os.path.join(self.directory, "unet.onnx")
+        with open(os.path.join(self.directory, "unet.json"), "w") as f:
+            f.write('{"precision": "INT4"}')
+        errors = io.StringIO()
+        with redirect_stdout(io.StringIO()), redirect_stderr(errors):
+            status = main([os.path.join(self.directory, "a.tif"), "--model", model_path,
+                           "--output-dir", os.path.join(self.directory, "out")])
+        self.assertEqual(status, 1)
+        self.assertIn("INT4", errors.getvalue())
+
+    def test_existing_output_skipped(self):
+        args = parse_args(["in.tif", "--model", "unet.onnx", "--output-dir", self.directory])
+        statuses = []
+        runner = BatchRunner(settings_factory(args), on_status=lambda *status: statuses.append(status[:2]))
+        path = os.path.join(self.directory, "a.tif")
+        self.assertEqual(runner.run([path]), {path: SKIPPED})
+        self.assertEqual(statuses, [(path, QUEUED), (path, SKIPPED)])
+
+    def test_unfinished_output_not_skipped(self):
+        args = parse_args(["in.tif", "--model", "unet.onnx", "--output-dir", self.directory])
+        statuses = []
+        runner = BatchRunner(settings_factory(args), on_status=lambda *status: statuses.append(status[:2]))
+        path = os.path.join(self.directory, "a.tif")
+        marker = path + UNFINISHED_SUFFIX
+        open(marker, "w").close()  # Left by an interrupted run
+        runner.run([path])
+        # Run again (and failing here, the input is empty), not skipped; still unfinished
+        self.assertEqual(statuses, [(path, QUEUED), (path, RUNNING), (path, FAILED)])
+        self.assertTrue(os.path.exists(marker))
+
+    def test_plan_concurrency(self):
+        settings = InferenceSettings("a.tif", "out.tif", "unet.onnx", batch_size=4, resolution=512)
+        gb = 1024 ** 3
+        self.assertEqual(plan_concurrency(settings, 10, cpu_count=16, memory=64 * gb), 8)
+        self.assertEqual(plan_concurrency(settings, 3, cpu_count=16, memory=64 * gb), 3)
+        self.assertEqual(plan_concurrency(settings, 10, cpu_count=16, memory=1 * gb), 1)
+        settings.workers = 2
+        self.assertEqual(plan_concurrency(settings, 10, cpu_count=16, memory=64 * gb), 4)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(BatchRunnerTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
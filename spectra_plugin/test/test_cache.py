@@ -0,0 +1,90 @@
+# coding=utf-8
+"""Tile result cache tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'deepresense@gmail.com'
+__date__ = '2025-07-22'
+__copyright__ = 'Copyright 2025, Deepresense'
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+from spectra_plugin.spectra_cache import TileCache, raster_name, source_file
+from spectra_plugin.spectra_inference import Tile
+
+
+class TileCacheTest(unittest.TestCase):
+    """Test the on-disk tile cache."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip_and_hit_rate(self):
+        cache = TileCache(self.directory, 1 << 20)
+        key = cache.key("run", Tile(0, 0, 0, 0, 0, 32, 32))
+        self.assertFalse(cache.contains(key))
+        self.assertIsNone(cache.get(key))
+        scores = np.random.rand(2, 8, 8).astype(np.float32)
+        cache.put(key, scores)
+        self.assertTrue(cache.contains(key))
+        np.testing.assert_array_equal(cache.get(key), scores)
+        self.assertEqual(cache.hit_rate(), 0.5)
+
+    def test_key_depends_on_window_and_extra(self):
+        tile = Tile(0, 0, 0, 0, 0, 32, 32)
+        moved = Tile(0, 0, 0, 16, 0, 32, 32)
+        self.assertNotEqual(TileCache.key("run", tile), TileCache.key("run", moved))
+        self.assertNotEqual(TileCache.key("run", tile), TileCache.key("run", tile, "aoi"))
+        self.assertNotEqual(TileCache.key("run", tile), TileCache.key("other run", tile))
+
+    def test_least_recently_used_evicted(self):
+        scores = np.zeros((1, 64, 64), dtype=np.float32)  # ~16 kB per entry
+        cache = TileCache(self.directory, 40 * 1024)
+        keys = [cache.key("run", Tile(i, 0, i, i * 64, 0, 64, 64)) for i in range(3)]
+        cache.put(keys[0], scores)
+        cache.put(keys[1], scores)
+        past = time.time() - 100
+        os.utime(cache._path(keys[1]), (past, past))  # keys[1] is now the least recently used
+        cache.put(keys[2], scores)
+        self.assertIsNotNone(cache.get(keys[0]))
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertIsNotNone(cache.get(keys[2]))
+        self.assertLessEqual(cache.size, 40 * 1024)
+
+    def test_overwrite_counted_once(self):
+        cache = TileCache(self.directory, 1 << 20)
+        key = cache.key("run", Tile(0, 0, 0, 0, 0, 32, 32))
+        cache.put(key, np.zeros((2, 8, 8), dtype=np.float32))
+        cache.put(key, np.ones((1, 8, 8), dtype=np.float32))
+        self.assertEqual(cache.size, os.path.getsize(cache._path(key)))
+        self.assertEqual(TileCache(self.directory, 1 << 20).size, cache.size)
+
+    def test_subdataset_names(self):
+        path = os.path.join(self.directory, "scene.nc")
+        open(path, "w").close()
+        self.assertEqual(source_file(f'NETCDF:"{path}":reflectance'), path)
+        self.assertEqual(source_file(path), path)
+        self.assertIsNone(source_file('NETCDF:"/missing.nc":reflectance'))
+        self.assertEqual(raster_name(f'NETCDF:"{path}":reflectance'), "scene_reflectance")
+        self.assertEqual(raster_name('HDF5:"/data/scene.h5"://bands/red'), "scene_bands_red")
+        self.assertEqual(raster_name("/data/scene.tif"), "scene")
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(TileCacheTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,107 @@
+# coding=utf-8
+"""Change detection tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'deepresense@gmail.com'
+__date__ = '2025-07-22'
+__copyright__ = 'Copyright 2025, Deepresense'
+
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from osgeo import gdal, osr
+
+from spectra_plugin.spectra_change import PairSource, common_grid
+from spectra_plugin.spectra_inference import Tile
+from spectra_plugin.spectra_preprocess import ChangePreprocessor
+
+
+class ChangeTest(unittest.TestCase):
+    """Test the common grid of two dates and the paired window reads."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.earlier = self.create("earlier.tif", 100, 80, 0, 10)
+        # Shifted by 20 pixels to the east, on the same pixel grid
+        self.later = self.create("later.tif", 100, 80, 200, 10)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def create(self, name, width, height, x0, pixel):
+        """Raster whose pixels hold their own easting, so aligned windows read equal values."""
+        path = os.path.join(self.directory, name)
+        dataset = gdal.GetDriverByName("GTiff").Create(path, width, height, 2, gdal.GDT_Float32)
+        dataset.SetGeoTransform((x0, pixel, 0, 1000, 0, -pixel))
+        srs = osr.SpatialReference()
+        srs.ImportFromEPSG(32633)
+        dataset.SetProjection(srs.ExportToWkt())
+        eastings = x0 + pixel * (np.arange(width, dtype=np.float32) + 0.5)
+        for band in (1, 2):
+            dataset.GetRasterBand(band).WriteArray(np.tile(eastings, (height, 1)))
+        dataset = None
+        return path
+
+    def test_same_grid(self):
+        earlier, later, warped = common_grid(self.earlier, self.later)
+        self.assertFalse(warped)
+        reader = PairSource(earlier, later, [1])()
+        self.assertEqual((reader.width, reader.height), (80, 80))
+        self.assertEqual(reader.dataset.GetGeoTransform()[0], 200)
+        data = reader.read(Tile(0, 0, 0, 0, 0, 64, 64), 64)
+        self.assertEqual(data.shape, (2, 64, 64))
+        np.testing.assert_array_equal(data[0], data[1])
+        reader.close()
+
+    def test_warped_grid(self):
+        coarse = self.create("coarse.tif", 30, 30, 100, 20)
+        earlier, later, warped = common_grid(self.earlier, coarse)
+        self.assertTrue(warped)
+        reader = PairSource(earlier, later)()
+        self.assertEqual((reader.width, reader.height), (60, 60))
+        self.assertEqual(len(reader.bands), 4)
+        data = reader.read(Tile(0, 0, 0, 0, 0, 60, 60), 60)
+        # Bilinear resampling of a linear ramp, away from the edges
+        np.testing.assert_allclose(data[0, 10:50, 10:50], data[2, 10:50, 10:50], atol=1e-3)
+        reader.close()
+
+    def test_no_overlap(self):
+        far = self.create("far.tif", 10, 10, 5000, 10)
+        with self.assertRaises(ValueError):
+            common_grid(self.earlier, far)
+
+    def test_source_pickles(self):
+        source = pickle.loads(pickle.dumps(PairSource(*common_grid(self.earlier, self.later)[:2])))
+        reader = source()
+        self.assertEqual(reader.width, 80)
+        reader.close()
+
+    def test_fusion(self):
+        data = np.stack([np.full((8, 8), value, dtype=np.float32) for value in (1, 2, 5, 7)])
+        stacked = ChangePreprocessor(4)
+        self.assertEqual(stacked.channels(4), 4)
+        self.assertEqual(stacked(data)[:, 0, 0].tolist(), [1, 2, 5, 7])
+        siamese = ChangePreprocessor(4, fusion="siamese")  # Split one date per input by the backend
+        self.assertEqual(siamese.channels(4), 4)
+        self.assertEqual(siamese(data)[:, 0, 0].tolist(), [1, 2, 5, 7])
+        difference = ChangePreprocessor(4, fusion="difference")
+        self.assertEqual(difference.channels(4), 2)
+        self.assertEqual(difference(data)[:, 0, 0].tolist(), [4, 5])
+        with self.assertRaises(ValueError):
+            ChangePreprocessor(4, fusion="concat")
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ChangeTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
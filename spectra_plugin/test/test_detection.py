@@ -0,0 +1,126 @@
+# coding=utf-8
+"""Cross-tile non-maximum suppression tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'deepresense@gmail.com'
+__date__ = '2025-07-22'
+__copyright__ = 'Copyright 2025, Deepresense'
+
+import unittest
+
+import numpy as np
+
+from spectra_plugin.spectra_detection import DetectionEngine, box_iou, grid_nms
+from spectra_plugin.spectra_inference import InferenceSettings, TileGrid
+
+
+def brute_force_nms(boxes, scores, classes, iou_threshold):
+    kept = []
+    for index in np.argsort(-scores, kind="stable"):
+        others = [k for k in kept if classes[k] == classes[index]]
+        if not others or box_iou(boxes[others], np.repeat(boxes[[index]], len(others), 0)).max() <= iou_threshold:
+            kept.append(index)
+    return np.array(kept)
+
+
+class GridNmsTest(unittest.TestCase):
+    """Test the grid bucketed NMS against the quadratic one."""
+
+    def test_duplicate_suppressed(self):
+        boxes = np.array([[0, 0, 10, 10], [1, 1, 11, 11], [50, 50, 60, 60]])
+        keep = grid_nms(boxes, np.array([0.9, 0.8, 0.7]), iou_threshold=0.5)
+        self.assertEqual(list(keep), [0, 2])
+
+    def test_classes_kept_apart(self):
+        boxes = np.array([[0, 0, 10, 10], [1, 1, 11, 11]])
+        keep = grid_nms(boxes, np.array([0.9, 0.8]), np.array([1, 2]))
+        self.assertEqual(list(keep), [0, 1])
+
+    def test_matches_brute_force(self):
+        rng = np.random.default_rng(0)
+        corners = rng.uniform(0, 500, (2000, 2))
+        boxes = np.hstack([corners, corners + rng.uniform(5, 30, (2000, 2))])
+        scores = rng.uniform(size=2000)
+        classes = rng.integers(0, 2, 2000)
+        np.testing.assert_array_equal(grid_nms(boxes, scores, classes, 0.3),
+                                      brute_force_nms(boxes, scores, classes, 0.3))
+
+    def test_oversized_boxes(self):
+        rng = np.random.default_rng(1)
+        corners = rng.uniform(0, 500, (1000, 2))
+        boxes = np.hstack([corners, corners + rng.uniform(5, 30, (1000, 2))])
+        # A few boxes far larger than the rest, overlapping many of them and each other
+        boxes[:5, 2:] = boxes[:5, :2] + rng.uniform(100, 300, (5, 2))
+        scores = rng.uniform(size=1000)
+        classes = np.zeros(1000, dtype=np.int64)
+        expected = brute_force_nms(boxes, scores, classes, 0.1)
+        np.testing.assert_array_equal(grid_nms(boxes, scores, classes, 0.1), expected)
+        # Cells smaller than most boxes still find every overlap
+        np.testing.assert_array_equal(grid_nms(boxes, scores, classes, 0.1, cell_size=8), expected)
+
+    def test_empty(self):
+        self.assertEqual(len(grid_nms(np.zeros((0, 4)), np.zeros(0))), 0)
+
+
+class FakeMaskReader:
+    """Mask reader over an in-memory array, the rasterised AOI of a test."""
+
+    def __init__(self, mask):
+        self.dataset = self
+        self.mask = mask
+
+    def GetRasterBand(self, band):
+        return self
+
+    def ReadAsArray(self, x, y, xsize, ysize):
+        return self.mask[y:y + ysize, x:x + xsize]
+
+
+class TileBoxesTest(unittest.TestCase):
+    """Test which tile keeps a box: the one owning its centre."""
+
+    def setUp(self):
+        settings = InferenceSettings("in.tif", "out.tif", "yolo.onnx", tile_size=64, overlap=16, resolution=64,
+                                     detection=True)
+        self.engine = DetectionEngine(None, settings)
+        self.grid = TileGrid(200, 200, 64, 16)
+
+    def test_wide_box_kept_by_centre_tile(self):
+        tile = self.grid.tile(0, 1)  # x = 48, core window x 56..104
+        boxes = np.array([[0, 10, 64, 30, 0.9, 1],    # Cut on both sides, centre x 80
+                          [0, 40, 8, 50, 0.9, 1],     # Centre x 52, owned by tile (0, 0)
+                          [20, 10, 30, 20, 0.1, 1]])  # Below the score threshold
+        kept = self.engine._tile_boxes(tile, boxes, 1.0, self.grid)
+        np.testing.assert_array_equal(kept[:, :4], [[48, 10, 112, 30]])
+
+    def test_every_centre_owned_once(self):
+        box = np.array([[0, 0, 10, 10, 0.9, 1]], dtype=np.float64)
+        owners = 0
+        for tile in self.grid:
+            # The same raster box (centre 100, 100) as each tile sees it
+            local = box.copy()
+            local[:, [0, 2]] += 95 - tile.x
+            local[:, [1, 3]] += 95 - tile.y
+            owners += len(self.engine._tile_boxes(tile, local, 1.0, self.grid))
+        self.assertEqual(owners, 1)
+
+    def test_inside_aoi(self):
+        mask = np.zeros((200, 200), dtype=np.uint8)
+        mask[:, :80] = 1  # AOI boundary at x = 80
+        boxes = np.array([[60, 10, 90, 20, 0.9, 1],    # Centre x 75, inside
+                          [70, 30, 100, 40, 0.9, 1],   # Centre x 85, outside
+                          [79, 50, 81.5, 60, 0.9, 1]])  # Centre x 80.25, first pixel outside
+        inside = DetectionEngine._inside_aoi(boxes, FakeMaskReader(mask), (56, 0, 48, 56))
+        np.testing.assert_array_equal(inside, [True, False, False])
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(GridNmsTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
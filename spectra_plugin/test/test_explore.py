@@ -0,0 +1,72 @@
+# coding=utf-8
+"""On-demand tile inference tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'deepresense@gmail.com'
+__date__ = '2025-07-22'
+__copyright__ = 'Copyright 2025, Deepresense'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from osgeo import gdal
+
+from spectra_plugin.spectra_explore import TileInferencer
+from spectra_plugin.spectra_inference import InferenceSettings
+from spectra_plugin.spectra_tiles import OverviewPyramid
+
+
+class IdentityModel:
+    """Returns the first input channel as a single score band."""
+
+    def predict(self, batch):
+        return batch[:, :1]
+
+
+class ExploreTest(unittest.TestCase):
+    """Test the margin, level and cropping of single tile inference."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "ramp.tif")
+        dataset = gdal.GetDriverByName("GTiff").Create(self.path, 600, 400, 1, gdal.GDT_Float32)
+        dataset.GetRasterBand(1).WriteArray(np.tile(np.arange(600, dtype=np.float32), (400, 1)))
+        dataset = None
+        self.settings = InferenceSettings(self.path, "", "model.onnx", tile_size=256, overlap=32, resolution=64)
+        self.inferencer = TileInferencer(IdentityModel(), self.settings, OverviewPyramid(self.path))
+
+    def tearDown(self):
+        self.inferencer.close()
+        shutil.rmtree(self.directory)
+
+    def test_read_margin(self):
+        self.assertEqual(self.inferencer.margin, 32)
+        data = self.inferencer.read(0, 0, 0)
+        self.assertEqual(data.shape, (1, 320, 320))
+        # Past the raster edge the window repeats the edge pixels
+        np.testing.assert_array_equal(data[0, :, :32], np.zeros((320, 32)))
+        self.assertEqual(data[0, 40, 32 + 100], 100)
+        self.assertEqual(self.inferencer.read(1, 0, 0).shape, (1, 320, 320))
+
+    def test_infer_crops_to_tile(self):
+        scores = self.inferencer.infer(0, 2, 1)
+        self.assertEqual(scores.shape, (1, 144, 88))
+        # The ramp survives the round trip through the model resolution
+        np.testing.assert_allclose(scores[0, 50, 10:40], np.arange(522, 552), atol=1.0)
+        # A coarser level has one score per decimated pixel
+        self.assertEqual(self.inferencer.infer(1, 1, 0).shape, (1, 200, 44))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ExploreTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,83 @@
+# coding=utf-8
+"""Time-series forecasting tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'deepresense@gmail.com'
+__date__ = '2025-07-22'
+__copyright__ = 'Copyright 2025, Deepresense'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from osgeo import gdal
+
+from spectra_plugin.spectra_batch import run_settings
+from spectra_plugin.spectra_forecast import ARIMA_MODEL, ArimaForecaster, ForecastEngine
+from spectra_plugin.spectra_inference import InferenceSettings
+
+
+class ForecastTest(unittest.TestCase):
+    """Test the batched ARIMA fit and the chunked forecasting engine."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_trend_continues(self):
+        steps = np.arange(24, dtype=np.float32)
+        series = np.stack([2 * steps + 5, -steps, np.full(24, 3.0, dtype=np.float32)])
+        forecast = ArimaForecaster(4, (2, 1)).predict(series[:, :, None, None])
+        self.assertEqual(forecast.shape, (3, 4))
+        np.testing.assert_allclose(forecast[0], 2 * np.arange(24, 28) + 5, atol=1e-2)
+        np.testing.assert_allclose(forecast[1], -np.arange(24, 28), atol=1e-2)
+        np.testing.assert_allclose(forecast[2], 3.0, atol=1e-2)
+
+    def test_too_short(self):
+        with self.assertRaises(ValueError):
+            ArimaForecaster(2, (3, 1)).predict(np.zeros((1, 6, 1, 1), dtype=np.float32))
+
+    def test_reduced_precision_rejected(self):
+        for precision in ("FP16", "INT8 dynamic", "INT8 static"):
+            settings = InferenceSettings("stack.tif", "forecast.tif", "lstm.onnx", forecast_horizon=3,
+                                         precision=precision)
+            with self.assertRaises(ValueError):
+                run_settings(settings)
+
+    def test_engine(self):
+        path = os.path.join(self.directory, "stack.tif")
+        dataset = gdal.GetDriverByName("GTiff").Create(path, 40, 30, 12, gdal.GDT_Float32)
+        dataset.SetGeoTransform((0, 10, 0, 300, 0, -10))
+        for date in range(12):
+            values = np.full((30, 40), 10.0 + date, dtype=np.float32)
+            values[0, 0] = np.nan  # A pixel with a gap stays nodata
+            dataset.GetRasterBand(date + 1).WriteArray(values)
+        dataset = None
+
+        output_path = os.path.join(self.directory, "forecast.tif")
+        settings = InferenceSettings(path, output_path, ARIMA_MODEL, tile_size=16, forecast_horizon=3)
+        forecaster = ArimaForecaster(settings.forecast_horizon, settings.forecast_order)
+        self.assertEqual(ForecastEngine(forecaster, settings).run(), output_path)
+
+        result = gdal.Open(output_path)
+        self.assertEqual(result.RasterCount, 3)
+        self.assertEqual(result.GetRasterBand(2).GetDescription(), "t+2")
+        values = result.ReadAsArray()
+        self.assertTrue(np.isnan(values[:, 0, 0]).all())
+        np.testing.assert_allclose(values[:, 29, 39], [22, 23, 24], atol=1e-2)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ForecastTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
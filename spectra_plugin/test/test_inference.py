@@ -0,0 +1,460 @@
+# coding=utf-8
+"""Tile grid and blending tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'deepresense@gmail.com'
+__date__ = '2025-07-22'
+__copyright__ = 'Copyright 2025, Deepresense'
+
+import math
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from osgeo import gdal, osr
+
+from spectra_plugin.spectra_inference import (TileGrid, TileBatchScheduler, MemmapAccumulator, InferenceSettings,
+                                              InferenceEngine, RasterWindowReader, RasterWindowWriter, align_tile_grid,
+                                              blend_weights, scratch_directory)
+from spectra_plugin.spectra_preprocess import Preprocessor, resize
+
+
+class TileGridTest(unittest.TestCase):
+    """Test the overlapping tile grid."""
+
+    def test_tiles_cover_raster(self):
+        """Tiles reach the raster edge without running past it."""
+        grid = TileGrid(1000, 700, 256, 32)
+        tiles = list(grid)
+        self.assertEqual(len(tiles), len(grid))
+        self.assertEqual(max(t.x + t.xsize for t in tiles), 1000)
+        self.assertEqual(max(t.y + t.ysize for t in tiles), 700)
+        self.assertTrue(all(t.xsize > 0 and t.ysize > 0 for t in tiles))
+
+    def test_core_windows_partition_raster(self):
+        """Core windows cover every pixel exactly once."""
+        grid = TileGrid(1000, 700, 256, 32)
+        coverage = np.zeros((700, 1000), dtype=np.int32)
+        for tile in grid:
+            x, y, xsize, ysize = grid.core_window(tile)
+            coverage[y:y + ysize, x:x + xsize] += 1
+        self.assertTrue((coverage == 1).all())
+
+    def test_small_raster(self):
+        """A raster smaller than one tile gives a single tile."""
+        grid = TileGrid(100, 50, 256, 32)
+        self.assertEqual(len(grid), 1)
+        self.assertEqual(grid.core_window(next(iter(grid))), (0, 0, 100, 50))
+
+    def test_invalid_overlap(self):
+        with self.assertRaises(ValueError):
+            TileGrid(100, 100, 64, 64)
+
+
+class BlendWeightsTest(unittest.TestCase):
+    """Test the blending window."""
+
+    def test_weights_positive_and_ramped(self):
+        weights = blend_weights(64, 16)
+        self.assertEqual(weights.shape, (64, 64))
+        self.assertTrue((weights > 0).all())
+        self.assertEqual(weights[32, 32], 1.0)
+        self.assertLess(weights[0, 32], weights[8, 32])
+
+    def test_no_overlap(self):
+        self.assertTrue((blend_weights(32, 0) == 1).all())
+
+
+class FakeReader:
+    """Reader returning each tile filled with its index + 1."""
+
+    bands = [1, 2]
+
+    def read(self, tile, size):
+        return np.full((2, size, size), tile.index + 1, dtype=np.float32)
+
+
+class TileBatchSchedulerTest(unittest.TestCase):
+    """Test fixed-shape batching."""
+
+    def test_partial_batch_is_padded(self):
+        grid = TileGrid(100, 100, 32, 0)  # 4 x 4 tiles
+        scheduler = TileBatchScheduler(grid, FakeReader(), 5, 32, Preprocessor(16))
+        batches = [(list(tiles), batch.copy()) for tiles, batch in scheduler]
+        self.assertEqual(len(batches), len(scheduler))
+        self.assertEqual([len(tiles) for tiles, _ in batches], [5, 5, 5, 1])
+        self.assertTrue(all(batch.shape == (5, 2, 16, 16) for _, batch in batches))
+        last_tiles, last_batch = batches[-1]
+        self.assertEqual(last_batch[0, 0, 0, 0], last_tiles[0].index + 1)
+        self.assertTrue((last_batch[1:] == 0).all())
+
+    def test_mask_only_listed_tiles(self):
+        class EmptyMask:
+            def read(self, tile, size):
+                return np.zeros((1, size, size), dtype=np.uint8)
+
+        tiles = [tile for tile in TileGrid(100, 100, 32, 0) if tile.index in (1, 2, 5)]
+        scheduler = TileBatchScheduler(tiles, FakeReader(), 3, 32, Preprocessor(16),
+                                       EmptyMask(), masked={2})
+        (batch_tiles, batch), = list(scheduler)
+        self.assertEqual([tile.index for tile in batch_tiles], [1, 2, 5])
+        self.assertTrue((batch[0] == 2).all())
+        self.assertTrue((batch[1] == 0).all())
+        self.assertTrue((batch[2] == 6).all())
+
+
+class FakeSource:
+    RasterXSize = 100
+    RasterYSize = 90
+
+
+class MemmapAccumulatorTest(unittest.TestCase):
+    """Test out-of-core blending and resuming from a checkpoint."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.grid = TileGrid(100, 90, 32, 8)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def scores(self, tile):
+        return np.stack([np.full((32, 32), tile.index, np.float32), np.full((32, 32), 1.0, np.float32)])
+
+    def blended(self, accumulator):
+        return accumulator.read_blended(0, 0, 100, 90).copy()
+
+    def test_constant_scores_blend_to_constant(self):
+        accumulator = MemmapAccumulator(self.directory, FakeSource(), 32, 8)
+        for tile in self.grid:
+            accumulator.add(tile, self.scores(tile))
+        np.testing.assert_allclose(self.blended(accumulator)[1], 1.0, rtol=1e-5)
+        accumulator.remove()
+
+    def test_resume_matches_uninterrupted_run(self):
+        reference = MemmapAccumulator(self.directory + "/reference", FakeSource(), 32, 8, "run")
+        for tile in self.grid:
+            reference.add(tile, self.scores(tile))
+        expected = self.blended(reference)
+
+        interrupted = MemmapAccumulator(self.directory + "/job", FakeSource(), 32, 8, "run")
+        for tile in self.grid:
+            if tile.row == 2 and tile.col == 0:
+                interrupted.checkpoint(2)
+            if tile.row == 2 and tile.col == 2:
+                break  # Crash halfway through grid row 2
+            interrupted.add(tile, self.scores(tile))
+        interrupted.close()
+
+        resumed = MemmapAccumulator(self.directory + "/job", FakeSource(), 32, 8, "run")
+        self.assertEqual(resumed.restore(), 2)
+        for tile in self.grid:
+            if tile.row >= 2:
+                resumed.add(tile, self.scores(tile))
+        np.testing.assert_allclose(self.blended(resumed), expected, rtol=1e-5)
+
+    def test_resume_several_rows_past_checkpoint(self):
+        reference = MemmapAccumulator(self.directory + "/reference", FakeSource(), 32, 8, "run")
+        for tile in self.grid:
+            reference.add(tile, self.scores(tile))
+        expected = self.blended(reference)
+
+        # Checkpoints are throttled: rows 1 and 2 were added after the last one
+        interrupted = MemmapAccumulator(self.directory + "/job", FakeSource(), 32, 8, "run")
+        for tile in self.grid:
+            if tile.row == 1 and tile.col == 0:
+                interrupted.checkpoint(1)
+            if tile.row == 3 and tile.col == 2:
+                break
+            interrupted.add(tile, self.scores(tile))
+        interrupted.close()
+
+        resumed = MemmapAccumulator(self.directory + "/job", FakeSource(), 32, 8, "run")
+        self.assertEqual(resumed.restore(), 1)
+        for tile in self.grid:
+            if tile.row >= 1:
+                resumed.add(tile, self.scores(tile))
+        np.testing.assert_allclose(self.blended(resumed), expected, rtol=1e-5)
+
+    def test_other_run_not_resumed(self):
+        first = MemmapAccumulator(self.directory, FakeSource(), 32, 8, "run")
+        first.add(self.grid.tile(0, 0), self.scores(self.grid.tile(0, 0)))
+        first.checkpoint(1)
+        first.close()
+        self.assertEqual(MemmapAccumulator(self.directory, FakeSource(), 32, 8, "other").restore(), 0)
+
+
+class AlignTileGridTest(unittest.TestCase):
+    """Test snapping the tile grid to the raster's blocks."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def raster(self, name, options):
+        path = f"{self.directory}/{name}.tif"
+        gdal.GetDriverByName("GTiff").Create(path, 1000, 800, 3, gdal.GDT_UInt16, options)
+        return path
+
+    def test_tiled_raster(self):
+        path = self.raster("tiled", ["TILED=YES", "BLOCKXSIZE=128", "BLOCKYSIZE=128"])
+        settings = align_tile_grid(InferenceSettings(path, "out.tif", "unet.onnx", tile_size=256, overlap=32))
+        self.assertEqual((settings.tile_size, settings.overlap), (288, 32))
+        self.assertEqual(align_tile_grid(settings).tile_size, 288)
+
+    def test_striped_raster_untouched(self):
+        path = self.raster("striped", [])
+        settings = align_tile_grid(InferenceSettings(path, "out.tif", "unet.onnx", tile_size=256, overlap=32))
+        self.assertEqual(settings.tile_size, 256)
+
+    def test_block_larger_than_stride(self):
+        path = self.raster("large", ["TILED=YES", "BLOCKXSIZE=512", "BLOCKYSIZE=512"])
+        settings = align_tile_grid(InferenceSettings(path, "out.tif", "unet.onnx", tile_size=256, overlap=32))
+        self.assertEqual(settings.tile_size, 256)
+
+
+class PreprocessorTest(unittest.TestCase):
+    """Test per-tile preprocessing."""
+
+    def test_normalise_mask(self):
+        data = np.stack([np.full((4, 4), 10.0), np.full((4, 4), 20.0)]).astype(np.float32)
+        mask = np.ones((4, 4), dtype=np.float32)
+        mask[0] = 0
+        result = Preprocessor(4, mean=[10, 20], std=[5, 2])(data + 10, mask)
+        self.assertEqual(result.shape, (2, 4, 4))
+        self.assertTrue((result[:, 0] == 0).all())
+        np.testing.assert_allclose(result[0, 1:], 2.0)
+        np.testing.assert_allclose(result[1, 1:], 5.0)
+
+    def test_resize(self):
+        data = np.arange(16, dtype=np.float32).reshape(1, 4, 4)
+        self.assertEqual(resize(data, 8).shape, (1, 8, 8))
+        self.assertEqual(resize(data, 2, nearest=True).shape, (1, 2, 2))
+        np.testing.assert_allclose(resize(np.ones((3, 5, 5), np.float32), 7), 1.0)
+
+
+def source_raster(width, height):
+    """In-memory raster with a UTM geotransform and CRS."""
+    dataset = gdal.GetDriverByName("MEM").Create("", width, height, 1, gdal.GDT_Byte)
+    dataset.SetGeoTransform((500000, 10, 0, 4000000, 0, -10))
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(32633)
+    dataset.SetProjection(srs.ExportToWkt())
+    return dataset
+
+
+class NoZstdDriver:
+    """GTiff driver of a GDAL build without ZSTD."""
+
+    def __init__(self, driver):
+        self.driver = driver
+
+    def GetMetadataItem(self, name, domain=""):
+        if name == "DMD_CREATIONOPTIONLIST":
+            return self.driver.GetMetadataItem(name, domain).replace("ZSTD", "")
+        return self.driver.GetMetadataItem(name, domain)
+
+    def __getattr__(self, name):
+        return getattr(self.driver, name)
+
+
+class RasterWindowWriterTest(unittest.TestCase):
+    """Test the output GeoTIFF options, nodata and overviews."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "result.tif")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def class_scores(self, width, height):
+        """Three class scores whose argmax is the column index modulo 3."""
+        scores = np.zeros((3, height, width), dtype=np.float32)
+        for value in range(3):
+            scores[value, :, value::3] = 1.0
+        return scores
+
+    def test_tiled_options(self):
+        source = source_raster(300, 200)
+        writer = RasterWindowWriter(self.path, source, 3, {0: "background", 2: "road"}, compression="LZW")
+        writer.write(self.class_scores(300, 200), 0, 0)
+        writer.close()
+
+        dataset = gdal.Open(self.path)
+        band = dataset.GetRasterBand(1)
+        self.assertEqual(band.GetBlockSize(), [256, 256])
+        self.assertEqual(band.DataType, gdal.GDT_Byte)
+        self.assertEqual(dataset.GetMetadataItem("COMPRESSION", "IMAGE_STRUCTURE"), "LZW")
+        self.assertEqual(dataset.GetGeoTransform(), source.GetGeoTransform())
+        self.assertEqual(dataset.GetSpatialRef().GetAuthorityCode(None), "32633")
+        self.assertEqual(band.GetCategoryNames(), ["background", "", "road"])
+        np.testing.assert_array_equal(band.ReadAsArray()[0, :6], [0, 1, 2, 0, 1, 2])
+
+    def test_compression_fallback(self):
+        get_driver = gdal.GetDriverByName
+        with mock.patch.object(gdal, "GetDriverByName", lambda name: NoZstdDriver(get_driver(name))):
+            writer = RasterWindowWriter(self.path, source_raster(64, 64), 1, compression="ZSTD")
+        self.assertEqual(writer.compression, "DEFLATE")
+        writer.close()
+        dataset = gdal.Open(self.path)
+        self.assertEqual(dataset.GetMetadataItem("COMPRESSION", "IMAGE_STRUCTURE"), "DEFLATE")
+
+        dataset = None
+        writer = RasterWindowWriter(self.path, source_raster(64, 64), 1, compression="NONE")
+        writer.close()
+        self.assertIsNone(gdal.Open(self.path).GetMetadataItem("COMPRESSION", "IMAGE_STRUCTURE"))
+
+    def test_nodata(self):
+        mask = np.ones((20, 30), dtype=np.uint8)
+        mask[:, :10] = 0
+        writer = RasterWindowWriter(self.path, source_raster(30, 20), 3)
+        result = writer.write(self.class_scores(30, 20), 0, 0, mask)
+        writer.close()
+        band = gdal.Open(self.path).GetRasterBand(1)
+        self.assertEqual(band.GetNoDataValue(), 255)
+        np.testing.assert_array_equal(band.ReadAsArray(), result)
+        self.assertTrue((result[:, :10] == 255).all())
+        self.assertEqual(result[0, 10], 1)
+
+        path = os.path.join(self.directory, "scores.tif")
+        writer = RasterWindowWriter(path, source_raster(30, 20), 1)
+        writer.write(np.full((1, 20, 30), 0.75, dtype=np.float32), 0, 0, mask)
+        writer.close()
+        band = gdal.Open(path).GetRasterBand(1)
+        self.assertEqual(band.DataType, gdal.GDT_Float32)
+        self.assertTrue(np.isnan(band.GetNoDataValue()))
+        data = band.ReadAsArray()
+        self.assertTrue(np.isnan(data[:, :10]).all())
+        np.testing.assert_array_equal(data[:, 10:], 0.75)
+
+    def test_overviews(self):
+        writer = RasterWindowWriter(self.path, source_raster(600, 520), 3)
+        writer.write(self.class_scores(600, 520), 0, 0)
+        self.assertEqual(writer.build_overviews(), [2])
+        writer.close()
+        band = gdal.Open(self.path).GetRasterBand(1)
+        self.assertEqual(band.GetOverviewCount(), 1)
+        # Nearest resampling keeps only valid classes
+        overview = band.GetOverview(0).ReadAsArray()
+        self.assertEqual(overview.shape, (260, 300))
+        self.assertTrue(np.isin(overview, [0, 1, 2]).all())
+
+        writer = RasterWindowWriter(os.path.join(self.directory, "small.tif"), source_raster(200, 200), 3)
+        self.assertEqual(writer.build_overviews(), [])
+        writer.close()
+
+
+class ThresholdModel:
+    """Two class scores: class 1 where the first input channel exceeds ``threshold``."""
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.batches = 0
+
+    def predict(self, batch):
+        self.batches += 1
+        first = batch[:, 0]
+        return np.stack([self.threshold - first, first - self.threshold], axis=1)
+
+
+class InferenceEngineTest(unittest.TestCase):
+    """Test a whole run over a small synthetic raster."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.raster_path = os.path.join(self.directory, "ramp.tif")
+        dataset = gdal.GetDriverByName("GTiff").Create(self.raster_path, 300, 200, 2, gdal.GDT_Float32)
+        dataset.SetGeoTransform((500000, 10, 0, 4000000, 0, -10))
+        dataset.GetRasterBand(1).WriteArray(np.tile(np.arange(300, dtype=np.float32), (200, 1)))
+        dataset.GetRasterBand(2).Fill(1.0)
+        dataset = None
+        self.model_path = os.path.join(self.directory, "model.onnx")
+        with open(self.model_path, "wb") as model:
+            model.write(b"stub")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_run(self):
+        settings = InferenceSettings(self.raster_path, os.path.join(self.directory, "result.tif"),
+                                     self.model_path, tile_size=64, overlap=16, batch_size=3, resolution=64,
+                                     classes={0: "low", 1: "high"}, scratch_dir=self.directory)
+        model = ThresholdModel(150.5)
+        self.assertEqual(InferenceEngine(model, settings).run(), settings.output_path)
+
+        grid = TileGrid(300, 200, 64, 16)
+        self.assertEqual(model.batches, -(-len(grid) // 3))
+        dataset = gdal.Open(settings.output_path)
+        self.assertEqual(dataset.GetGeoTransform(), (500000, 10, 0, 4000000, 0, -10))
+        expected = np.tile((np.arange(300) > 150.5).astype(np.uint8), (200, 1))
+        np.testing.assert_array_equal(dataset.GetRasterBand(1).ReadAsArray(), expected)
+        # The scratch store of a completed run is removed
+        self.assertFalse(os.path.exists(scratch_directory(settings)))
+
+    def test_journal_bounded(self):
+        settings = InferenceSettings(self.raster_path, os.path.join(self.directory, "result.tif"),
+                                     self.model_path, tile_size=64, overlap=16, resolution=64,
+                                     scratch_dir=self.directory)
+        journal = os.path.join(scratch_directory(settings), "tiles")
+        sizes = []
+
+        class JournalWatchingModel(ThresholdModel):
+            def predict(self, batch):
+                sizes.append(sum(os.path.getsize(os.path.join(root, name))
+                                 for root, _, names in os.walk(journal) for name in names))
+                return super().predict(batch)
+
+        engine = InferenceEngine(JournalWatchingModel(150.5), settings)
+        engine.CHECKPOINT_SECONDS = math.inf  # Nothing pruned by a checkpoint during the run
+        tile_bytes = 2 * 64 * 64 * 4
+        engine.JOURNAL_BYTES = 4 * tile_bytes
+        engine.run()
+        # The journal fills up to its cap and no further, and goes with the completed run's scratch store
+        self.assertGreater(max(sizes), 2 * tile_bytes)
+        self.assertLessEqual(max(sizes), engine.JOURNAL_BYTES)
+        self.assertFalse(os.path.exists(journal))
+
+    def test_mask_reader_closed(self):
+        mask_path = os.path.join(self.directory, "mask.tif")
+        dataset = gdal.GetDriverByName("GTiff").Create(mask_path, 300, 200, 1, gdal.GDT_Byte)
+        mask = np.ones((200, 300), dtype=np.uint8)
+        mask[:, :100] = 0
+        dataset.GetRasterBand(1).WriteArray(mask)
+        dataset = None
+        settings = InferenceSettings(self.raster_path, os.path.join(self.directory, "result.tif"),
+                                     self.model_path, tile_size=64, overlap=16, resolution=64,
+                                     mask_path=mask_path, scratch_dir=self.directory)
+        opened = []
+
+        class TrackedReader(RasterWindowReader):
+            def __init__(self, *args):
+                super().__init__(*args)
+                opened.append(self)
+
+        with mock.patch("spectra_plugin.spectra_inference.RasterWindowReader", TrackedReader):
+            InferenceEngine(ThresholdModel(150.5), settings).run()
+        # The input and the mask, each opened once and closed by the end of the run
+        self.assertEqual(len(opened), 2)
+        self.assertTrue(all(reader.dataset is None for reader in opened))
+        result = gdal.Open(settings.output_path).GetRasterBand(1).ReadAsArray()
+        self.assertTrue((result[:, :100] == 255).all())
+        np.testing.assert_array_equal(result[0, 100:], np.arange(100, 300) > 150.5)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(TileGridTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
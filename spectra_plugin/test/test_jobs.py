@@ -0,0 +1,64 @@
+# coding=utf-8
+"""Job manifest tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'deepresense@gmail.com'
+__date__ = '2025-07-22'
+__copyright__ = 'Copyright 2025, Deepresense'
+
+import shutil
+import tempfile
+import unittest
+
+from spectra_plugin.spectra_inference import InferenceSettings
+from spectra_plugin.spectra_jobs import JobStore, INTERRUPTED
+
+
+class JobStoreTest(unittest.TestCase):
+    """Test recording, checkpointing and listing jobs."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = JobStore(self.directory)
+        self.settings = InferenceSettings("scene.tif", "out.tif", "unet.onnx", tile_size=512,
+                                          classes={0: "Background", 1: "Building"}, aoi_wkt=["POLYGON EMPTY"])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_settings_round_trip(self):
+        job = self.store.create(self.settings, {"raster": "scene", "model": "unet.onnx"})
+        settings = self.store.jobs()[0].settings
+        self.assertEqual(settings.to_dict(), self.settings.to_dict())
+        self.assertEqual(settings.classes, {0: "Background", 1: "Building"})
+        self.assertEqual(job.id, self.store.jobs()[0].id)
+
+    def test_unknown_settings_ignored(self):
+        data = self.settings.to_dict()
+        data["from_a_newer_version"] = True
+        self.assertEqual(InferenceSettings.from_dict(data).tile_size, 512)
+
+    def test_resumable_jobs(self):
+        crashed = self.store.create(self.settings)
+        interrupted = self.store.create(self.settings)
+        interrupted.checkpoint(3, 120, 400)
+        interrupted.set_status(INTERRUPTED)
+        completed = self.store.create(self.settings)
+        completed.remove()
+
+        resumable = self.store.resumable(running_ids={crashed.id})
+        self.assertEqual([job.id for job in resumable], [interrupted.id])
+        self.assertEqual(resumable[0].progress, (120, 400))
+        self.assertEqual(len(self.store.resumable()), 2)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(JobStoreTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,73 @@
+# coding=utf-8
+"""Log pipeline tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'deepresense@gmail.com'
+__date__ = '2025-07-22'
+__copyright__ = 'Copyright 2025, Deepresense'
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from spectra_plugin.spectra_log import LogPipeline
+
+
+class LogPipelineTest(unittest.TestCase):
+    """Test the bounded ring buffer, the batched pending lines and the streamed export."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.log = LogPipeline(os.path.join(self.directory, "log.jsonl"), capacity=3)
+
+    def tearDown(self):
+        self.log.close()
+        shutil.rmtree(self.directory)
+
+    def test_ring_buffer(self):
+        for number in range(5):
+            self.log.append(f"line {number}")
+        self.assertEqual(len(self.log), 5)
+        self.assertEqual(self.log.lines(), ["line 2", "line 3", "line 4"])
+        self.assertEqual(self.log.take_pending(), (["line 2", "line 3", "line 4"], 2))
+        self.assertEqual(self.log.take_pending(), ([], 0))
+        self.log.append("line 5")
+        self.assertEqual(self.log.take_pending(), (["line 5"], 0))
+
+    def test_export_streams_full_log(self):
+        for number in range(5):
+            self.log.append(f"line {number}")
+        text_path = os.path.join(self.directory, "log.txt")
+        self.assertEqual(self.log.export(text_path), 5)
+        with open(text_path) as exported:
+            lines = exported.read().splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertTrue(lines[0].endswith("  line 0"))
+
+        jsonl_path = os.path.join(self.directory, "export.jsonl")
+        self.log.export(jsonl_path)
+        with open(jsonl_path) as exported:
+            records = [json.loads(line) for line in exported]
+        self.assertEqual([record["message"] for record in records], [f"line {n}" for n in range(5)])
+
+    def test_clear(self):
+        self.log.append("line")
+        self.log.clear()
+        self.assertEqual(len(self.log), 0)
+        self.assertEqual(list(self.log.records()), [])
+        self.log.append("after")
+        self.assertEqual([record["message"] for record in self.log.records()], ["after"])
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(LogPipelineTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
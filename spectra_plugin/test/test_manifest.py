@@ -0,0 +1,103 @@
+# coding=utf-8
+"""Model manifest and catalogue tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'deepresense@gmail.com'
+__date__ = '2025-07-22'
+__copyright__ = 'Copyright 2025, Deepresense'
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from spectra_plugin.spectra_inference import InferenceSettings
+from spectra_plugin.spectra_manifest import ModelCatalogue, ModelManifest, INDEX_NAME
+
+
+class ModelManifestTest(unittest.TestCase):
+    """Test manifests and the catalogue index."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.model_path = self._touch("unet.onnx")
+        with open(os.path.join(self.directory, "unet.json"), "w") as f:
+            json.dump({"name": "UNet", "subtask": "Building", "input_shape": [3, 512, 512],
+                       "bands": [3, 2, 1], "classes": ["Background", "Building"]}, f)
+        self._touch("generic.onnx")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _touch(self, name):
+        path = os.path.join(self.directory, name)
+        open(path, "wb").close()
+        return path
+
+    def test_read_manifest(self):
+        manifest = ModelManifest.for_model(self.model_path)
+        self.assertEqual(manifest.name, "UNet")
+        self.assertEqual(manifest.resolution, 512)
+        self.assertEqual(manifest.bands, [3, 2, 1])
+        self.assertEqual(manifest.classes, {0: "Background", 1: "Building"})
+        self.assertIsNone(ModelManifest.for_model(os.path.join(self.directory, "generic.onnx")))
+
+    def test_precision_validated(self):
+        manifest_path = os.path.join(self.directory, "unet.json")
+        with open(manifest_path, "w") as f:
+            json.dump({"name": "UNet", "precision": "INT8"}, f)
+        self.assertEqual(ModelManifest.for_model(self.model_path).precision, "INT8 dynamic")
+
+        with open(manifest_path, "w") as f:
+            json.dump({"name": "UNet", "precision": "INT4"}, f)
+        with self.assertRaises(ValueError):
+            ModelManifest.for_model(self.model_path)
+        # The catalogue lists the model without its invalid manifest
+        catalogue = ModelCatalogue(self.directory)
+        catalogue.refresh()
+        self.assertIn("unet", [e["name"] for e in catalogue.entries])
+        self.assertEqual(catalogue.manifest(self.model_path).precision, "FP32")
+
+    def test_siamese_change(self):
+        with open(os.path.join(self.directory, "unet.json"), "w") as f:
+            json.dump({"name": "UNet", "change": "siamese"}, f)
+        manifest = ModelManifest.for_model(self.model_path)
+        settings = manifest.apply(InferenceSettings("a.tif", "out.tif", self.model_path, change_path="b.tif"))
+        self.assertTrue(settings.model_options()["siamese"])
+        # Only a change run feeds the model one date per input
+        settings = manifest.apply(InferenceSettings("a.tif", "out.tif", self.model_path))
+        self.assertNotIn("siamese", settings.model_options())
+
+    def test_catalogue_filters_by_subtask(self):
+        catalogue = ModelCatalogue(self.directory)
+        catalogue.refresh()
+        self.assertEqual(sorted(e["name"] for e in catalogue.models_for("Building")), ["UNet", "generic"])
+        self.assertEqual([e["name"] for e in catalogue.models_for("Tree")], ["generic"])
+        self.assertEqual(catalogue.manifest(self.model_path).resolution, 512)
+
+    def test_index_is_reused(self):
+        ModelCatalogue(self.directory).refresh()
+        self.assertTrue(os.path.isfile(os.path.join(self.directory, INDEX_NAME)))
+
+        # A stale manifest is picked up again, untouched entries come from the index
+        manifest_path = os.path.join(self.directory, "unet.json")
+        with open(manifest_path, "w") as f:
+            json.dump({"name": "UNet v2", "subtask": "Building"}, f)
+        stat = os.stat(manifest_path)
+        os.utime(manifest_path, (stat.st_atime, stat.st_mtime + 10))
+        catalogue = ModelCatalogue(self.directory)
+        catalogue.refresh()
+        self.assertIn("UNet v2", [e["name"] for e in catalogue.entries])
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ModelManifestTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,72 @@
+# coding=utf-8
+"""Overview preview tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'deepresense@gmail.com'
+__date__ = '2025-07-22'
+__copyright__ = 'Copyright 2025, Deepresense'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from osgeo import gdal
+
+from spectra_plugin.spectra_inference import InferenceSettings
+from spectra_plugin.spectra_preview import class_palette, preview_settings, preview_size
+
+
+class PreviewTest(unittest.TestCase):
+    """Test the choice of pyramid level and the preview settings."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "scene.tif")
+        dataset = gdal.GetDriverByName("GTiff").Create(self.path, 4096, 2048, 3, gdal.GDT_Byte)
+        dataset.SetGeoTransform((500000, 10, 0, 4000000, 0, -10))
+        dataset = None
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_decimated_without_overviews(self):
+        dataset = gdal.Open(self.path)
+        self.assertEqual(preview_size(dataset, 1024), (1024, 512, None))
+        self.assertEqual(preview_size(dataset, 8192), (4096, 2048, 0))
+
+    def test_closest_overview(self):
+        dataset = gdal.Open(self.path)
+        dataset.BuildOverviews("NEAREST", [2, 4, 8])
+        self.assertEqual(preview_size(dataset, 900), (1024, 512, 2))
+        self.assertEqual(preview_size(dataset, 600), (512, 256, 3))
+
+    def test_preview_settings(self):
+        settings = InferenceSettings(self.path, "out.tif", "unet.onnx", tile_size=512, resolution=256,
+                                     workers=4, mask_path="mask.tif", vector_path="out.gpkg")
+        preview = preview_settings(settings, os.path.join(self.directory, "preview"))
+        dataset = gdal.Open(preview.raster_path)
+        self.assertEqual((dataset.RasterXSize, dataset.RasterYSize), (1024, 512))
+        # Same footprint, coarser pixels
+        self.assertEqual(dataset.GetGeoTransform()[1], 40)
+        self.assertEqual((preview.tile_size, preview.workers), (256, 0))
+        self.assertIsNone(preview.vector_path)
+        self.assertIsNone(preview.mask_path)
+        self.assertEqual(settings.raster_path, self.path)
+
+    def test_class_palette(self):
+        palette = class_palette(5)
+        self.assertEqual(palette[0].tolist(), [0, 0, 0])
+        self.assertEqual(len({tuple(colour) for colour in palette}), 5)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(PreviewTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
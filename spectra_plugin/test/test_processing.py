@@ -0,0 +1,53 @@
+# coding=utf-8
+"""Processing provider tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'deepresense@gmail.com'
+__date__ = '2025-07-22'
+__copyright__ = 'Copyright 2025, Deepresense'
+
+import unittest
+
+from qgis.core import QgsApplication
+
+from spectra_plugin.spectra_processing import SpectraProcessingProvider
+
+from .utilities import get_qgis_app
+QGIS_APP = get_qgis_app()
+
+
+class SpectraProcessingProviderTest(unittest.TestCase):
+    """Test the provider registers its algorithms."""
+
+    def setUp(self):
+        self.provider = SpectraProcessingProvider()
+        QgsApplication.processingRegistry().addProvider(self.provider)
+
+    def tearDown(self):
+        QgsApplication.processingRegistry().removeProvider(self.provider)
+
+    def test_algorithms(self):
+        ids = sorted(algorithm.id() for algorithm in self.provider.algorithms())
+        self.assertEqual(ids, ["spectra:classify", "spectra:detect", "spectra:segment"])
+
+    def test_parameters(self):
+        detect = QgsApplication.processingRegistry().algorithmById("spectra:detect")
+        names = [parameter.name() for parameter in detect.parameterDefinitions()]
+        self.assertIn("MODEL", names)
+        self.assertIn("SCORE_THRESHOLD", names)
+        self.assertEqual(detect.parameterDefinition("OUTPUT").type(), "vectorDestination")
+        segment = QgsApplication.processingRegistry().algorithmById("spectra:segment")
+        self.assertTrue(segment.parameterDefinition("OUTPUT_VECTOR").flags()
+                        & segment.parameterDefinition("OUTPUT_VECTOR").FlagOptional)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(SpectraProcessingProviderTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,124 @@
+# coding=utf-8
+"""Reduced-precision model tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'deepresense@gmail.com'
+__date__ = '2025-07-22'
+__copyright__ = 'Copyright 2025, Deepresense'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from spectra_plugin.spectra_inference import InferenceSettings
+from spectra_plugin.spectra_quantize import (
+    calibration_feeds, calibration_key, compare_models, reduced_precision_model, reduced_precision_path,
+    resolve_precision)
+
+
+class FixedModel:
+    """Returns the same output whatever the batch."""
+
+    def __init__(self, output):
+        self.output = output
+
+    def predict(self, batch):
+        return self.output
+
+
+class SilentFeedback:
+    def pushInfo(self, message):
+        pass
+
+
+class QuantizeTest(unittest.TestCase):
+    """Test the variant paths, the calibration feeds, the comparison metric and the precision fallback."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.raster_path = os.path.join(self.directory, "scene.tif")
+        open(self.raster_path, "wb").close()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def settings(self, **options):
+        return InferenceSettings(self.raster_path, "", os.path.join(self.directory, "unet.onnx"), **options)
+
+    def test_reduced_precision_path(self):
+        self.assertEqual(reduced_precision_path("/models/unet.onnx", "FP16"), "/models/unet.fp16.onnx")
+        self.assertEqual(reduced_precision_path("/models/unet.onnx", "INT8 dynamic"),
+                         "/models/unet.int8-dynamic.onnx")
+        self.assertEqual(reduced_precision_path("/models/unet.onnx", "INT8 static", "0123abcd"),
+                         "/models/unet.int8-static-0123abcd.onnx")
+
+    def test_resolve_precision(self):
+        self.assertEqual(resolve_precision("FP32"), "FP32")
+        self.assertEqual(resolve_precision("fp16"), "FP16")
+        self.assertEqual(resolve_precision("INT8"), "INT8 dynamic")
+        self.assertEqual(resolve_precision("int8 static"), "INT8 static")
+        with self.assertRaises(ValueError):
+            resolve_precision("INT4")
+
+    def test_calibration_key(self):
+        key = calibration_key(self.settings())
+        self.assertEqual(key, calibration_key(self.settings()))
+        # Another source or other preprocessing calibrates another model
+        self.assertNotEqual(key, calibration_key(self.settings(resolution=128)))
+        self.assertNotEqual(key, calibration_key(self.settings(mean=[0.5], std=[0.2])))
+        other = self.settings()
+        other.raster_path = os.path.join(self.directory, "other.tif")
+        self.assertNotEqual(key, calibration_key(other))
+        os.utime(self.raster_path, (0, 0))
+        self.assertNotEqual(key, calibration_key(self.settings()))
+
+    def test_calibration_feeds(self):
+        batch = np.arange(2 * 6 * 4 * 4, dtype=np.float32).reshape(2, 6, 4, 4)
+        self.assertIs(calibration_feeds(["image"], batch)["image"], batch)
+        # A second input is not taken for a date unless the model is flagged Siamese
+        self.assertEqual(list(calibration_feeds(["image", "scale"], batch)), ["image"])
+        feeds = calibration_feeds(["before", "after"], batch, siamese=True)
+        np.testing.assert_array_equal(feeds["before"], batch[:, :3])
+        np.testing.assert_array_equal(feeds["after"], batch[:, 3:])
+
+    def test_compare_models_agreement(self):
+        batches = [np.zeros((2, 3, 4, 4), dtype=np.float32)] * 2
+        reference = np.zeros((2, 2, 4, 4), dtype=np.float32)
+        reference[:, 1] = 1.0
+        candidate = reference.copy()
+        candidate[:, 0, 0] = 2.0  # One row of four in each tile changes class
+        comparison = compare_models(FixedModel(reference), FixedModel(candidate), batches)
+        self.assertEqual(comparison["metric"], "pixel agreement")
+        self.assertAlmostEqual(comparison["value"], 0.75)
+        self.assertGreaterEqual(comparison["reference_ms"], 0.0)
+        self.assertGreaterEqual(comparison["candidate_ms"], 0.0)
+
+    def test_compare_models_difference(self):
+        batches = [np.zeros((1, 3, 4, 4), dtype=np.float32)]
+        reference = np.full((1, 1, 4, 4), 0.5, dtype=np.float32)
+        comparison = compare_models(FixedModel(reference), FixedModel(reference + 0.25), batches)
+        self.assertEqual(comparison["metric"], "mean abs difference")
+        self.assertAlmostEqual(comparison["value"], 0.25)
+
+    def test_precision_fallback(self):
+        settings = self.settings()
+        self.assertEqual(reduced_precision_model(settings, SilentFeedback()), settings.model_path)
+        settings = InferenceSettings(self.raster_path, "", os.path.join(self.directory, "unet.pt"),
+                                     precision="INT8 dynamic")
+        with self.assertRaises(ValueError):
+            reduced_precision_model(settings, SilentFeedback())
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(QuantizeTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,84 @@
+# coding=utf-8
+"""Level-of-detail tile tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'deepresense@gmail.com'
+__date__ = '2025-07-22'
+__copyright__ = 'Copyright 2025, Deepresense'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from osgeo import gdal
+
+from spectra_plugin.spectra_tiles import CLASSES, IMAGE, LRUCache, OverviewPyramid, TILE_SIZE
+
+
+class TilesTest(unittest.TestCase):
+    """Test the tile pyramid levels, tile lookup and the LRU cache."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "classes.tif")
+        dataset = gdal.GetDriverByName("GTiff").Create(self.path, 1000, 600, 1, gdal.GDT_Byte)
+        values = np.zeros((600, 1000), dtype=np.uint8)
+        values[:, 500:] = 2
+        dataset.GetRasterBand(1).WriteArray(values)
+        dataset.GetRasterBand(1).SetNoDataValue(255)
+        dataset = None
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_levels(self):
+        pyramid = OverviewPyramid(self.path)
+        self.assertEqual(pyramid.mode, CLASSES)
+        self.assertEqual(pyramid.levels, 3)
+        self.assertEqual(pyramid.level_for(2.0), 0)
+        self.assertEqual(pyramid.level_for(0.5), 1)
+        self.assertEqual(pyramid.level_for(0.01), 2)
+        self.assertEqual(len(pyramid.palette), 3)
+
+    def test_visible_tiles(self):
+        pyramid = OverviewPyramid(self.path)
+        self.assertEqual(pyramid.tiles(2, 0, 0, 1000, 600), [(2, 0, 0)])
+        self.assertEqual(pyramid.tiles(0, 300, 100, 520, 200), [(0, 1, 0), (0, 2, 0)])
+        self.assertEqual(pyramid.tile_rect(0, 3, 2), (768, 512, 232, 88))
+        self.assertEqual(pyramid.read(0, 3, 2).shape, (88, 232, 4))
+        # A coarse tile covers more raster pixels with at most TILE_SIZE screen pixels
+        tile = pyramid.read(1, 0, 1)
+        self.assertEqual(tile.shape, (44, 256, 4))
+        self.assertLessEqual(max(tile.shape[:2]), TILE_SIZE)
+        # Class 0 is transparent, class 2 is drawn
+        self.assertEqual(tile[0, 0, 3], 0)
+        self.assertGreater(tile[0, -1, 3], 0)
+
+    def test_image_mode(self):
+        pyramid = OverviewPyramid(self.path, IMAGE)
+        tile = pyramid.read(0, 0, 0)
+        self.assertTrue((tile[..., 3] == 255).all())
+
+    def test_lru_cache(self):
+        cache = LRUCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertEqual(len(cache), 2)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(TilesTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,152 @@
+# coding=utf-8
+"""Streaming polygonisation tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'deepresense@gmail.com'
+__date__ = '2025-07-22'
+__copyright__ = 'Copyright 2025, Deepresense'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from osgeo import gdal, ogr, osr
+
+from spectra_plugin.spectra_vectorize import FeatureWriter, StreamingPolygonizer
+
+
+def source_raster(width, height):
+    """In-memory raster of one unit pixel per map unit, in EPSG:4326."""
+    dataset = gdal.GetDriverByName("MEM").Create("", width, height, 1, gdal.GDT_Byte)
+    dataset.SetGeoTransform((0, 1, 0, height, 0, -1))
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(4326)
+    dataset.SetProjection(srs.ExportToWkt())
+    return dataset
+
+
+def read_features(path):
+    """(class, geometry) of every feature of a vector file."""
+    dataset = ogr.Open(path)
+    features = [(feature.GetField("class"), feature.GetGeometryRef().Clone())
+                for feature in dataset.GetLayer(0)]
+    dataset = None
+    return features
+
+
+class StreamingPolygonizerTest(unittest.TestCase):
+    """Test that polygons cut by window seams come out whole."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "classes.geojson")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def polygonize(self, class_map, window):
+        """Feed ``class_map`` window by window in row-major order, as the engine does."""
+        height, width = class_map.shape
+        polygonizer = StreamingPolygonizer(self.path, source_raster(width, height), {1: "field", 2: "road"})
+        for y in range(0, height, window):
+            for x in range(0, width, window):
+                polygonizer.finish_rows(y)
+                polygonizer.add(class_map[y:y + window, x:x + window], x, y)
+        count = polygonizer.close()
+        features = read_features(self.path)
+        self.assertEqual(count, len(features))
+        return features
+
+    def test_polygon_spanning_windows(self):
+        class_map = np.zeros((8, 8), dtype=np.uint8)
+        class_map[2:6, 2:6] = 1  # Across all four windows
+        class_map[0, 0] = 2  # Inside one window
+        features = sorted(self.polygonize(class_map, 4), key=lambda item: item[0])
+        self.assertEqual([value for value, _ in features], [1, 2])
+        self.assertEqual([geometry.GetArea() for _, geometry in features], [16, 1])
+        block = features[0][1]
+        self.assertEqual(block.GetGeometryCount(), 1)
+        self.assertEqual(block.GetEnvelope(), (2, 6, 2, 6))
+
+    def test_corner_contact_not_merged(self):
+        class_map = np.zeros((8, 8), dtype=np.uint8)
+        class_map[3, 3] = class_map[4, 4] = 1  # Diagonal neighbours across the window corner
+        features = self.polygonize(class_map, 4)
+        self.assertEqual([geometry.GetArea() for _, geometry in features], [1, 1])
+
+    def test_hole_touching_seam(self):
+        class_map = np.ones((4, 8), dtype=np.uint8)
+        class_map[1:3, 3:5] = 0  # The hole straddles the seam at x = 4
+        features = self.polygonize(class_map, 4)
+        self.assertEqual(len(features), 1)
+        _, geometry = features[0]
+        self.assertEqual(geometry.GetArea(), 28)
+        polygon = geometry.GetGeometryRef(0)
+        self.assertEqual(geometry.GetGeometryCount(), 1)
+        self.assertEqual(polygon.GetGeometryCount(), 2)  # Shell and one hole
+        self.assertEqual(polygon.GetGeometryRef(1).GetEnvelope(), (3, 5, 1, 3))
+
+    def test_hole_at_window_corner(self):
+        class_map = np.ones((8, 8), dtype=np.uint8)
+        class_map[3:5, 3:5] = 0  # The hole sits on the corner of all four windows
+        features = self.polygonize(class_map, 4)
+        self.assertEqual(len(features), 1)
+        _, geometry = features[0]
+        self.assertEqual(geometry.GetArea(), 60)
+        self.assertEqual(geometry.GetGeometryRef(0).GetGeometryCount(), 2)
+
+
+class BatchCountingWriter(FeatureWriter):
+    """Records the features committed by each transaction."""
+
+    BATCH_SIZE = 3
+
+    def __init__(self, *args):
+        self.commits = []
+        super().__init__(*args)
+
+    def _commit(self):
+        self.commits.append(self.queued)
+        super()._commit()
+
+
+class FeatureWriterTest(unittest.TestCase):
+    """Test the batched commits and the format checks."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_commits_in_batches(self):
+        path = os.path.join(self.directory, "features.gpkg")
+        writer = BatchCountingWriter(path, source_raster(8, 8), [("class", ogr.OFTInteger)])
+        self.assertTrue(writer.transactions)
+        square = ogr.CreateGeometryFromWkt("POLYGON ((0 0,1 0,1 1,0 1,0 0))")
+        for value in range(7):
+            writer.write(square, {"class": value})
+        self.assertEqual(writer.commits, [3, 3])
+        self.assertEqual(writer.close(), 7)
+        self.assertEqual(writer.commits, [3, 3, 1])
+        features = read_features(path)
+        self.assertEqual(sorted(value for value, _ in features), list(range(7)))
+        self.assertEqual(features[0][1].GetGeometryType(), ogr.wkbMultiPolygon)
+
+    def test_unsupported_format(self):
+        with self.assertRaises(ValueError):
+            FeatureWriter(os.path.join(self.directory, "features.csv"), source_raster(8, 8), [])
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(StreamingPolygonizerTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)